@@ -1,7 +1,10 @@
+import asyncio
 import logging
-import ssl
-import aiohttp
+import time
 from typing import List, Dict, Any, Optional
+from config import config
+from api.routing import ProviderRouter, classify_error
+from api.circuit_breaker import breaker_registry
 
 logger = logging.getLogger(__name__)
 
@@ -21,83 +24,222 @@ class PaymentAPIManager:
             "advcash": "advcash_rub",
             "payeer": "payeer_rub"
         }
+        self.hedge_enabled = config.PAYMENT_HEDGE_ENABLED
+        self.hedge_top_k = max(1, config.PAYMENT_HEDGE_TOP_K)
+        self.hedge_stagger = max(0.0, config.PAYMENT_HEDGE_STAGGER)
+        self._background = set()
+        self.breakers = breaker_registry
+        for api_config in self.apis:
+            self.breakers.get(api_config['name'], api_config['api'])
+        self.routing_enabled = config.PAYMENT_ROUTING_ENABLED
+        self.router = ProviderRouter(
+            window=config.PAYMENT_ROUTING_WINDOW,
+            skip_threshold=config.PAYMENT_ROUTING_SKIP_THRESHOLD,
+            cooldown=config.PAYMENT_ROUTING_COOLDOWN
+        )
 
-    async def create_order(self, amount: int, payment_type: str, personal_id: str, is_sell_order: bool = False, wallet: Optional[str] = None) -> Dict[str, Any]:
+    def _eligible_apis(self, is_sell_order: bool) -> List[Dict[str, Any]]:
+        eligible = []
         for api_config in self.apis:
-            api = api_config['api']
-            api_name = api_config['name']
-            pay_type_mapping = api_config.get('pay_type_mapping', self.nicepay_methods if api_name == 'NicePay' else {})
-            mapped_payment_type = pay_type_mapping.get(payment_type, payment_type)
-            logger.info(f"Вызов create_order для {api_name} с параметрами: amount={amount}, pay_types={[mapped_payment_type] if api_name == 'PSPWare' else mapped_payment_type}, personal_id={personal_id}, wallet={'None' if api_name != 'Greengo' else wallet}")
+            if is_sell_order and api_config['name'] != 'OnlyPays':
+                logger.debug(f"Пропуск {api_config['name']} для продажи")
+                continue
+            eligible.append(api_config)
+        return eligible
 
-            try:
-                if is_sell_order and api_name != 'OnlyPays':
-                    logger.debug(f"Пропуск {api_name} для продажи")
+    async def _request_order(self, api_config: Dict[str, Any], amount: int, payment_type: str, personal_id: str, wallet: Optional[str] = None) -> Dict[str, Any]:
+        api = api_config['api']
+        api_name = api_config['name']
+        pay_type_mapping = api_config.get('pay_type_mapping', self.nicepay_methods if api_name == 'NicePay' else {})
+        mapped_payment_type = pay_type_mapping.get(payment_type, payment_type)
+        logger.info(f"Вызов create_order для {api_name} с параметрами: amount={amount}, pay_types={[mapped_payment_type] if api_name == 'PSPWare' else mapped_payment_type}, personal_id={personal_id}, wallet={'None' if api_name != 'Greengo' else wallet}")
+        breaker = self.breakers.get(api_name)
+        if not breaker.allow():
+            logger.info(f"Пропуск {api_name}: circuit breaker {breaker.state}")
+            return {'success': False, 'error': f"Circuit breaker {breaker.state}", 'api_name': api_name, 'circuit_open': True}
+        started = time.perf_counter()
+
+        try:
+            logger.info(f"Попытка создания заказа через {api_name} (тип платежа: {payment_type} -> {mapped_payment_type})")
+
+            if api_name == 'Greengo':
+                wallet_address = wallet if wallet and wallet.startswith(('bc1', '1', '3', '0x')) else ''
+                response = await api.create_order(
+                    payment_method=mapped_payment_type,
+                    wallet=wallet_address,
+                    from_amount=str(amount)
+                )
+            elif api_name == 'PSPWare':
+                response = await api.create_order(
+                    amount=amount,
+                    pay_types=[mapped_payment_type],
+                    personal_id=personal_id
+                )
+            elif api_name == 'NicePay':
+                if mapped_payment_type not in self.nicepay_methods.values():
+                    logger.error(f"Недопустимый метод оплаты для NicePay: {mapped_payment_type}")
+                    breaker.release()
+                    return {"success": False, "error": f"Invalid payment method: {mapped_payment_type}", "api_name": api_name, "invalid_input": True}
+                response = await api.create_payment(
+                    merchant_order_id=personal_id,
+                    amount=amount,
+                    currency="RUB",
+                    method=mapped_payment_type,
+                    description=f"Payment for order {personal_id}"
+                )
+                logger.debug(f"NicePay raw response: {response}")
+            else:
+                response = await api.create_order(
+                    amount=amount,
+                    payment_type=mapped_payment_type,
+                    personal_id=personal_id
+                )
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при создании заказа через {api_name}: {e}")
+            error_class = classify_error(exc=e)
+            self.router.record(api_name, payment_type, False, time.perf_counter() - started, error_class)
+            breaker.record_failure(error_class, str(e))
+            return {'success': False, 'error': str(e), 'api_name': api_name}
+
+        elapsed = time.perf_counter() - started
+        response['api_name'] = api_name
+        error_class = classify_error(response)
+        self.router.record(api_name, payment_type, bool(response.get('success')), elapsed, error_class)
+        if response.get('success'):
+            breaker.record_success()
+        else:
+            breaker.record_failure(error_class, response.get('error'))
+        if not response.get('success'):
+            logger.warning(f"{api_name} не смог создать заказ за {elapsed:.2f} сек: {response.get('error')}")
+            return response
+
+        if api_name == 'Greengo':
+            response['upstream_order_id'] = response.get('order_id')
+            response['data'] = {
+                'id': response.get('order_id', personal_id),
+                'requisite': response.get('requisite', ''),
+                'owner': response.get('owner', 'Неизвестно'),
+                'bank': response.get('bank', 'Неизвестно')
+            }
+        elif api_name == 'NicePay':
+            nicepay_data = response.get('data', {})
+            response['upstream_order_id'] = nicepay_data.get('payment_id')
+            response['data'] = {
+                'id': nicepay_data.get('payment_id', personal_id),
+                'order_id': personal_id,
+                'payment_url': nicepay_data.get('payment_url', ''),
+                'amount': amount
+            }
+            logger.debug(f"Processed NicePay data: {response['data']}")
+        else:
+            response['upstream_order_id'] = response.get('data', {}).get('id')
+        logger.info(f"Успешное создание заказа через {api_name} за {elapsed:.2f} сек: {response['data']}")
+        return response
+
+    async def create_order(self, amount: int, payment_type: str, personal_id: str, is_sell_order: bool = False, wallet: Optional[str] = None) -> Dict[str, Any]:
+        eligible = self._eligible_apis(is_sell_order)
+        eligible = [api_config for api_config in eligible if not self.breakers.get(api_config['name']).is_open()]
+        if self.routing_enabled:
+            eligible = self.router.rank(eligible, payment_type)
+            logger.info(f"Порядок провайдеров для {payment_type}: {[api_config['name'] for api_config in eligible]}")
+        if self.hedge_enabled and self.hedge_top_k > 1 and len(eligible) > 1:
+            return await self._create_order_hedged(eligible, amount, payment_type, personal_id, wallet)
+
+        for api_config in eligible:
+            response = await self._request_order(api_config, amount, payment_type, personal_id, wallet)
+            if response.get('success') or response.get('invalid_input'):
+                return response
+
+        logger.error("Все платежные API не сработали")
+        return {'success': False, 'error': 'Все платежные API не сработали', 'api_name': 'None'}
+
+    async def _create_order_hedged(self, eligible: List[Dict[str, Any]], amount: int, payment_type: str, personal_id: str, wallet: Optional[str] = None) -> Dict[str, Any]:
+        queue = list(eligible)
+        pending = set()
+        winner = None
+        rejected = None
+        losers = []
+
+        def launch():
+            api_config = queue.pop(0)
+            pending.add(asyncio.create_task(
+                self._request_order(api_config, amount, payment_type, personal_id, wallet),
+                name=f"hedge_{api_config['name']}_{personal_id}"
+            ))
+
+        launch()
+        try:
+            while pending:
+                can_launch = bool(queue) and len(pending) < self.hedge_top_k
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_stagger if can_launch else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    response = task.result()
+                    if response.get('invalid_input'):
+                        rejected = response
+                    if not response.get('success'):
+                        continue
+                    if winner is None:
+                        winner = response
+                    else:
+                        losers.append(response)
+                if winner is not None or rejected is not None:
+                    break
+                if not done:
+                    launch()
                     continue
+                for _ in done:
+                    if queue and len(pending) < self.hedge_top_k:
+                        launch()
+        except asyncio.CancelledError:
+            self._track(asyncio.create_task(self._release_losers(personal_id, losers, pending)))
+            raise
 
-                logger.info(f"Попытка создания заказа через {api_name} (тип платежа: {payment_type} -> {mapped_payment_type})")
-
-                if api_name == 'Greengo':
-                    wallet_address = wallet if wallet and wallet.startswith(('bc1', '1', '3', '0x')) else ''
-                    response = await api.create_order(
-                        payment_method=mapped_payment_type,
-                        wallet=wallet_address,
-                        from_amount=str(amount)
-                    )
-                elif api_name == 'PSPWare':
-                    response = await api.create_order(
-                        amount=amount,
-                        pay_types=[mapped_payment_type],
-                        personal_id=personal_id
-                    )
-                elif api_name == 'NicePay':
-                    if mapped_payment_type not in self.nicepay_methods.values():
-                        logger.error(f"Недопустимый метод оплаты для NicePay: {mapped_payment_type}")
-                        return {"success": False, "error": f"Invalid payment method: {mapped_payment_type}", "api_name": api_name}
-                    response = await api.create_payment(
-                        merchant_order_id=personal_id,
-                        amount=amount,
-                        currency="RUB",
-                        method=mapped_payment_type,
-                        description=f"Payment for order {personal_id}"
-                    )
-                    logger.debug(f"NicePay raw response: {response}")
-                else:
-                    response = await api.create_order(
-                        amount=amount,
-                        payment_type=mapped_payment_type,
-                        personal_id=personal_id
-                    )
+        if losers or pending:
+            self._track(asyncio.create_task(self._release_losers(personal_id, losers, pending)))
 
-                if response.get('success'):
-                    response['api_name'] = api_name
-                    if api_name == 'Greengo':
-                        response['data'] = {
-                            'id': response.get('order_id', personal_id),
-                            'requisite': response.get('requisite', ''),
-                            'owner': response.get('owner', 'Неизвестно'),
-                            'bank': response.get('bank', 'Неизвестно')
-                        }
-                    elif api_name == 'NicePay':
-                        nicepay_data = response.get('data', {})
-                        response['data'] = {
-                            'id': nicepay_data.get('payment_id', personal_id),
-                            'order_id': personal_id,
-                            'payment_url': nicepay_data.get('payment_url', ''),
-                            'amount': amount
-                        }
-                        logger.debug(f"Processed NicePay data: {response['data']}")
-                    logger.info(f"Успешное создание заказа через {api_name}: {response['data']}")
-                    return response
-                else:
-                    logger.warning(f"{api_name} не смог создать заказ: {response.get('error')}")
-            except Exception as e:
-                logger.error(f"Ошибка при создании заказа через {api_name}: {e}")
-                response = {'success': False, 'error': str(e), 'api_name': api_name}
+        if winner is not None:
+            logger.info(f"Хеджированный запрос #{personal_id}: реквизиты выданы {winner['api_name']}")
+            return winner
+        if rejected is not None:
+            return rejected
 
         logger.error("Все платежные API не сработали")
         return {'success': False, 'error': 'Все платежные API не сработали', 'api_name': 'None'}
 
+    async def _release_losers(self, personal_id: str, losers: List[Dict[str, Any]], pending: set):
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            for task in done:
+                if task.cancelled() or task.exception():
+                    continue
+                response = task.result()
+                if response.get('success'):
+                    losers.append(response)
+
+        for response in losers:
+            api_name = response.get('api_name')
+            order_id = response.get('upstream_order_id')
+            if not order_id:
+                logger.warning(f"Провайдер {api_name} не вернул ID лишнего заказа для #{personal_id}, отмена невозможна")
+                continue
+            amount = response.get('data', {}).get('amount')
+            result = await self.cancel_order(str(order_id), api_name, amount)
+            if result.get('success'):
+                logger.info(f"Лишний заказ {order_id} через {api_name} для #{personal_id} отменен")
+            else:
+                logger.error(f"Не удалось отменить лишний заказ {order_id} через {api_name} для #{personal_id}: {result.get('error')}")
+
+    def _track(self, task: asyncio.Task):
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
     async def get_order_status(self, order_id: str, api_name: str, amount: int = None) -> Dict[str, Any]:
         api_config = next((api for api in self.apis if api['name'] == api_name), None)
         if not api_config:
@@ -138,6 +280,12 @@ class PaymentAPIManager:
             logger.error(f"Ошибка отмены заказа через {api_name}: {e}")
             return {'success': False, 'error': str(e), 'api_name': api_name}
 
+    def routing_scores(self) -> List[Dict[str, Any]]:
+        return self.router.snapshot()
+
+    def breaker_states(self) -> List[Dict[str, Any]]:
+        return [self.breakers.get(api_config['name']).snapshot() for api_config in self.apis]
+
     async def health_check(self) -> Dict[str, Dict[str, Any]]:
         results = {}
         for api_config in self.apis:
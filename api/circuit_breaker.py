@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_LABELS = {
+    CLOSED: "🟢 закрыт",
+    OPEN: "🔴 открыт",
+    HALF_OPEN: "🟡 полуоткрыт",
+}
+
+DEFAULT_THRESHOLDS = {
+    'tls': 2,
+    'network': 3,
+    'timeout': 3,
+    'http': 5,
+    'api': 5,
+}
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, api: Any = None, thresholds: Optional[Dict[str, int]] = None,
+                 open_timeout: float = 30.0, max_open_timeout: float = 300.0):
+        self.name = name
+        self.api = api
+        self.thresholds = dict(thresholds or DEFAULT_THRESHOLDS)
+        self.base_open_timeout = open_timeout
+        self.max_open_timeout = max_open_timeout
+        self.open_timeout = open_timeout
+        self.state = CLOSED
+        self.failures: Counter = Counter()
+        self.retry_at = 0.0
+        self.changed_at = time.time()
+        self.last_error: Optional[str] = None
+        self.trial_in_flight = False
+        self.on_transition: Optional[Callable[["CircuitBreaker", str, str], None]] = None
+
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def release(self):
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures.clear()
+        self.trial_in_flight = False
+        if self.state != CLOSED:
+            self.open_timeout = self.base_open_timeout
+            self._transition(CLOSED)
+
+    def record_failure(self, error_class: Optional[str], error: Optional[str] = None):
+        self.trial_in_flight = False
+        threshold = self.thresholds.get(error_class)
+        if threshold is None:
+            return
+        self.last_error = f"{error_class}: {error}" if error else error_class
+        if self.state == HALF_OPEN:
+            self._open(backoff=True)
+            return
+        self.failures[error_class] += 1
+        if self.state == CLOSED and self.failures[error_class] >= threshold:
+            self._open()
+
+    def _open(self, backoff: bool = False):
+        if backoff:
+            self.open_timeout = min(self.open_timeout * 2, self.max_open_timeout)
+        self.retry_at = time.monotonic() + self.open_timeout
+        self.failures.clear()
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        previous, self.state = self.state, state
+        self.changed_at = time.time()
+        logger.warning(f"Circuit breaker {self.name}: {previous} -> {state}")
+        if self.on_transition:
+            self.on_transition(self, previous, state)
+
+    async def probe(self, timeout: float) -> bool:
+        if self.state != OPEN or time.monotonic() < self.retry_at:
+            return False
+        health_check = getattr(self.api, 'health_check', None)
+        if health_check is None:
+            self._transition(HALF_OPEN)
+            return True
+        try:
+            result = await asyncio.wait_for(health_check(), timeout=timeout)
+            healthy = bool(result.get('success'))
+            error = None if healthy else result.get('error')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            healthy, error = False, str(e)
+        if healthy:
+            self._transition(HALF_OPEN)
+            return True
+        self.last_error = f"probe: {error}"
+        self._open(backoff=True)
+        return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'state': self.state,
+            'failures': dict(self.failures),
+            'retry_in': max(0.0, self.retry_at - time.monotonic()) if self.state == OPEN else 0.0,
+            'last_error': self.last_error,
+        }
+
+
+class CircuitBreakerRegistry:
+    def __init__(self, open_timeout: float = 30.0, max_open_timeout: float = 300.0,
+                 probe_interval: float = 5.0, probe_timeout: float = 10.0):
+        self.open_timeout = open_timeout
+        self.max_open_timeout = max_open_timeout
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._notifier: Optional[Callable[[str], Awaitable[Any]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending = set()
+
+    def get(self, name: str, api: Any = None) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, api, open_timeout=self.open_timeout, max_open_timeout=self.max_open_timeout)
+            breaker.on_transition = self._on_transition
+            self._breakers[name] = breaker
+        elif api is not None:
+            breaker.api = api
+        return breaker
+
+    def _on_transition(self, breaker: CircuitBreaker, previous: str, state: str):
+        if self._notifier is None:
+            return
+        text = f"⚡️ <b>{breaker.name}</b>: {STATE_LABELS[previous]} → {STATE_LABELS[state]}"
+        if state == OPEN:
+            text += f"\nПовтор через {breaker.open_timeout:.0f} сек"
+            if breaker.last_error:
+                text += f"\nПричина: {breaker.last_error[:300]}"
+        try:
+            task = asyncio.get_running_loop().create_task(self._send(text))
+        except RuntimeError:
+            return
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _send(self, text: str):
+        try:
+            await self._notifier(text)
+        except Exception as e:
+            logger.error(f"Ошибка отправки уведомления о circuit breaker: {e}")
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            for breaker in list(self._breakers.values()):
+                if breaker.is_open():
+                    await breaker.probe(self.probe_timeout)
+
+    def start(self, notifier: Optional[Callable[[str], Awaitable[Any]]] = None):
+        self._notifier = notifier
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._probe_loop(), name="circuit_breaker_probes")
+            logger.info("Фоновые проверки circuit breaker запущены")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._notifier = None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [breaker.snapshot() for breaker in self._breakers.values()]
+
+
+breaker_registry = CircuitBreakerRegistry(
+    open_timeout=config.CIRCUIT_OPEN_TIMEOUT,
+    max_open_timeout=config.CIRCUIT_MAX_OPEN_TIMEOUT,
+    probe_interval=config.CIRCUIT_PROBE_INTERVAL,
+    probe_timeout=config.CIRCUIT_PROBE_TIMEOUT,
+)
@@ -2,6 +2,7 @@ import logging
 import aiohttp
 from typing import List, Dict, Any, Optional
 from config import config
+from api.http import http_transport
 
 logger = logging.getLogger(__name__)
 
@@ -16,28 +17,27 @@ class GreengoAPI:
 
     async def _make_request(self, method: str, url: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
         try:
-            timeout = aiohttp.ClientTimeout(total=30)                    
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                if method.upper() == "GET":
-                    async with session.get(url, headers=self.headers) as response:
-                        if response.status != 200:
-                            error_text = await response.text()
-                            logger.error(f"Greengo HTTP {response.status}: {error_text}")
-                            return {"success": False, "error": f"HTTP {response.status}: {error_text}"}
+            session = await http_transport.session()
+            if method.upper() == "GET":
+                async with session.get(url, headers=self.headers) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        logger.error(f"Greengo HTTP {response.status}: {error_text}")
+                        return {"success": False, "error": f"HTTP {response.status}: {error_text}"}
                         
-                        result = await response.json()
-                        logger.info(f"Greengo {method} response: {result}")
-                        return result
-                else:
-                    async with session.post(url, json=data, headers=self.headers) as response:
-                        if response.status != 200:
-                            error_text = await response.text()
-                            logger.error(f"Greengo HTTP {response.status}: {error_text}")
-                            return {"success": False, "error": f"HTTP {response.status}: {error_text}"}
+                    result = await response.json()
+                    logger.info(f"Greengo {method} response: {result}")
+                    return result
+            else:
+                async with session.post(url, json=data, headers=self.headers) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        logger.error(f"Greengo HTTP {response.status}: {error_text}")
+                        return {"success": False, "error": f"HTTP {response.status}: {error_text}"}
                         
-                        result = await response.json()
-                        logger.info(f"Greengo {method} response: {result}")
-                        return result
+                    result = await response.json()
+                    logger.info(f"Greengo {method} response: {result}")
+                    return result
                         
         except aiohttp.ClientError as e:
             logger.error(f"Greengo network error: {e}")
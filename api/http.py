@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import ssl
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class HttpTransport:
+    def __init__(self, limit: int = 100, limit_per_host: int = 20, dns_cache_ttl: int = 300,
+                 keepalive_timeout: float = 30, total_timeout: float = 30, connect_timeout: float = 10):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self._insecure_ssl: Optional[ssl.SSLContext] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._requests = 0
+
+    @property
+    def insecure_ssl(self) -> ssl.SSLContext:
+        if self._insecure_ssl is None:
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+            self._insecure_ssl = ssl_context
+        return self._insecure_ssl
+
+    @property
+    def is_open(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def start(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self.is_open and self._loop is loop:
+            return self._session
+        if self.is_open:
+            await self._discard_stale_session()
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        self._loop = loop
+        logger.info(
+            f"HTTP транспорт запущен (лимит {self.limit}, на хост {self.limit_per_host}, "
+            f"DNS кэш {self.dns_cache_ttl} сек)"
+        )
+        return self._session
+
+    async def _discard_stale_session(self):
+        if self._loop is not None and self._loop.is_running():
+            raise RuntimeError("HTTP транспорт уже используется в другом работающем event loop")
+        session, self._session = self._session, None
+        self._loop = None
+        logger.warning("HTTP сессия создана в другом event loop, пересоздание")
+        try:
+            await session.close()
+        except Exception as e:
+            logger.error(f"Ошибка закрытия HTTP сессии прежнего event loop: {e}")
+            session.detach()
+
+    async def close(self):
+        if not self.is_open:
+            return
+        session, self._session = self._session, None
+        self._loop = None
+        try:
+            await session.close()
+            logger.info("HTTP транспорт остановлен")
+        except Exception as e:
+            logger.error(f"Ошибка закрытия HTTP транспорта: {e}")
+
+    async def session(self) -> aiohttp.ClientSession:
+        self._requests += 1
+        if self.is_open and self._loop is asyncio.get_running_loop():
+            return self._session
+        return await self.start()
+
+    def stats(self) -> Dict[str, Any]:
+        connector = self._session.connector if self.is_open else None
+        return {
+            'is_open': self.is_open,
+            'requests': self._requests,
+            'limit': self.limit,
+            'limit_per_host': self.limit_per_host,
+            'acquired': len(getattr(connector, '_acquired', ())) if connector else 0,
+            'idle_hosts': len(getattr(connector, '_conns', {})) if connector else 0,
+        }
+
+
+http_transport = HttpTransport(
+    limit=config.HTTP_POOL_LIMIT,
+    limit_per_host=config.HTTP_POOL_LIMIT_PER_HOST,
+    dns_cache_ttl=config.HTTP_DNS_CACHE_TTL,
+    keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+    total_timeout=config.HTTP_TIMEOUT_TOTAL,
+    connect_timeout=config.HTTP_TIMEOUT_CONNECT,
+)
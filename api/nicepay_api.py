@@ -1,8 +1,9 @@
 import asyncio
 import logging
+import random
 import aiohttp
-import ssl
 from config import config
+from api.http import http_transport
 
 logger = logging.getLogger(__name__)
 
@@ -12,42 +13,38 @@ class NicePayAPI:
         self.secret = config.NICEPAY_MERCHANT_TOKEN_KEY
         self.base_url = "https://nicepay.io/public/api/payment"
 
-    async def _make_request(self, url: str, params: dict, retries: int = 3, delay: int = 5) -> dict:
+    async def _make_request(self, url: str, params: dict, retries: int = 3, delay: float = None) -> dict:
         headers = {"Content-Type": "application/json", "Accept": "application/json"}
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        
+        delay = config.NICEPAY_RETRY_DELAY if delay is None else delay
         for attempt in range(1, retries + 1):
             try:
                 logger.debug(f"Attempt {attempt} to {url} with params: {params}")
-                async with aiohttp.ClientSession(connector=connector) as session:
-                    async with session.post(url, json=params, headers=headers) as resp:
-                        logger.debug(f"Response status: {resp.status}")
-                        if resp.status != 200:
-                            error_text = await resp.text()
-                            logger.error(f"HTTP {resp.status}: {error_text} for {url}")
-                            return {"success": False, "error": f"HTTP {resp.status}: {error_text}"}
-                        result = await resp.json()
-                        logger.info(f"NicePay response: {result}")
-                        if result.get("status") == "success":
-                            return {
-                                "success": True,
-                                "data": {
-                                    "id": result["data"]["payment_id"],
-                                    "payment_url": result["data"]["link"],
-                                    "amount": result["data"]["amount"],
-                                    "currency": result["data"]["currency"],
-                                    "expired": result["data"]["expired"]
-                                }
+                session = await http_transport.session()
+                async with session.post(url, json=params, headers=headers, ssl=http_transport.insecure_ssl) as resp:
+                    logger.debug(f"Response status: {resp.status}")
+                    if resp.status != 200:
+                        error_text = await resp.text()
+                        logger.error(f"HTTP {resp.status}: {error_text} for {url}")
+                        return {"success": False, "error": f"HTTP {resp.status}: {error_text}"}
+                    result = await resp.json()
+                    logger.info(f"NicePay response: {result}")
+                    if result.get("status") == "success":
+                        return {
+                            "success": True,
+                            "data": {
+                                "id": result["data"]["payment_id"],
+                                "payment_url": result["data"]["link"],
+                                "amount": result["data"]["amount"],
+                                "currency": result["data"]["currency"],
+                                "expired": result["data"]["expired"]
                             }
-                        logger.warning(f"API error: {result.get('data', {}).get('message', 'Unknown error')}")
-                        return {"success": False, "error": result["data"].get("message", "Unknown error")}
+                        }
+                    logger.warning(f"API error: {result.get('data', {}).get('message', 'Unknown error')}")
+                    return {"success": False, "error": result["data"].get("message", "Unknown error")}
             except aiohttp.ClientConnectorError as e:
                 logger.error(f"Network error (attempt {attempt}): {e}, host={url}")
                 if attempt < retries:
-                    await asyncio.sleep(delay)
+                    await asyncio.sleep(delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
                     continue
                 return {"success": False, "error": f"Network error after {retries} attempts: {str(e)}"}
             except Exception as e:
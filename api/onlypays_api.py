@@ -1,6 +1,5 @@
 import logging
-import aiohttp
-import ssl
+from api.http import http_transport
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -26,16 +25,11 @@ class OnlyPaysAPI:
             data["trans"] = True
 
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(url, json=data) as response:
-                    result = await response.json()
-                    logger.info(f"OnlyPays create_order response (sum {amount}): {result}")
-                    return result
+            session = await http_transport.session()
+            async with session.post(url, json=data, ssl=http_transport.insecure_ssl) as response:
+                result = await response.json()
+                logger.info(f"OnlyPays create_order response (sum {amount}): {result}")
+                return result
         except Exception as e:
             logger.error(f"OnlyPays create_order error: {e}")
             return {"success": False, "error": str(e)}
@@ -48,16 +42,11 @@ class OnlyPaysAPI:
             "id": order_id
         }
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(url, json=data) as response:
-                    result = await response.json()
-                    logger.info(f"OnlyPays get_status response: {result}")
-                    return result
+            session = await http_transport.session()
+            async with session.post(url, json=data, ssl=http_transport.insecure_ssl) as response:
+                result = await response.json()
+                logger.info(f"OnlyPays get_status response: {result}")
+                return result
         except Exception as e:
             logger.error(f"OnlyPays get_status error: {e}")
             return {"success": False, "error": str(e)}
@@ -70,16 +59,11 @@ class OnlyPaysAPI:
             "id": order_id
         }
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(url, json=data) as response:
-                    result = await response.json()
-                    logger.info(f"OnlyPays cancel_order response: {result}")
-                    return result
+            session = await http_transport.session()
+            async with session.post(url, json=data, ssl=http_transport.insecure_ssl) as response:
+                result = await response.json()
+                logger.info(f"OnlyPays cancel_order response: {result}")
+                return result
         except Exception as e:
             logger.error(f"OnlyPays cancel_order error: {e}")
             return {"success": False, "error": str(e)}
@@ -93,16 +77,11 @@ class OnlyPaysAPI:
             "payment_key": self.payment_key
         }
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(url, json=data) as response:
-                    result = await response.json()
-                    logger.info(f"OnlyPays get_balance response: {result}")
-                    return result
+            session = await http_transport.session()
+            async with session.post(url, json=data, ssl=http_transport.insecure_ssl) as response:
+                result = await response.json()
+                logger.info(f"OnlyPays get_balance response: {result}")
+                return result
         except Exception as e:
             logger.error(f"OnlyPays get_balance error: {e}")
             return {"success": False, "error": str(e)}
@@ -123,16 +102,11 @@ class OnlyPaysAPI:
             data["personal_id"] = personal_id
 
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(url, json=data) as response:
-                    result = await response.json()
-                    logger.info(f"OnlyPays create_payout response: {result}")
-                    return result
+            session = await http_transport.session()
+            async with session.post(url, json=data, ssl=http_transport.insecure_ssl) as response:
+                result = await response.json()
+                logger.info(f"OnlyPays create_payout response: {result}")
+                return result
         except Exception as e:
             logger.error(f"OnlyPays create_payout error: {e}")
             return {"success": False, "error": str(e)}
@@ -147,16 +121,11 @@ class OnlyPaysAPI:
             "id": payout_id
         }
         try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(url, json=data) as response:
-                    result = await response.json()
-                    logger.info(f"OnlyPays payout_status response: {result}")
-                    return result
+            session = await http_transport.session()
+            async with session.post(url, json=data, ssl=http_transport.insecure_ssl) as response:
+                result = await response.json()
+                logger.info(f"OnlyPays payout_status response: {result}")
+                return result
         except Exception as e:
             logger.error(f"OnlyPays payout_status error: {e}")
             return {"success": False, "error": str(e)}
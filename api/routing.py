@@ -0,0 +1,132 @@
+import asyncio
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+
+def classify_error(response: Optional[Dict[str, Any]] = None, exc: Optional[BaseException] = None) -> Optional[str]:
+    if exc is None and response is not None and response.get('success'):
+        return None
+    if isinstance(exc, aiohttp.ClientSSLError):
+        return 'tls'
+    if isinstance(exc, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(exc, aiohttp.ClientConnectionError):
+        return 'network'
+    text = str(exc if exc is not None else (response or {}).get('error', '')).lower()
+    status = (response or {}).get('status_code')
+    if 'certificate' in text or 'sslerror' in text or 'ssl error' in text or 'tls' in text:
+        return 'tls'
+    if 'timeout' in text or 'timed out' in text:
+        return 'timeout'
+    if 'network' in text or 'connect' in text or 'dns' in text or 'name resolution' in text:
+        return 'network'
+    if status == 404 or 'requisite' in text or 'реквизит' in text:
+        return 'no_requisites'
+    if status or text.startswith('http '):
+        return 'http'
+    return 'api'
+
+
+class ProviderStats:
+    def __init__(self, window: int, alpha: float):
+        self.alpha = alpha
+        self.samples: deque = deque(maxlen=window)
+        self.success_ewma = 1.0
+        self.latency_ewma: Optional[float] = None
+        self.last_attempt = 0.0
+
+    def record(self, success: bool, latency: float, error_class: Optional[str]):
+        self.samples.append((success, latency, error_class))
+        self.success_ewma += self.alpha * ((1.0 if success else 0.0) - self.success_ewma)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += self.alpha * (latency - self.latency_ewma)
+        self.last_attempt = time.monotonic()
+
+    def success_rate(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return sum(1 for success, _, _ in self.samples if success) / len(self.samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        latencies = sorted(latency for _, latency, _ in self.samples)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, max(0, int(round(q * (len(latencies) - 1)))))
+        return latencies[index]
+
+    def errors(self) -> Dict[str, int]:
+        return dict(Counter(error for success, _, error in self.samples if not success and error))
+
+
+class ProviderRouter:
+    def __init__(self, window: int = 50, alpha: float = 0.2, latency_ref: float = 3.0,
+                 min_samples: int = 5, skip_threshold: float = 0.2, cooldown: float = 60.0,
+                 exploration: float = 0.05):
+        self.window = window
+        self.alpha = alpha
+        self.latency_ref = latency_ref
+        self.min_samples = min_samples
+        self.skip_threshold = skip_threshold
+        self.cooldown = cooldown
+        self.exploration = exploration
+        self._stats: Dict[Tuple[str, str], ProviderStats] = {}
+
+    def _get(self, api_name: str, payment_type: str) -> ProviderStats:
+        key = (api_name, payment_type)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ProviderStats(self.window, self.alpha)
+        return stats
+
+    def record(self, api_name: str, payment_type: str, success: bool, latency: float, error_class: Optional[str] = None):
+        self._get(api_name, payment_type).record(success, latency, error_class)
+
+    def score(self, api_name: str, payment_type: str) -> float:
+        stats = self._get(api_name, payment_type)
+        latency = stats.latency_ewma if stats.latency_ewma is not None else 0.0
+        return stats.success_ewma / (1.0 + latency / self.latency_ref)
+
+    def is_skipped(self, api_name: str, payment_type: str) -> bool:
+        stats = self._get(api_name, payment_type)
+        if len(stats.samples) < self.min_samples:
+            return False
+        if stats.success_rate() >= self.skip_threshold:
+            return False
+        return time.monotonic() - stats.last_attempt < self.cooldown
+
+    def rank(self, apis: List[Dict[str, Any]], payment_type: str) -> List[Dict[str, Any]]:
+        if len(apis) < 2:
+            return list(apis)
+        position = {api_config['name']: index for index, api_config in enumerate(apis)}
+        active = [api_config for api_config in apis if not self.is_skipped(api_config['name'], payment_type)]
+        if not active:
+            active = list(apis)
+        ranked = sorted(
+            active,
+            key=lambda api_config: (-self.score(api_config['name'], payment_type), position[api_config['name']])
+        )
+        if len(ranked) > 1 and random.random() < self.exploration:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return ranked
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        rows = []
+        for (api_name, payment_type), stats in sorted(self._stats.items()):
+            rows.append({
+                'api_name': api_name,
+                'payment_type': payment_type,
+                'samples': len(stats.samples),
+                'success_rate': stats.success_rate(),
+                'p50': stats.percentile(0.5),
+                'p95': stats.percentile(0.95),
+                'score': self.score(api_name, payment_type),
+                'skipped': self.is_skipped(api_name, payment_type),
+                'errors': stats.errors(),
+            })
+        return rows
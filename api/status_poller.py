@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from database.expiry import parse_created_at
+
+logger = logging.getLogger(__name__)
+
+StatusKey = Tuple[str, str]
+OrdersLoader = Callable[[], Awaitable[List[Dict[str, Any]]]]
+StatusHandler = Callable[[Dict[str, Any], str, Dict[str, Any]], Awaitable[Any]]
+
+PROVIDER_COLUMNS = (
+    ('onlypays_id', 'OnlyPays'),
+    ('pspware_id', 'PSPWare'),
+    ('greengo_id', 'Greengo'),
+)
+
+
+def provider_order(order: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    for column, api_name in PROVIDER_COLUMNS:
+        if order.get(column):
+            return api_name, str(order[column])
+    return None, None
+
+
+class PaymentStatusPoller:
+    def __init__(self, manager, load_orders: OrdersLoader, on_status: StatusHandler,
+                 schedule: Sequence[Tuple[float, float]] = ((300, 15), (900, 30)),
+                 slow_interval: float = 60, concurrency: int = 4, tick: float = 5.0, cache_ttl: float = 10.0):
+        self.manager = manager
+        self.load_orders = load_orders
+        self.on_status = on_status
+        self.schedule = sorted(schedule)
+        self.slow_interval = slow_interval
+        self.concurrency = concurrency
+        self.tick = tick
+        self.cache_ttl = cache_ttl
+        self._inflight: Dict[StatusKey, asyncio.Future] = {}
+        self._cache: Dict[StatusKey, Tuple[float, Dict[str, Any]]] = {}
+        self._next_poll: Dict[int, float] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {'polls': 0, 'coalesced': 0, 'cache_hits': 0, 'updates': 0, 'errors': 0}
+
+    def interval_for(self, order: Dict[str, Any], now: float) -> float:
+        age = now - parse_created_at(order.get('created_at'))
+        for max_age, interval in self.schedule:
+            if age < max_age:
+                return interval
+        return self.slow_interval
+
+    def cached(self, api_name: str, api_order_id: str, max_age: float = None) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get((api_name, str(api_order_id)))
+        if entry is None:
+            return None
+        fetched_at, response = entry
+        if time.monotonic() - fetched_at > (self.cache_ttl if max_age is None else max_age):
+            return None
+        self._stats['cache_hits'] += 1
+        return response
+
+    def _semaphore(self, api_name: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(api_name)
+        if semaphore is None:
+            semaphore = self._semaphores[api_name] = asyncio.Semaphore(self.concurrency)
+        return semaphore
+
+    async def _fetch(self, key: StatusKey, amount: Any) -> Dict[str, Any]:
+        api_name, api_order_id = key
+        async with self._semaphore(api_name):
+            self._stats['polls'] += 1
+            response = await self.manager.get_order_status(order_id=api_order_id, api_name=api_name, amount=amount)
+        if not response.get('success'):
+            self._stats['errors'] += 1
+        self._cache[key] = (time.monotonic(), response)
+        return response
+
+    async def get_status(self, api_name: str, api_order_id: str, amount: Any = None, max_age: float = None) -> Dict[str, Any]:
+        cached = self.cached(api_name, api_order_id, max_age)
+        if cached is not None:
+            return cached
+        key = (api_name, str(api_order_id))
+        future = self._inflight.get(key)
+        if future is not None:
+            self._stats['coalesced'] += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(self._fetch(key, amount))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _poll_order(self, order: Dict[str, Any], api_name: str, api_order_id: str):
+        try:
+            response = await self.get_status(api_name, api_order_id, order.get('total_amount'))
+            if response.get('success'):
+                self._stats['updates'] += 1
+                await self.on_status(order, api_name, response)
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"Ошибка опроса статуса заявки {order.get('id')} у {api_name}: {e}")
+
+    async def poll_once(self) -> int:
+        now = time.time()
+        orders = await self.load_orders()
+        active_ids = set()
+        grouped: Dict[str, List[Tuple[Dict[str, Any], str]]] = defaultdict(list)
+        for order in orders:
+            active_ids.add(order['id'])
+            api_name, api_order_id = provider_order(order)
+            if not api_name:
+                continue
+            if self._next_poll.get(order['id'], 0.0) > now:
+                continue
+            self._next_poll[order['id']] = now + self.interval_for(order, now)
+            grouped[api_name].append((order, api_order_id))
+        for order_id in list(self._next_poll):
+            if order_id not in active_ids:
+                del self._next_poll[order_id]
+        tasks = [
+            self._poll_order(order, api_name, api_order_id)
+            for api_name, items in grouped.items()
+            for order, api_order_id in items
+        ]
+        if tasks:
+            await asyncio.gather(*tasks)
+        return len(tasks)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фонового опроса статусов: {e}")
+            await asyncio.sleep(self.tick)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="payment_status_poller")
+            logger.info("Фоновый опрос статусов платежей запущен")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'tracked': len(self._next_poll), 'inflight': len(self._inflight)}
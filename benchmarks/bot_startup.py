@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fake_token(index: int) -> str:
+    return f"{100000 + index}:AAbenchmarkTokenForStartupMeasurement{index:04d}"
+
+
+async def build_legacy(count: int):
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+    from handlers import admin, user, operator, calculator
+    from middlewares.chat_type import PrivateChatMiddleware
+
+    bots = []
+    for index in range(count):
+        bot = Bot(token=fake_token(index), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        dp = Dispatcher()
+        for module in (admin, user, operator, calculator):
+            dp.include_router(importlib.reload(module).router)
+        dp.message.middleware(PrivateChatMiddleware())
+        dp.callback_query.middleware(PrivateChatMiddleware())
+        bots.append((bot, dp))
+    return bots
+
+
+async def build_factory(count: int):
+    from main import create_bot_instance
+
+    return [
+        await create_bot_instance(fake_token(index), "main" if index == 0 else f"mirror_{index}")
+        for index in range(count)
+    ]
+
+
+async def measure(mode: str, count: int) -> dict:
+    process = psutil.Process(os.getpid())
+    import main
+    baseline = process.memory_info().rss
+    started = time.perf_counter()
+    bots = await (build_legacy(count) if mode == "legacy" else build_factory(count))
+    elapsed = time.perf_counter() - started
+    rss = process.memory_info().rss
+    for bot, _ in bots:
+        await bot.session.close()
+    return {'mode': mode, 'mirrors': count, 'seconds': elapsed, 'rss_delta': rss - baseline, 'rss': rss}
+
+
+def run_child(mode: str, count: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, "--count", str(count)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot startup time and RSS for N mirrors")
+    parser.add_argument("--mirrors", default="1,10,50")
+    parser.add_argument("--modes", default="legacy,factory")
+    parser.add_argument("--child")
+    parser.add_argument("--count", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.child, args.count))))
+        return
+
+    for count in [int(value) for value in args.mirrors.split(",")]:
+        for mode in args.modes.split(","):
+            result = run_child(mode, count)
+            print(
+                f"{result['mode']:>7} mirrors={result['mirrors']:<3} startup={result['seconds'] * 1000:8.1f}ms "
+                f"rss+={result['rss_delta'] / 1024 / 1024:7.1f}MB total={result['rss'] / 1024 / 1024:7.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
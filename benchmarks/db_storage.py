@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from database.models import Database
+from database.pool import ConnectionPool
+
+LEGACY_PROFILE = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+}
+
+
+async def run_profile(name: str, profile: dict, orders: int, writers: int, readers: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    db_path = os.path.join(workdir, "bench.db")
+    Database._pools[db_path] = ConnectionPool(db_path, config.DB_POOL_READERS, profile)
+    db = Database(db_path)
+    await db.init_db()
+
+    stop = asyncio.Event()
+    reads = 0
+
+    async def reader_loop():
+        nonlocal reads
+        while not stop.is_set():
+            await db.get_statistics()
+            reads += 1
+
+    async def writer_loop(count: int):
+        for i in range(count):
+            await db.create_order(
+                user_id=i,
+                amount_rub=5000,
+                amount_btc=0.0005,
+                btc_address="bc1qbenchmarkaddress000000000000000000",
+                rate=10000000,
+                total_amount=6250,
+                payment_type="card"
+            )
+
+    reader_tasks = [asyncio.create_task(reader_loop()) for _ in range(readers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(writer_loop(orders // writers) for _ in range(writers)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*reader_tasks)
+
+    storage = await Database.get_pool(db_path).storage_info()
+    await Database.get_pool(db_path).close()
+    del Database._pools[db_path]
+    return {
+        'name': name,
+        'journal_mode': storage['journal_mode'],
+        'synchronous': storage['synchronous'],
+        'orders_per_sec': (orders // writers * writers) / elapsed,
+        'reads_per_sec': reads / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Order creation throughput with concurrent readers")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    results = [
+        await run_profile("legacy", LEGACY_PROFILE, args.orders, args.writers, args.readers),
+        await run_profile("tuned", config.get_storage_profile(), args.orders, args.writers, args.readers),
+    ]
+    for result in results:
+        print(
+            f"{result['name']:>7}: journal={result['journal_mode']:<6} sync={result['synchronous']} "
+            f"orders/s={result['orders_per_sec']:8.1f} reads/s={result['reads_per_sec']:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
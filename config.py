@@ -41,10 +41,95 @@ class Config:
     DATABASE_URL = os.getenv("DATABASE_URL", "oswaldo_exchanger.db")
     MIRROR_ID = os.getenv("MIRROR_ID", "main_mirror")
     CENTRAL_DB_PATH = os.getenv("CENTRAL_DB_PATH", "oborot.db")
+    DB_POOL_READERS = int(os.getenv("DB_POOL_READERS", 4))
+    SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", 60))
+    SETTINGS_SYNC_INTERVAL = float(os.getenv("SETTINGS_SYNC_INTERVAL", 1))
+    
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 134217728))
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -16000))
+    SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))
+    SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    
+    HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))
+    HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 20))
+    HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", 300))
+    HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30))
+    HTTP_TIMEOUT_TOTAL = float(os.getenv("HTTP_TIMEOUT_TOTAL", 30))
+    HTTP_TIMEOUT_CONNECT = float(os.getenv("HTTP_TIMEOUT_CONNECT", 10))
+    
+    PAYMENT_HEDGE_ENABLED = os.getenv("PAYMENT_HEDGE_ENABLED", "true").lower() == "true"
+    PAYMENT_HEDGE_TOP_K = int(os.getenv("PAYMENT_HEDGE_TOP_K", 2))
+    PAYMENT_HEDGE_STAGGER = float(os.getenv("PAYMENT_HEDGE_STAGGER", 0.3))
+    PAYMENT_ROUTING_ENABLED = os.getenv("PAYMENT_ROUTING_ENABLED", "true").lower() == "true"
+    PAYMENT_ROUTING_WINDOW = int(os.getenv("PAYMENT_ROUTING_WINDOW", 50))
+    PAYMENT_ROUTING_SKIP_THRESHOLD = float(os.getenv("PAYMENT_ROUTING_SKIP_THRESHOLD", 0.2))
+    PAYMENT_ROUTING_COOLDOWN = float(os.getenv("PAYMENT_ROUTING_COOLDOWN", 60))
+    CIRCUIT_OPEN_TIMEOUT = float(os.getenv("CIRCUIT_OPEN_TIMEOUT", 30))
+    CIRCUIT_MAX_OPEN_TIMEOUT = float(os.getenv("CIRCUIT_MAX_OPEN_TIMEOUT", 300))
+    CIRCUIT_PROBE_INTERVAL = float(os.getenv("CIRCUIT_PROBE_INTERVAL", 5))
+    CIRCUIT_PROBE_TIMEOUT = float(os.getenv("CIRCUIT_PROBE_TIMEOUT", 10))
+    NICEPAY_RETRY_DELAY = float(os.getenv("NICEPAY_RETRY_DELAY", 0.5))
+    
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+    JOB_REQUISITES_CONCURRENCY = int(os.getenv("JOB_REQUISITES_CONCURRENCY", 8))
+    REQUISITES_MAX_ATTEMPTS = int(os.getenv("REQUISITES_MAX_ATTEMPTS", 3))
+    REQUISITES_RETRY_DELAY = float(os.getenv("REQUISITES_RETRY_DELAY", 60))
+    STATUS_POLL_TICK = float(os.getenv("STATUS_POLL_TICK", 5))
+    STATUS_POLL_FAST_INTERVAL = float(os.getenv("STATUS_POLL_FAST_INTERVAL", 15))
+    STATUS_POLL_INTERVAL = float(os.getenv("STATUS_POLL_INTERVAL", 30))
+    STATUS_POLL_SLOW_INTERVAL = float(os.getenv("STATUS_POLL_SLOW_INTERVAL", 60))
+    STATUS_POLL_CONCURRENCY = int(os.getenv("STATUS_POLL_CONCURRENCY", 4))
+    STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", 10))
+    
+    BOT_WORKERS = int(os.getenv("BOT_WORKERS", 1))
+    WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", 10))
+    WORKER_RESTART_BACKOFF = float(os.getenv("WORKER_RESTART_BACKOFF", 1))
+    WORKER_MAX_RESTART_BACKOFF = float(os.getenv("WORKER_MAX_RESTART_BACKOFF", 60))
+    
+    WEB_SERVER_HOST = os.getenv("WEB_SERVER_HOST", "0.0.0.0")
+    WEB_SERVER_PORT = int(os.getenv("WEB_SERVER_PORT", 8080))
+    WEB_SHUTDOWN_TIMEOUT = float(os.getenv("WEB_SHUTDOWN_TIMEOUT", 10))
+    TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+    TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram")
+    TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+    TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_WEBHOOK_MAX_CONNECTIONS", 40))
+    TELEGRAM_MAX_CONCURRENT_UPDATES = int(os.getenv("TELEGRAM_MAX_CONCURRENT_UPDATES", 20))
+    PAYMENT_WEBHOOKS_ENABLED = os.getenv("PAYMENT_WEBHOOKS_ENABLED", "true").lower() == "true"
+    PAYMENT_WEBHOOK_PATH = os.getenv("PAYMENT_WEBHOOK_PATH", "/webhooks/payments")
+    PAYMENT_WEBHOOK_CONCURRENCY = int(os.getenv("PAYMENT_WEBHOOK_CONCURRENCY", 8))
+    ONLYPAYS_WEBHOOK_SECRET = os.getenv("ONLYPAYS_WEBHOOK_SECRET", "")
+    PSPWARE_WEBHOOK_SECRET = os.getenv("PSPWARE_WEBHOOK_SECRET", "")
+    GREENGO_WEBHOOK_SECRET = os.getenv("GREENGO_WEBHOOK_SECRET", "")
+    NICEPAY_WEBHOOK_SECRET = os.getenv("NICEPAY_WEBHOOK_SECRET", "")
+    
+    RATE_CACHE_TTL = float(os.getenv("RATE_CACHE_TTL", 30))
+    RATE_REFRESH_INTERVAL = float(os.getenv("RATE_REFRESH_INTERVAL", 20))
+    RATE_MAX_STALE = float(os.getenv("RATE_MAX_STALE", 600))
+    RATE_SOURCE_TIMEOUT = float(os.getenv("RATE_SOURCE_TIMEOUT", 5))
+    RATE_MIN_SOURCES = int(os.getenv("RATE_MIN_SOURCES", 2))
+    RATE_OUTLIER_MAD = float(os.getenv("RATE_OUTLIER_MAD", 3.5))
+    RATE_MAX_DEVIATION = float(os.getenv("RATE_MAX_DEVIATION", 0.05))
+    RATE_STATIC_SOURCES = os.getenv("RATE_STATIC_SOURCES", "")
+    RATE_HISTORY_SIZE = int(os.getenv("RATE_HISTORY_SIZE", 8640))
+    RATE_QUOTE_TTL = float(os.getenv("RATE_QUOTE_TTL", 600))
+    
+    BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))
+    BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 10))
+    BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", 3))
     
     CAPTCHA_ENABLED = os.getenv("CAPTCHA_ENABLED", "true").lower() == "true"
+    CAPTCHA_POOL_SIZE = int(os.getenv("CAPTCHA_POOL_SIZE", 200))
+    CAPTCHA_POOL_LOW_WATER = int(os.getenv("CAPTCHA_POOL_LOW_WATER", 50))
+    CAPTCHA_POOL_WORKERS = int(os.getenv("CAPTCHA_POOL_WORKERS", 2))
+    CAPTCHA_SESSION_TTL = float(os.getenv("CAPTCHA_SESSION_TTL", 600))
+    CAPTCHA_SESSION_MAX = int(os.getenv("CAPTCHA_SESSION_MAX", 10000))
+    CAPTCHA_SESSION_PERSIST = os.getenv("CAPTCHA_SESSION_PERSIST", "false").lower() == "true"
+    CAPTCHA_SESSION_FLUSH_INTERVAL = float(os.getenv("CAPTCHA_SESSION_FLUSH_INTERVAL", 5))
     MIN_AMOUNT = int(os.getenv("MIN_AMOUNT", 2000))
     MAX_AMOUNT = int(os.getenv("MAX_AMOUNT", 100000))
+    ORDER_TTL_SECONDS = int(os.getenv("ORDER_TTL_SECONDS", 1800))
     
     
     ADMIN_USER_ID = int(os.getenv("ADMIN_USER_ID", 0))
@@ -143,6 +228,26 @@ class Config:
         mirror_config = self.get_mirror_config(mirror_id)
         return mirror_config.get(key, getattr(self, key, default))
     
+    def get_storage_profile(self):
+                                                              
+        return {
+            'journal_mode': self.SQLITE_JOURNAL_MODE,
+            'synchronous': self.SQLITE_SYNCHRONOUS,
+            'mmap_size': self.SQLITE_MMAP_SIZE,
+            'cache_size': self.SQLITE_CACHE_SIZE,
+            'busy_timeout': self.SQLITE_BUSY_TIMEOUT,
+            'temp_store': self.SQLITE_TEMP_STORE,
+        }
+    
+    def get_payment_webhook_secrets(self):
+                                                              
+        return {
+            'onlypays': self.ONLYPAYS_WEBHOOK_SECRET,
+            'pspware': self.PSPWARE_WEBHOOK_SECRET,
+            'greengo': self.GREENGO_WEBHOOK_SECRET,
+            'nicepay': self.NICEPAY_WEBHOOK_SECRET,
+        }
+    
     def get_all_bot_tokens(self):
                                                                
         tokens = [self.BOT_TOKEN] if self.BOT_TOKEN else []
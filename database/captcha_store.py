@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from database.pool import ConnectionPool
+from database.expiry import parse_created_at
+
+logger = logging.getLogger(__name__)
+
+SessionKey = Tuple[str, int]
+
+
+def format_created_at(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class CaptchaSessionStore:
+    def __init__(self, pool: ConnectionPool, ttl: float = 600.0, max_size: int = 10000,
+                 persist: bool = False, flush_interval: float = 5.0):
+        self.pool = pool
+        self.ttl = ttl
+        self.max_size = max_size
+        self.persist = persist
+        self.flush_interval = flush_interval
+        self._sessions: "OrderedDict[SessionKey, Dict[str, Any]]" = OrderedDict()
+        self._dirty: Dict[SessionKey, Optional[Dict[str, Any]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {'created': 0, 'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0, 'flushes': 0, 'flushed': 0}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _mark(self, key: SessionKey, session: Optional[Dict[str, Any]]):
+        if self.persist:
+            self._dirty[key] = session
+
+    def _expired(self, session: Dict[str, Any], now: float) -> bool:
+        return now - session['created_ts'] >= self.ttl
+
+    def create(self, mirror_id: str, user_id: int, answer: str) -> Dict[str, Any]:
+        key = (mirror_id, user_id)
+        now = time.time()
+        session = {
+            'user_id': user_id,
+            'answer': answer,
+            'attempts': 0,
+            'created_at': format_created_at(now),
+            'created_ts': now,
+            'mirror_id': mirror_id,
+        }
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        self._mark(key, session)
+        self._stats['created'] += 1
+        while len(self._sessions) > self.max_size:
+            evicted, _ = self._sessions.popitem(last=False)
+            self._mark(evicted, None)
+            self._stats['evicted'] += 1
+        return dict(session)
+
+    def _lookup(self, mirror_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        key = (mirror_id, user_id)
+        session = self._sessions.get(key)
+        if session is None:
+            self._stats['misses'] += 1
+            return None
+        if self._expired(session, time.time()):
+            del self._sessions[key]
+            self._mark(key, None)
+            self._stats['expired'] += 1
+            return None
+        self._sessions.move_to_end(key)
+        self._stats['hits'] += 1
+        return session
+
+    def get(self, mirror_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        session = self._lookup(mirror_id, user_id)
+        return dict(session) if session is not None else None
+
+    def record_attempt(self, mirror_id: str, user_id: int) -> int:
+        session = self._lookup(mirror_id, user_id)
+        if session is None:
+            return 0
+        session['attempts'] += 1
+        self._mark((mirror_id, user_id), session)
+        return session['attempts']
+
+    def set_answer(self, mirror_id: str, user_id: int, answer: str) -> bool:
+        session = self._lookup(mirror_id, user_id)
+        if session is None:
+            return False
+        session['answer'] = answer
+        self._mark((mirror_id, user_id), session)
+        return True
+
+    def delete(self, mirror_id: str, user_id: int):
+        key = (mirror_id, user_id)
+        if self._sessions.pop(key, None) is not None:
+            self._mark(key, None)
+
+    def purge(self) -> int:
+        now = time.time()
+        expired = [key for key, session in self._sessions.items() if self._expired(session, now)]
+        for key in expired:
+            del self._sessions[key]
+            self._mark(key, None)
+        self._stats['expired'] += len(expired)
+        return len(expired)
+
+    async def load(self) -> int:
+        cutoff = format_created_at(time.time() - self.ttl)
+        async with self.pool.reader() as conn:
+            async with conn.execute(
+                'SELECT user_id, answer, attempts, created_at, mirror_id FROM captcha_sessions WHERE created_at >= ?',
+                (cutoff,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        for user_id, answer, attempts, created_at, mirror_id in rows:
+            created_ts = parse_created_at(f"{created_at}+00:00")
+            self._sessions[(mirror_id, user_id)] = {
+                'user_id': user_id,
+                'answer': answer,
+                'attempts': attempts or 0,
+                'created_at': created_at,
+                'created_ts': created_ts,
+                'mirror_id': mirror_id,
+            }
+        logger.info(f"Загружено сессий капчи: {len(rows)}")
+        return len(rows)
+
+    async def flush(self) -> int:
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, {}
+        upserts = [
+            (session['user_id'], session['answer'], session['attempts'], session['created_at'], session['mirror_id'])
+            for session in dirty.values() if session is not None
+        ]
+        deletes = [(user_id, mirror_id) for (mirror_id, user_id), session in dirty.items() if session is None]
+        try:
+            async with self.pool.writer() as conn:
+                if deletes:
+                    await conn.executemany('DELETE FROM captcha_sessions WHERE user_id = ? AND mirror_id = ?', deletes)
+                if upserts:
+                    await conn.executemany('''
+                        INSERT OR REPLACE INTO captcha_sessions (user_id, answer, attempts, created_at, mirror_id)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', upserts)
+                await conn.execute('DELETE FROM captcha_sessions WHERE created_at < ?', (format_created_at(time.time() - self.ttl),))
+                await conn.commit()
+        except Exception:
+            for key, session in dirty.items():
+                self._dirty.setdefault(key, session)
+            raise
+        self._stats['flushes'] += 1
+        self._stats['flushed'] += len(dirty)
+        return len(dirty)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.purge()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения сессий капчи: {e}")
+
+    async def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        if self.persist:
+            await self.load()
+        self._task = asyncio.create_task(self._loop(), name="captcha_sessions")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения сессий капчи: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'size': len(self._sessions), 'pending': len(self._dirty), 'persist': self.persist}
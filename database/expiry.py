@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from database.pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+ExpiredCallback = Callable[[List[Dict[str, Any]]], Awaitable[Any]]
+
+
+def parse_created_at(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+class OrderExpiryScheduler:
+    def __init__(self, pool: ConnectionPool, ttl: float = 1800, batch_size: int = 200,
+                 tick: float = 1.0, scan_interval: float = 5.0):
+        self.pool = pool
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.tick = tick
+        self.scan_interval = scan_interval
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+        self._last_seen_id = 0
+        self._next_scan = 0.0
+        self._callbacks: List[ExpiredCallback] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pending = set()
+        self._stats = {'expired': 0, 'batches': 0, 'rebuilds': 0}
+
+    def on_expired(self, callback: ExpiredCallback):
+        self._callbacks.append(callback)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def track(self, order_id: int, created_at: Any = None):
+        if self.running:
+            self._schedule(order_id, created_at)
+
+    def _schedule(self, order_id: int, created_at: Any = None):
+        deadline = (parse_created_at(created_at) if created_at is not None else time.time()) + self.ttl
+        if self._deadlines.get(order_id) == deadline:
+            return
+        self._deadlines[order_id] = deadline
+        heapq.heappush(self._heap, (deadline, order_id))
+        if self._wakeup is not None and self._heap[0] == (deadline, order_id):
+            self._wakeup.set()
+
+    def forget(self, order_id: int):
+        self._deadlines.pop(order_id, None)
+
+    def remaining(self, order_id: int) -> Optional[float]:
+        deadline = self._deadlines.get(order_id)
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.time())
+
+    async def rebuild(self) -> int:
+        self._heap = []
+        self._deadlines = {}
+        self._last_seen_id = 0
+        await self._scan()
+        self._stats['rebuilds'] += 1
+        logger.info(f"Планировщик истечения заявок: отслеживается {len(self._deadlines)} заявок")
+        return len(self._deadlines)
+
+    async def _scan(self):
+        async with self.pool.reader() as conn:
+            async with conn.execute('''
+                SELECT id, created_at FROM orders
+                WHERE status = 'waiting' AND id > ?
+                ORDER BY id
+            ''', (self._last_seen_id,)) as cursor:
+                rows = await cursor.fetchall()
+        for order_id, created_at in rows:
+            self._schedule(order_id, created_at)
+        if rows:
+            self._last_seen_id = rows[-1][0]
+        self._next_scan = time.monotonic() + self.scan_interval
+
+    def _pop_due(self, now: float) -> List[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            deadline, order_id = heapq.heappop(self._heap)
+            if self._deadlines.get(order_id) != deadline:
+                continue
+            del self._deadlines[order_id]
+            due.append(order_id)
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._deadlines):
+            self._heap = [(deadline, order_id) for order_id, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        return due
+
+    async def expire(self, order_ids: List[int]) -> List[Dict[str, Any]]:
+        if not order_ids:
+            return []
+        placeholders = ','.join('?' * len(order_ids))
+        async with self.pool.writer() as conn:
+            async with conn.execute(
+                f"SELECT * FROM orders WHERE id IN ({placeholders}) AND status = 'waiting'",
+                order_ids
+            ) as cursor:
+                orders = [dict(row) for row in await cursor.fetchall()]
+            if orders:
+                expired_ids = [order['id'] for order in orders]
+                await conn.execute(
+                    f"UPDATE orders SET status = 'expired' WHERE id IN ({','.join('?' * len(expired_ids))}) AND status = 'waiting'",
+                    expired_ids
+                )
+            await conn.commit()
+        if orders:
+            self._stats['expired'] += len(orders)
+            self._stats['batches'] += 1
+            logger.info(f"Истекли заявки: {', '.join(str(order['id']) for order in orders)}")
+        return orders
+
+    async def _run_callbacks(self, orders: List[Dict[str, Any]]):
+        for callback in self._callbacks:
+            try:
+                await callback(orders)
+            except Exception as e:
+                logger.error(f"Ошибка обработки истекших заявок: {e}")
+
+    async def run_once(self, now: float = None) -> List[Dict[str, Any]]:
+        if time.monotonic() >= self._next_scan:
+            await self._scan()
+        due = self._pop_due(time.time() if now is None else now)
+        orders = await self.expire(due)
+        if orders and self._callbacks:
+            task = asyncio.create_task(self._run_callbacks(orders))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        return orders
+
+    async def _loop(self):
+        while True:
+            try:
+                orders = await self.run_once()
+                if orders and self._heap and self._heap[0][0] <= time.time():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка планировщика истечения заявок: {e}")
+            delay = self.tick
+            if self._heap:
+                delay = min(delay, max(0.0, self._heap[0][0] - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0.05))
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        await self.rebuild()
+        self._task = asyncio.create_task(self._loop(), name="order_expiry")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        next_deadline = self._heap[0][0] - time.time() if self._heap else None
+        return {
+            **self._stats,
+            'tracked': len(self._deadlines),
+            'heap': len(self._heap),
+            'next_in': max(0.0, next_deadline) if next_deadline is not None else None,
+        }
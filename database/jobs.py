@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiosqlite
+
+from database.pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[Any]]
+
+
+class RetryJob(Exception):
+    def __init__(self, delay: float = None, reason: str = ""):
+        super().__init__(reason or "retry requested")
+        self.delay = delay
+
+
+class JobQueue:
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self._wakeups: Dict[str, asyncio.Event] = {}
+
+    def _event(self, job_type: str) -> asyncio.Event:
+        event = self._wakeups.get(job_type)
+        if event is None:
+            event = self._wakeups[job_type] = asyncio.Event()
+        return event
+
+    def notify(self, job_type: str):
+        self._event(job_type).set()
+
+    @staticmethod
+    async def insert(conn: aiosqlite.Connection, job_type: str, payload: Dict[str, Any], dedup_key: str = None,
+                     delay: float = 0, max_attempts: int = 3) -> Optional[int]:
+        now = time.time()
+        cursor = await conn.execute('''
+            INSERT OR IGNORE INTO jobs (job_type, payload, dedup_key, max_attempts, run_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (job_type, json.dumps(payload, ensure_ascii=False), dedup_key, max_attempts, now + delay, now, now))
+        return cursor.lastrowid if cursor.rowcount else None
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], dedup_key: str = None,
+                      delay: float = 0, max_attempts: int = 3) -> Optional[int]:
+        async with self.pool.writer() as conn:
+            job_id = await self.insert(conn, job_type, payload, dedup_key, delay, max_attempts)
+            await conn.commit()
+        if job_id is None:
+            logger.debug(f"Задача {job_type} с ключом {dedup_key} уже в очереди")
+        elif delay <= 0:
+            self.notify(job_type)
+        return job_id
+
+    async def lease(self, job_type: str, limit: int, lease_seconds: float, worker: str) -> List[Dict[str, Any]]:
+        if limit <= 0:
+            return []
+        now = time.time()
+        async with self.pool.writer() as conn:
+            await conn.execute('BEGIN IMMEDIATE')
+            cursor = await conn.execute('''
+                UPDATE jobs
+                SET status = 'failed', lease_until = NULL, last_error = 'lease expired after final attempt', updated_at = ?
+                WHERE job_type = ? AND status = 'running' AND lease_until < ? AND attempts >= max_attempts
+            ''', (now, job_type, now))
+            if cursor.rowcount:
+                logger.warning(f"Задачи {job_type}: {cursor.rowcount} исчерпали попытки после истечения аренды")
+            async with conn.execute('''
+                SELECT id FROM jobs
+                WHERE job_type = ?
+                  AND ((status = 'queued' AND run_at <= ?)
+                       OR (status = 'running' AND lease_until < ? AND attempts < max_attempts))
+                ORDER BY run_at
+                LIMIT ?
+            ''', (job_type, now, now, limit)) as cursor:
+                ids = [row[0] for row in await cursor.fetchall()]
+            if not ids:
+                await conn.commit()
+                return []
+            placeholders = ','.join('?' * len(ids))
+            await conn.execute(f'''
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, lease_until = ?, worker = ?, updated_at = ?
+                WHERE id IN ({placeholders})
+            ''', (now + lease_seconds, worker, now, *ids))
+            async with conn.execute(f'SELECT * FROM jobs WHERE id IN ({placeholders}) ORDER BY run_at', ids) as cursor:
+                rows = [dict(row) for row in await cursor.fetchall()]
+            await conn.commit()
+        for row in rows:
+            row['payload'] = json.loads(row['payload'] or '{}')
+        return rows
+
+    async def complete(self, job: Dict[str, Any]) -> bool:
+        async with self.pool.writer() as conn:
+            cursor = await conn.execute('''
+                UPDATE jobs SET status = 'done', lease_until = NULL, last_error = NULL, updated_at = ?
+                WHERE id = ? AND status = 'running' AND worker = ? AND attempts = ?
+            ''', (time.time(), job['id'], job['worker'], job['attempts']))
+            await conn.commit()
+        return self._owned(job, cursor.rowcount)
+
+    async def fail(self, job: Dict[str, Any], error: str, retry_delay: Optional[float]) -> bool:
+        now = time.time()
+        fence = (job['id'], job['worker'], job['attempts'])
+        async with self.pool.writer() as conn:
+            if retry_delay is not None and job['attempts'] < job['max_attempts']:
+                cursor = await conn.execute('''
+                    UPDATE jobs SET status = 'queued', run_at = ?, lease_until = NULL, last_error = ?, updated_at = ?
+                    WHERE id = ? AND status = 'running' AND worker = ? AND attempts = ?
+                ''', (now + retry_delay, error[:1000], now, *fence))
+            else:
+                cursor = await conn.execute('''
+                    UPDATE jobs SET status = 'failed', lease_until = NULL, last_error = ?, updated_at = ?
+                    WHERE id = ? AND status = 'running' AND worker = ? AND attempts = ?
+                ''', (error[:1000], now, *fence))
+            await conn.commit()
+        return self._owned(job, cursor.rowcount)
+
+    @staticmethod
+    def _owned(job: Dict[str, Any], rowcount: int) -> bool:
+        if rowcount:
+            return True
+        logger.warning(
+            f"Задача {job['job_type']} #{job['id']}: аренда попытки {job['attempts']} потеряна, "
+            f"результат воркера {job['worker']} отброшен"
+        )
+        return False
+
+    async def purge(self, older_than: float = 86400) -> int:
+        async with self.pool.writer() as conn:
+            cursor = await conn.execute('''
+                DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?
+            ''', (time.time() - older_than,))
+            await conn.commit()
+            return cursor.rowcount
+
+    async def stats(self) -> Dict[str, Dict[str, int]]:
+        result: Dict[str, Dict[str, int]] = {}
+        async with self.pool.reader() as conn:
+            async with conn.execute('''
+                SELECT job_type, status, COUNT(*) FROM jobs GROUP BY job_type, status
+            ''') as cursor:
+                for job_type, status, count in await cursor.fetchall():
+                    result.setdefault(job_type, {})[status] = count
+        return result
+
+
+class JobWorkerPool:
+    def __init__(self, queue: JobQueue, poll_interval: float = 1.0):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers: Dict[str, Dict[str, Any]] = {}
+        self._loops: List[asyncio.Task] = []
+        self._active: Dict[str, set] = {}
+        self._running = False
+
+    def register(self, job_type: str, handler: JobHandler, concurrency: int = 4,
+                 lease_seconds: float = 300, backoff: float = 30, max_backoff: float = 900):
+        self._handlers[job_type] = {
+            'handler': handler,
+            'concurrency': max(1, concurrency),
+            'lease_seconds': lease_seconds,
+            'backoff': backoff,
+            'max_backoff': max_backoff,
+        }
+        self._active.setdefault(job_type, set())
+
+    def _retry_delay(self, spec: Dict[str, Any], attempts: int) -> float:
+        delay = min(spec['backoff'] * 2 ** max(0, attempts - 1), spec['max_backoff'])
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _run_job(self, job_type: str, spec: Dict[str, Any], job: Dict[str, Any]):
+        try:
+            await spec['handler'](job['payload'], job)
+        except asyncio.CancelledError:
+            raise
+        except RetryJob as e:
+            delay = e.delay if e.delay is not None else self._retry_delay(spec, job['attempts'])
+            logger.info(f"Задача {job_type} #{job['id']} будет повторена через {delay:.0f} сек: {e}")
+            await self.queue.fail(job, str(e), delay)
+        except Exception as e:
+            logger.error(f"Ошибка задачи {job_type} #{job['id']} (попытка {job['attempts']}/{job['max_attempts']}): {e}")
+            await self.queue.fail(job, str(e), self._retry_delay(spec, job['attempts']))
+        else:
+            await self.queue.complete(job)
+
+    async def _loop(self, job_type: str):
+        spec = self._handlers[job_type]
+        active = self._active[job_type]
+        wakeup = self.queue._event(job_type)
+        while self._running:
+            try:
+                free = spec['concurrency'] - len(active)
+                jobs = await self.queue.lease(job_type, free, spec['lease_seconds'], self.worker_id)
+                for job in jobs:
+                    task = asyncio.create_task(self._run_job(job_type, spec, job), name=f"job_{job_type}_{job['id']}")
+                    active.add(task)
+                    task.add_done_callback(active.discard)
+                    task.add_done_callback(lambda _: wakeup.set())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка выборки задач {job_type}: {e}")
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        for job_type in self._handlers:
+            self._loops.append(asyncio.create_task(self._loop(job_type), name=f"job_loop_{job_type}"))
+        logger.info(f"Очередь задач запущена ({self.worker_id}): {', '.join(self._handlers)}")
+
+    async def stop(self):
+        self._running = False
+        tasks = list(self._loops)
+        for active in self._active.values():
+            tasks.extend(active)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._loops = []
+        logger.info("Очередь задач остановлена")
+
+    def active_counts(self) -> Dict[str, int]:
+        return {job_type: len(active) for job_type, active in self._active.items()}
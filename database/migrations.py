@@ -0,0 +1,254 @@
+import logging
+from typing import Awaitable, Callable, List, Tuple
+
+import aiosqlite
+
+from database.stats import create_stats_tables, install_stats_triggers, rebuild_stats
+from database.turnover import create_rollup_tables, install_rollup_triggers
+
+logger = logging.getLogger(__name__)
+
+Migration = Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+
+async def _column_names(db: aiosqlite.Connection, table: str) -> List[str]:
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        return [col[1] for col in await cursor.fetchall()]
+
+
+async def _legacy_columns(db: aiosqlite.Connection):
+    column_names = await _column_names(db, 'users')
+    if 'referral_count' not in column_names:
+        await db.execute('ALTER TABLE users ADD COLUMN referral_count INTEGER DEFAULT 0')
+    if 'mirror_id' not in column_names:
+        await db.execute('ALTER TABLE users ADD COLUMN mirror_id TEXT DEFAULT "main"')
+
+    for table in ['orders', 'settings', 'captcha_sessions', 'referral_bonuses', 'reviews']:
+        if 'mirror_id' not in await _column_names(db, table):
+            await db.execute(f'ALTER TABLE {table} ADD COLUMN mirror_id TEXT DEFAULT "main"')
+
+
+async def _hot_path_indexes(db: aiosqlite.Connection):
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_orders_mirror_status ON orders (mirror_id, status)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_users_referred_by ON users (referred_by)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_users_mirror_blocked ON users (mirror_id, is_blocked)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_settings_key_mirror ON settings (key, mirror_id, value)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_reviews_user_mirror_created ON reviews (user_id, mirror_id, created_at)')
+
+
+async def _jobs_table(db: aiosqlite.Connection):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_type TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            dedup_key TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_at REAL NOT NULL,
+            lease_until REAL,
+            worker TEXT,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    await db.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup_active
+        ON jobs (dedup_key) WHERE dedup_key IS NOT NULL AND status IN ('queued', 'running')
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (job_type, status, run_at)')
+
+
+async def _drop_expire_jobs(db: aiosqlite.Connection):
+    await db.execute("DELETE FROM jobs WHERE job_type = 'expire_order'")
+
+
+async def _payment_webhooks_table(db: aiosqlite.Connection):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS payment_webhooks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            provider TEXT NOT NULL,
+            order_ref TEXT NOT NULL,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            received_at REAL NOT NULL,
+            processed_at REAL,
+            UNIQUE (provider, order_ref, status)
+        )
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_payment_webhooks_received ON payment_webhooks (received_at)')
+
+
+async def _worker_heartbeats_table(db: aiosqlite.Connection):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS worker_heartbeats (
+            worker_id TEXT PRIMARY KEY,
+            shard INTEGER NOT NULL,
+            pid INTEGER NOT NULL,
+            bots TEXT NOT NULL DEFAULT '',
+            roles TEXT NOT NULL DEFAULT '',
+            status TEXT NOT NULL DEFAULT 'running',
+            restarts INTEGER NOT NULL DEFAULT 0,
+            cpu_percent REAL NOT NULL DEFAULT 0,
+            rss INTEGER NOT NULL DEFAULT 0,
+            loop_lag_ms REAL NOT NULL DEFAULT 0,
+            events INTEGER NOT NULL DEFAULT 0,
+            started_at REAL NOT NULL,
+            last_seen REAL NOT NULL
+        )
+    ''')
+
+
+async def _broadcast_tables(db: aiosqlite.Connection):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mirror_id TEXT NOT NULL,
+            admin_chat_id INTEGER NOT NULL,
+            from_chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            progress_message_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'running',
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_recipients (
+            job_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (job_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs (status)')
+
+
+async def _broadcast_segments(db: aiosqlite.Connection):
+    columns = await _column_names(db, 'broadcast_jobs')
+    if 'segment' not in columns:
+        await db.execute("ALTER TABLE broadcast_jobs ADD COLUMN segment TEXT NOT NULL DEFAULT 'all'")
+    if 'segment_sql' not in columns:
+        await db.execute("ALTER TABLE broadcast_jobs ADD COLUMN segment_sql TEXT NOT NULL DEFAULT 'is_blocked = FALSE'")
+    if 'segment_params' not in columns:
+        await db.execute("ALTER TABLE broadcast_jobs ADD COLUMN segment_params TEXT NOT NULL DEFAULT '[]'")
+    if 'max_user_row' not in columns:
+        await db.execute('ALTER TABLE broadcast_jobs ADD COLUMN max_user_row INTEGER')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_users_blocked ON users (is_blocked, user_id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_users_total_operations ON users (total_operations, user_id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_users_registration_date ON users (registration_date, user_id)')
+
+
+async def _stats_counters(db: aiosqlite.Connection):
+    await create_stats_tables(db)
+    await install_stats_triggers(db)
+    await rebuild_stats(db)
+
+
+async def _settings_versions(db: aiosqlite.Connection):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS settings_versions (
+            mirror_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    bump = (
+        "INSERT INTO settings_versions (mirror_id, version) VALUES (COALESCE({r}.mirror_id, 'main'), 1) "
+        "ON CONFLICT(mirror_id) DO UPDATE SET version = version + 1;"
+    )
+    for event, rows in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',))):
+        name = f"settings_version_{event.lower()}"
+        body = '\n'.join(bump.format(r=row) for row in rows)
+        await db.execute(f"DROP TRIGGER IF EXISTS {name}")
+        await db.execute(f"CREATE TRIGGER {name} AFTER {event} ON settings BEGIN\n{body}\nEND")
+
+
+async def _captcha_sessions_per_mirror(db: aiosqlite.Connection):
+    async with db.execute("PRAGMA table_info(captcha_sessions)") as cursor:
+        primary_key = [col[1] for col in sorted(await cursor.fetchall(), key=lambda col: col[5]) if col[5]]
+    if primary_key == ['user_id', 'mirror_id']:
+        return
+    await db.execute('''
+        CREATE TABLE captcha_sessions_new (
+            user_id INTEGER NOT NULL,
+            answer TEXT NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            mirror_id TEXT NOT NULL DEFAULT 'main',
+            PRIMARY KEY (user_id, mirror_id)
+        )
+    ''')
+    await db.execute('''
+        INSERT OR REPLACE INTO captcha_sessions_new (user_id, answer, attempts, created_at, mirror_id)
+        SELECT user_id, answer, attempts, created_at, COALESCE(mirror_id, 'main') FROM captcha_sessions
+    ''')
+    await db.execute('DROP TABLE captcha_sessions')
+    await db.execute('ALTER TABLE captcha_sessions_new RENAME TO captcha_sessions')
+
+
+async def _turnover_indexes(db: aiosqlite.Connection):
+    await db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_turnover_mirror_status_created
+        ON mirror_turnover (mirror_id, status, created_at, amount)
+    ''')
+    await db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_turnover_status_created
+        ON mirror_turnover (status, created_at, amount)
+    ''')
+
+
+MAIN_MIGRATIONS: List[Migration] = [
+    (1, "legacy mirror/referral columns", _legacy_columns),
+    (2, "hot path indexes", _hot_path_indexes),
+    (3, "durable job queue", _jobs_table),
+    (4, "order expiry moved to scheduler", _drop_expire_jobs),
+    (5, "payment webhook inbox", _payment_webhooks_table),
+    (6, "worker heartbeats", _worker_heartbeats_table),
+    (7, "resumable broadcasts", _broadcast_tables),
+    (8, "broadcast audience segments", _broadcast_segments),
+    (9, "incremental statistics counters", _stats_counters),
+    (10, "settings change versions", _settings_versions),
+    (11, "captcha sessions keyed per mirror", _captcha_sessions_per_mirror),
+]
+
+CENTRAL_MIGRATIONS: List[Migration] = [
+    (1, "turnover indexes", _turnover_indexes),
+    (2, "turnover rollups", create_rollup_tables),
+    (3, "turnover rollup triggers", install_rollup_triggers),
+]
+
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    async with db.execute('PRAGMA user_version') as cursor:
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+
+async def apply_migrations(db: aiosqlite.Connection, migrations: List[Migration], label: str) -> int:
+    version = await get_schema_version(db)
+    pending = [m for m in sorted(migrations, key=lambda m: m[0]) if m[0] > version]
+    if not pending:
+        logger.debug(f"Схема {label} актуальна (версия {version})")
+        return version
+
+    for target, title, migrate in pending:
+        try:
+            await db.execute('BEGIN')
+            await migrate(db)
+            await db.execute(f'PRAGMA user_version = {int(target)}')
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Ошибка миграции {label} до версии {target} ({title}): {e}")
+            raise
+        version = target
+        logger.info(f"Схема {label} обновлена до версии {target}: {title}")
+    return version
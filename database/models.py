@@ -4,27 +4,122 @@ import json
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from config import config
+from database.pool import ConnectionPool
+from database.settings_cache import SettingsCache, MISSING
+from database.migrations import apply_migrations, MAIN_MIGRATIONS, CENTRAL_MIGRATIONS
+from database.jobs import JobQueue
+from database.expiry import OrderExpiryScheduler, parse_created_at
+from database.captcha_store import CaptchaSessionStore
+from database.segments import Segment
+from database.stats import rebuild_stats, snapshot_stats
+from database.turnover import TurnoverRollups
 import os
 import asyncio
 
-async def schedule_order_deletion(order_id: int, db_path: str):
-    await asyncio.sleep(1800)
-    try:
-        async with aiosqlite.connect(db_path) as conn:
-            await conn.execute('''
-                DELETE FROM orders
-                WHERE id = ? AND status = 'waiting'
-            ''', (order_id,))
-            await conn.commit()
-            logger.info(f"Order {order_id} deleted after 30 minutes")
-    except Exception as e:
-        logger.error(f"Error deleting order {order_id}: {e}")
+STAFF_SETTINGS = frozenset({"admin_users", "operator_users"})
 
 class Database:
+    _pools: Dict[str, ConnectionPool] = {}
+    _settings_caches: Dict[tuple, SettingsCache] = {}
+    _job_queues: Dict[str, JobQueue] = {}
+    _expiry_schedulers: Dict[str, OrderExpiryScheduler] = {}
+    _captcha_stores: Dict[str, CaptchaSessionStore] = {}
+    _turnover_rollups: Dict[str, TurnoverRollups] = {}
+
     def __init__(self, db_path: str, mirror_id: str = None):
         self.db_path = db_path
         self.mirror_id = mirror_id or config.MIRROR_ID
 
+    @classmethod
+    def get_pool(cls, db_path: str) -> ConnectionPool:
+        pool = cls._pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path, config.DB_POOL_READERS, config.get_storage_profile())
+            cls._pools[db_path] = pool
+        return pool
+
+    @classmethod
+    async def close_pools(cls):
+        for pool in list(cls._pools.values()):
+            await pool.close()
+
+    @classmethod
+    def pool_stats(cls) -> List[Dict[str, Any]]:
+        return [pool.stats() for pool in cls._pools.values()]
+
+    @classmethod
+    def get_job_queue(cls, db_path: str) -> JobQueue:
+        queue = cls._job_queues.get(db_path)
+        if queue is None:
+            queue = JobQueue(cls.get_pool(db_path))
+            cls._job_queues[db_path] = queue
+        return queue
+
+    @property
+    def jobs(self) -> JobQueue:
+        return self.get_job_queue(self.db_path)
+
+    @classmethod
+    def get_expiry_scheduler(cls, db_path: str) -> OrderExpiryScheduler:
+        scheduler = cls._expiry_schedulers.get(db_path)
+        if scheduler is None:
+            scheduler = OrderExpiryScheduler(cls.get_pool(db_path), ttl=config.ORDER_TTL_SECONDS)
+            cls._expiry_schedulers[db_path] = scheduler
+        return scheduler
+
+    @property
+    def expiry(self) -> OrderExpiryScheduler:
+        return self.get_expiry_scheduler(self.db_path)
+
+    @classmethod
+    def get_captcha_store(cls, db_path: str) -> CaptchaSessionStore:
+        store = cls._captcha_stores.get(db_path)
+        if store is None:
+            store = CaptchaSessionStore(
+                cls.get_pool(db_path),
+                ttl=config.CAPTCHA_SESSION_TTL,
+                max_size=config.CAPTCHA_SESSION_MAX,
+                persist=config.CAPTCHA_SESSION_PERSIST,
+                flush_interval=config.CAPTCHA_SESSION_FLUSH_INTERVAL
+            )
+            cls._captcha_stores[db_path] = store
+        return store
+
+    @property
+    def captcha_sessions(self) -> CaptchaSessionStore:
+        return self.get_captcha_store(self.db_path)
+
+    @classmethod
+    def get_turnover_rollups(cls, db_path: str) -> TurnoverRollups:
+        rollups = cls._turnover_rollups.get(db_path)
+        if rollups is None:
+            rollups = TurnoverRollups(cls.get_pool(db_path))
+            cls._turnover_rollups[db_path] = rollups
+        return rollups
+
+    @property
+    def turnover(self) -> TurnoverRollups:
+        return self.get_turnover_rollups(config.CENTRAL_DB_PATH)
+
+    @property
+    def settings_cache(self) -> SettingsCache:
+        cache_key = (self.db_path, self.mirror_id)
+        cache = Database._settings_caches.get(cache_key)
+        if cache is None:
+            cache = SettingsCache(config.SETTINGS_CACHE_TTL, config.SETTINGS_SYNC_INTERVAL)
+            Database._settings_caches[cache_key] = cache
+        return cache
+
+    @classmethod
+    def settings_cache_stats(cls) -> Dict[str, Dict[str, Any]]:
+        return {mirror_id: cache.stats() for (_, mirror_id), cache in cls._settings_caches.items()}
+
+    def reader(self, db_path: str = None):
+        return self.get_pool(db_path or self.db_path).reader()
+
+    def writer(self, db_path: str = None):
+        return self.get_pool(db_path or self.db_path).writer()
+
     async def get_commission_percentage(self):
         return await self.get_setting("commission_percentage", float(os.getenv('COMMISSION_PERCENT', '20.0')))
 
@@ -38,16 +133,12 @@ class Database:
             return None
         
         try:
-            from datetime import datetime, timedelta
-            created_at = datetime.fromisoformat(order['created_at'])
-            current_time = datetime.now()
-            elapsed_time = current_time - created_at
-            
-            deletion_time = timedelta(minutes=30)                                          
-            remaining_time = deletion_time - elapsed_time
+            remaining = self.expiry.remaining(order_id)
+            if remaining is None:
+                remaining = parse_created_at(order['created_at']) + config.ORDER_TTL_SECONDS - datetime.now().timestamp()
             
-            if remaining_time.total_seconds() > 0:
-                total_seconds = int(remaining_time.total_seconds())
+            if remaining > 0:
+                total_seconds = int(remaining)
                 minutes = total_seconds // 60
                 seconds = total_seconds % 60
                 return {
@@ -72,7 +163,8 @@ class Database:
 
 
     async def init_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.get_pool(self.db_path).open()
+        async with self.writer() as db:
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS users (
                     id INTEGER PRIMARY KEY,
@@ -90,7 +182,6 @@ class Database:
                     mirror_id TEXT DEFAULT 'main'
                 )
             ''')
-            await self._migrate_users_table(db)
 
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS orders (
@@ -127,11 +218,12 @@ class Database:
 
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS captcha_sessions (
-                    user_id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
                     answer TEXT NOT NULL,
                     attempts INTEGER DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    mirror_id TEXT DEFAULT 'main'
+                    mirror_id TEXT NOT NULL DEFAULT 'main',
+                    PRIMARY KEY (user_id, mirror_id)
                 )
             ''')
 
@@ -181,41 +273,12 @@ class Database:
 
 
  
-            await self._migrate_mirror_columns(db)
             await db.commit()
-
-    async def _migrate_users_table(self, db):
-        cursor = await db.execute("PRAGMA table_info(users)")
-        columns = await cursor.fetchall()
-        column_names = [col[1] for col in columns]
-        
-        if 'referral_count' not in column_names:
-            await db.execute('ALTER TABLE users ADD COLUMN referral_count INTEGER DEFAULT 0')
-        
-        if 'mirror_id' not in column_names:
-            await db.execute('ALTER TABLE users ADD COLUMN mirror_id TEXT DEFAULT "main"')
-        
-        await db.commit()
-
-
-
-
-    async def _migrate_mirror_columns(self, db):
-        tables_to_migrate = ['orders', 'settings', 'captcha_sessions', 'referral_bonuses', 'reviews']
-        
-        for table in tables_to_migrate:
-            cursor = await db.execute(f"PRAGMA table_info({table})")
-            columns = await cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            
-            if 'mirror_id' not in column_names:
-                await db.execute(f'ALTER TABLE {table} ADD COLUMN mirror_id TEXT DEFAULT "main"')
-        
-        await db.commit()
+            await apply_migrations(db, MAIN_MIGRATIONS, self.db_path)
 
     async def add_user(self, user_id: int, username: str = None,
                       first_name: str = None, last_name: str = None) -> bool:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.writer() as db:
             try:
                 await db.execute('''
                     INSERT INTO users (user_id, username, first_name, last_name, mirror_id)
@@ -227,8 +290,7 @@ class Database:
                 return False
 
     async def get_user(self, user_id: int) -> Optional[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.reader() as db:
             async with db.execute('SELECT * FROM users WHERE user_id = ?', (user_id,)) as cursor:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
@@ -241,26 +303,27 @@ class Database:
         fields = ', '.join([f"{key} = ?" for key in kwargs.keys()])
         values = list(kwargs.values()) + [user_id]
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.writer() as db:
             await db.execute(f'UPDATE users SET {fields} WHERE user_id = ?', values)
             await db.commit()
 
     async def create_order(self, user_id: int, amount_rub: float, amount_btc: float,
                           btc_address: str, rate: float, total_amount: float,
                           payment_type: str) -> int:
-        async with aiosqlite.connect(self.db_path) as db:
+        created_at = datetime.now().isoformat()
+        async with self.writer() as db:
 
             cursor = await db.execute('''
                 INSERT INTO orders (user_id, amount_rub, amount_btc, btc_address, rate, total_amount, payment_type, mirror_id, created_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, amount_rub, amount_btc, btc_address, rate, total_amount, payment_type, self.mirror_id, datetime.now().isoformat()))
+            ''', (user_id, amount_rub, amount_btc, btc_address, rate, total_amount, payment_type, self.mirror_id, created_at))
             await db.commit()
             order_id = cursor.lastrowid
-            asyncio.create_task(schedule_order_deletion(order_id, self.db_path))
+            self.expiry.track(order_id, created_at)
             return order_id
 
     async def get_order_total_amount(self, order_id: int) -> Optional[float]:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.reader() as db:
             async with db.execute('SELECT total_amount FROM orders WHERE id = ?', (order_id,)) as cursor:
                 row = await cursor.fetchone()
                 if row:
@@ -268,14 +331,13 @@ class Database:
                 return None
 
     async def get_order(self, order_id: int) -> Optional[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.reader() as db:
             async with db.execute('SELECT * FROM orders WHERE id = ?', (order_id,)) as cursor:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
 
     async def save_review(self, user_id: int, text: str):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.writer() as db:
             current_time = datetime.now().isoformat()
             cursor = await db.execute(
                 'INSERT INTO reviews (user_id, text, created_at, status, mirror_id) VALUES (?, ?, ?, ?, ?)',
@@ -285,7 +347,7 @@ class Database:
             return cursor.lastrowid
 
     async def get_last_review_time(self, user_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.reader() as db:
             async with db.execute(
                 'SELECT created_at FROM reviews WHERE user_id = ? AND mirror_id = ? ORDER BY created_at DESC LIMIT 1',
                 (user_id, self.mirror_id)
@@ -296,7 +358,7 @@ class Database:
                 return None
 
     async def update_review_status(self, review_id: int, status: str):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.writer() as db:
             await db.execute(
                 'UPDATE reviews SET status = ? WHERE id = ?',
                 (status, review_id)
@@ -325,13 +387,14 @@ class Database:
         if set_clause:
             values.append(order_id)
             query = f"UPDATE orders SET {', '.join(set_clause)} WHERE id = ?"
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(query, tuple(values))
                 await db.commit()
 
     async def init_turnover_db(self):
         central_db_path = config.CENTRAL_DB_PATH
-        async with aiosqlite.connect(central_db_path) as db:
+        await self.get_pool(central_db_path).open()
+        async with self.writer(central_db_path) as db:
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS mirror_turnover (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -344,12 +407,13 @@ class Database:
                 )
             ''')
             await db.commit()
+            await apply_migrations(db, CENTRAL_MIGRATIONS, central_db_path)
         logger.info(f"Turnover database initialized for mirror: {self.mirror_id}")
 
     async def add_turnover_record(self, order_id: int, user_id: int, amount: float, status: str):
         central_db_path = config.CENTRAL_DB_PATH
         try:
-            async with aiosqlite.connect(central_db_path) as db:
+            async with self.writer(central_db_path) as db:
                 await db.execute('''
                     INSERT INTO mirror_turnover (mirror_id, order_id, user_id, amount, status)
                     VALUES (?, ?, ?, ?, ?)
@@ -359,31 +423,28 @@ class Database:
         except Exception as e:
             logger.error(f"Failed to record turnover: {e}")
 
+    async def _scan_turnover(self, mirror_id: str = None, days: int = None):
+        query = "SELECT SUM(amount), COUNT(*) FROM mirror_turnover WHERE status = 'paid'"
+        params: List[Any] = []
+        if mirror_id:
+            query += ' AND mirror_id = ?'
+            params.append(mirror_id)
+        if days is not None:
+            query += " AND created_at >= datetime('now', ?)"
+            params.append(f'-{days} days')
+        async with self.reader(config.CENTRAL_DB_PATH) as db:
+            async with db.execute(query, params) as cursor:
+                result = await cursor.fetchone()
+        return {
+            'total_amount': result[0] if result[0] else 0,
+            'total_orders': result[1] if result[1] else 0
+        }
+
     async def get_total_turnover_by_mirror(self, mirror_id: str = None):
-        central_db_path = config.CENTRAL_DB_PATH
         try:
-            async with aiosqlite.connect(central_db_path) as db:
-                if mirror_id:
-                    query = '''
-                        SELECT SUM(amount) as total, COUNT(*) as orders
-                        FROM mirror_turnover
-                        WHERE mirror_id = ? AND status = 'paid'
-                    '''
-                    params = (mirror_id,)
-                else:
-                    query = '''
-                        SELECT SUM(amount) as total, COUNT(*) as orders
-                        FROM mirror_turnover
-                        WHERE status = 'paid'
-                    '''
-                    params = ()
-
-                async with db.execute(query, params) as cursor:
-                    result = await cursor.fetchone()
-                    return {
-                        'total_amount': result[0] if result[0] else 0,
-                        'total_orders': result[1] if result[1] else 0
-                    }
+            if await self.turnover.is_ready():
+                return await self.turnover.totals('paid', mirror_id)
+            return await self._scan_turnover(mirror_id)
         except Exception as e:
             logger.error(f"Error getting turnover: {e}")
             return {'total_amount': 0, 'total_orders': 0}
@@ -391,8 +452,9 @@ class Database:
     async def get_all_mirrors_turnover(self):
         central_db_path = config.CENTRAL_DB_PATH
         try:
-            async with aiosqlite.connect(central_db_path) as db:
-                db.row_factory = aiosqlite.Row
+            if await self.turnover.is_ready():
+                return await self.turnover.by_mirror('paid')
+            async with self.reader(central_db_path) as db:
                 query = '''
                     SELECT mirror_id, SUM(amount) as total, COUNT(*) as orders
                     FROM mirror_turnover
@@ -408,32 +470,10 @@ class Database:
             return []
 
     async def get_turnover_by_period(self, days: int, mirror_id: str = None):
-        central_db_path = config.CENTRAL_DB_PATH
         try:
-            async with aiosqlite.connect(central_db_path) as db:
-                if mirror_id:
-                    query = '''
-                        SELECT SUM(amount) as total, COUNT(*) as orders
-                        FROM mirror_turnover
-                        WHERE mirror_id = ? AND status = 'paid'
-                        AND created_at >= datetime('now', '-{} days')
-                    '''.format(days)
-                    params = (mirror_id,)
-                else:
-                    query = '''
-                        SELECT SUM(amount) as total, COUNT(*) as orders
-                        FROM mirror_turnover
-                        WHERE status = 'paid'
-                        AND created_at >= datetime('now', '-{} days')
-                    '''.format(days)
-                    params = ()
-
-                async with db.execute(query, params) as cursor:
-                    result = await cursor.fetchone()
-                    return {
-                        'total_amount': result[0] if result[0] else 0,
-                        'total_orders': result[1] if result[1] else 0
-                    }
+            if await self.turnover.is_ready():
+                return await self.turnover.period(days, 'paid', mirror_id)
+            return await self._scan_turnover(mirror_id, days)
         except Exception as e:
             logger.error(f"Error getting period turnover: {e}")
             return {'total_amount': 0, 'total_orders': 0}
@@ -454,24 +494,198 @@ class Database:
             logger.error(f"Error marking order as paid: {e}")
 
     async def get_user_orders(self, user_id: int, limit: int = 5) -> List[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.reader() as db:
             async with db.execute('''
                 SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC LIMIT ?
             ''', (user_id, limit)) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
+    async def get_pollable_orders(self) -> List[Dict]:
+        async with self.reader() as db:
+            async with db.execute('''
+                SELECT id, user_id, total_amount, created_at, mirror_id, personal_id,
+                       onlypays_id, pspware_id, greengo_id
+                FROM orders
+                WHERE status = 'waiting'
+                  AND (onlypays_id IS NOT NULL OR pspware_id IS NOT NULL OR greengo_id IS NOT NULL)
+            ''') as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    async def record_payment_webhook(self, provider: str, order_ref: str, status: str,
+                                     payload: Dict[str, Any], job_type: str = 'payment_webhook') -> Optional[int]:
+        now = datetime.now().timestamp()
+        async with self.writer() as db:
+            cursor = await db.execute('''
+                INSERT OR IGNORE INTO payment_webhooks (provider, order_ref, status, payload, received_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (provider, order_ref, status, json.dumps(payload, ensure_ascii=False), now))
+            if not cursor.rowcount:
+                await db.commit()
+                return None
+            event_id = cursor.lastrowid
+            await JobQueue.insert(
+                db, job_type,
+                {'event_id': event_id, 'provider': provider, 'order_ref': order_ref, 'status': status, 'data': payload},
+                dedup_key=f"webhook:{provider}:{order_ref}:{status}",
+                max_attempts=5
+            )
+            await db.commit()
+        self.jobs.notify(job_type)
+        return event_id
+
+    async def mark_payment_webhook_processed(self, event_id: int):
+        async with self.writer() as db:
+            await db.execute('UPDATE payment_webhooks SET processed_at = ? WHERE id = ?',
+                             (datetime.now().timestamp(), event_id))
+            await db.commit()
+
+    async def get_recorded_webhooks(self, provider: str = None, limit: int = 1000) -> List[Dict]:
+        query = 'SELECT provider, payload FROM payment_webhooks'
+        params: List[Any] = []
+        if provider:
+            query += ' WHERE provider = ?'
+            params.append(provider)
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        async with self.reader() as db:
+            async with db.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+        return [{'provider': row[0], 'payload': json.loads(row[1])} for row in rows]
+
+    async def record_worker_heartbeat(self, heartbeat: Dict[str, Any]):
+        columns = ', '.join(heartbeat)
+        placeholders = ', '.join('?' * len(heartbeat))
+        updates = ', '.join(f"{column} = excluded.{column}" for column in heartbeat if column not in ('worker_id', 'started_at'))
+        async with self.writer() as db:
+            await db.execute(
+                f"INSERT INTO worker_heartbeats ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(worker_id) DO UPDATE SET {updates}",
+                list(heartbeat.values())
+            )
+            await db.commit()
+
+    async def get_worker_heartbeats(self) -> List[Dict]:
+        async with self.reader() as db:
+            async with db.execute('SELECT * FROM worker_heartbeats ORDER BY shard, worker_id') as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def clear_worker_heartbeats(self):
+        async with self.writer() as db:
+            await db.execute('DELETE FROM worker_heartbeats')
+            await db.commit()
+
+    async def count_segment(self, segment: Segment, params: List[Any] = None) -> int:
+        params = segment.params() if params is None else params
+        async with self.reader() as db:
+            async with db.execute(f'SELECT COUNT(*) FROM users WHERE {segment.predicate}', params) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else 0
+
+    async def create_broadcast_job(self, admin_chat_id: int, from_chat_id: int, message_id: int,
+                                   segment: Segment, params: List[Any] = None, mirror_id: str = None) -> int:
+        params = segment.params() if params is None else params
+        now = datetime.now().timestamp()
+        async with self.writer() as db:
+            async with db.execute('SELECT COALESCE(MAX(id), 0) FROM users') as cursor:
+                max_user_row = (await cursor.fetchone())[0]
+            async with db.execute(
+                f'SELECT COUNT(*) FROM users WHERE ({segment.predicate}) AND id <= ?', [*params, max_user_row]
+            ) as cursor:
+                total = (await cursor.fetchone())[0]
+            cursor = await db.execute('''
+                INSERT INTO broadcast_jobs (mirror_id, admin_chat_id, from_chat_id, message_id, total,
+                                            segment, segment_sql, segment_params, max_user_row, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (mirror_id or self.mirror_id, admin_chat_id, from_chat_id, message_id, total,
+                  segment.key, segment.predicate, json.dumps(params), max_user_row, now, now))
+            job_id = cursor.lastrowid
+            await db.commit()
+        return job_id
+
+    async def get_broadcast_job(self, job_id: int) -> Optional[Dict]:
+        async with self.reader() as db:
+            async with db.execute('SELECT * FROM broadcast_jobs WHERE id = ?', (job_id,)) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    async def get_broadcast_jobs(self, status: str = 'running') -> List[Dict]:
+        async with self.reader() as db:
+            async with db.execute('SELECT * FROM broadcast_jobs WHERE status = ? ORDER BY id', (status,)) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def get_pending_broadcast_recipients(self, job: Dict[str, Any], after_user_id: int = 0,
+                                               limit: int = 500) -> List[int]:
+        params = json.loads(job['segment_params'])
+        async with self.reader() as db:
+            async with db.execute(f'''
+                SELECT u.user_id FROM users u
+                WHERE ({job['segment_sql']}) AND u.user_id > ? AND u.id <= ?
+                  AND NOT EXISTS (SELECT 1 FROM broadcast_recipients r WHERE r.job_id = ? AND r.user_id = u.user_id)
+                ORDER BY u.user_id LIMIT ?
+            ''', [*params, after_user_id, job['max_user_row'] or 1 << 62, job['id'], limit]) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def set_broadcast_progress_message(self, job_id: int, message_id: int):
+        async with self.writer() as db:
+            await db.execute('UPDATE broadcast_jobs SET progress_message_id = ? WHERE id = ?', (message_id, job_id))
+            await db.commit()
+
+    async def save_broadcast_results(self, job_id: int, results: List[tuple], status: str = None):
+        now = datetime.now().timestamp()
+        counts = {1: 0, 2: 0, 3: 0}
+        for result, _ in results:
+            counts[result] += 1
+        async with self.writer() as db:
+            if results:
+                await db.executemany(
+                    'INSERT OR REPLACE INTO broadcast_recipients (job_id, user_id, status) VALUES (?, ?, ?)',
+                    [(job_id, user_id, result) for result, user_id in results]
+                )
+            await db.execute('''
+                UPDATE broadcast_jobs
+                SET sent = sent + ?, failed = failed + ?, blocked = blocked + ?, updated_at = ?,
+                    status = COALESCE(?, status), finished_at = CASE WHEN ? IS NULL THEN finished_at ELSE ? END
+                WHERE id = ?
+            ''', (counts[1], counts[2], counts[3], now, status, status, now, job_id))
+            await db.commit()
+
+    @staticmethod
+    def _decode_setting(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except:
+            return raw
+
+    async def _settings_version(self, db) -> int:
+        async with db.execute('SELECT version FROM settings_versions WHERE mirror_id = ?', (self.mirror_id,)) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    async def sync_settings_cache(self, force: bool = False):
+        cache = self.settings_cache
+        if not force and not cache.needs_sync():
+            return
+        async with self.reader() as db:
+            version = await self._settings_version(db)
+        cache.sync(version)
+
     async def get_setting(self, key: str, default: Any = None) -> Any:
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.sync_settings_cache(force=key in STAFF_SETTINGS)
+        found, value = self.settings_cache.lookup(key)
+        if found:
+            return default if value is MISSING else value
+
+        async with self.reader() as db:
             async with db.execute('SELECT value FROM settings WHERE key = ? AND mirror_id = ?', (key, self.mirror_id)) as cursor:
                 row = await cursor.fetchone()
-                if row:
-                    try:
-                        return json.loads(row[0])
-                    except:
-                        return row[0]
-                return default
+        if not row:
+            self.settings_cache.store(key, MISSING)
+            return default
+        value = self._decode_setting(row[0])
+        self.settings_cache.store(key, value)
+        return SettingsCache.copy_value(value)
 
     async def set_setting(self, key: str, value: Any):
         if isinstance(value, (dict, list)):
@@ -479,47 +693,55 @@ class Database:
         else:
             value = str(value)
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.writer() as db:
+            before = await self._settings_version(db)
             await db.execute('''
                 INSERT OR REPLACE INTO settings (key, value, mirror_id) VALUES (?, ?, ?)
             ''', (key, value, self.mirror_id))
+            after = await self._settings_version(db)
             await db.commit()
+        self.settings_cache.sync_write(before, after)
+        self.settings_cache.write(key, self._decode_setting(value))
+
+    async def warm_settings_cache(self) -> int:
+        async with self.reader() as db:
+            version = await self._settings_version(db)
+            async with db.execute('SELECT key, value FROM settings WHERE mirror_id = ?', (self.mirror_id,)) as cursor:
+                rows = await cursor.fetchall()
+        self.settings_cache.sync(version)
+        self.settings_cache.warm({row[0]: self._decode_setting(row[1]) for row in rows})
+        return len(rows)
 
     async def get_all_users(self) -> List[int]:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.reader() as db:
             async with db.execute('SELECT user_id FROM users WHERE is_blocked = FALSE') as cursor:
                 rows = await cursor.fetchall()
                 return [row[0] for row in rows]
 
     async def get_users_by_mirror(self, mirror_id: str = None) -> List[int]:
         target_mirror = mirror_id or self.mirror_id
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.reader() as db:
             async with db.execute('SELECT user_id FROM users WHERE is_blocked = FALSE AND mirror_id = ?', (target_mirror,)) as cursor:
                 rows = await cursor.fetchall()
                 return [row[0] for row in rows]
 
     async def create_captcha_session(self, user_id: int, answer: str):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                INSERT OR REPLACE INTO captcha_sessions (user_id, answer, attempts, mirror_id)
-                VALUES (?, ?, 0, ?)
-            ''', (user_id, answer, self.mirror_id))
-            await db.commit()
+        self.captcha_sessions.create(self.mirror_id, user_id, answer)
 
     async def get_captcha_session(self, user_id: int) -> Optional[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute('SELECT * FROM captcha_sessions WHERE user_id = ? AND mirror_id = ?', (user_id, self.mirror_id)) as cursor:
-                row = await cursor.fetchone()
-                return dict(row) if row else None
+        return self.captcha_sessions.get(self.mirror_id, user_id)
+
+    async def record_captcha_attempt(self, user_id: int) -> int:
+        return self.captcha_sessions.record_attempt(self.mirror_id, user_id)
+
+    async def set_captcha_answer(self, user_id: int, answer: str) -> bool:
+        return self.captcha_sessions.set_answer(self.mirror_id, user_id, answer)
 
     async def delete_captcha_session(self, user_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('DELETE FROM captcha_sessions WHERE user_id = ? AND mirror_id = ?', (user_id, self.mirror_id))
-            await db.commit()
+        self.captcha_sessions.delete(self.mirror_id, user_id)
 
     async def update_referral_count(self, user_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.writer() as db:
             try:
                 async with db.execute(
                     'SELECT COUNT(*) FROM users WHERE referred_by = ?',
@@ -557,7 +779,7 @@ class Database:
             }
 
     async def add_referral_bonus(self, user_id: int, amount: float):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.writer() as db:
             await db.execute('''
                 INSERT OR IGNORE INTO referral_bonuses
                 (user_id, amount, created_at, mirror_id)
@@ -566,32 +788,27 @@ class Database:
             await db.commit()
 
     async def execute_query(self, query: str, params: tuple = ()) -> List[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.writer() as db:
             async with db.execute(query, params) as cursor:
                 rows = await cursor.fetchall()
                 await db.commit()
                 return [dict(row) for row in rows]
 
     async def get_statistics(self) -> Dict:
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute('SELECT COUNT(*) FROM users WHERE mirror_id = ?', (self.mirror_id,)) as cursor:
-                total_users = (await cursor.fetchone())[0]
-
-            async with db.execute('SELECT COUNT(*) FROM orders WHERE mirror_id = ?', (self.mirror_id,)) as cursor:
-                total_orders = (await cursor.fetchone())[0]
-
-            async with db.execute('SELECT COUNT(*) FROM orders WHERE status = "completed" AND mirror_id = ?', (self.mirror_id,)) as cursor:
-                completed_orders = (await cursor.fetchone())[0]
-
-            async with db.execute('SELECT SUM(total_amount) FROM orders WHERE status = "completed" AND mirror_id = ?', (self.mirror_id,)) as cursor:
-                total_volume = (await cursor.fetchone())[0] or 0
-
-            async with db.execute('SELECT COUNT(*) FROM orders WHERE DATE(created_at) = DATE("now") AND mirror_id = ?', (self.mirror_id,)) as cursor:
-                today_orders = (await cursor.fetchone())[0]
+        async with self.reader() as db:
+            async with db.execute(
+                'SELECT users, orders, completed_orders, completed_volume FROM stats_mirror WHERE mirror_id = ?',
+                (self.mirror_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            total_users, total_orders, completed_orders, total_volume = row if row else (0, 0, 0, 0)
 
-            async with db.execute('SELECT SUM(total_amount) FROM orders WHERE DATE(created_at) = DATE("now") AND status = "completed" AND mirror_id = ?', (self.mirror_id,)) as cursor:
-                today_volume = (await cursor.fetchone())[0] or 0
+            async with db.execute(
+                'SELECT orders, completed_volume FROM stats_daily WHERE mirror_id = ? AND day = DATE("now")',
+                (self.mirror_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            today_orders, today_volume = row if row else (0, 0)
 
             completion_rate = (completed_orders / total_orders * 100) if total_orders > 0 else 0
 
@@ -605,6 +822,42 @@ class Database:
                 'completion_rate': completion_rate
             }
 
+    async def get_user_statistics(self) -> Dict:
+        async with self.reader() as db:
+            async with db.execute(
+                'SELECT COALESCE(SUM(users), 0), COALESCE(SUM(blocked_users), 0), COALESCE(SUM(active_users), 0) FROM stats_mirror'
+            ) as cursor:
+                total_users, blocked_users, active_users = await cursor.fetchone()
+            async with db.execute('''
+                SELECT COALESCE(SUM(CASE WHEN day = DATE("now") THEN registrations END), 0),
+                       COALESCE(SUM(registrations), 0)
+                FROM stats_daily WHERE day >= DATE("now", "-7 days")
+            ''') as cursor:
+                today_registrations, week_registrations = await cursor.fetchone()
+        return {
+            'total_users': total_users,
+            'blocked_users': blocked_users,
+            'active_users': active_users,
+            'today_registrations': today_registrations,
+            'week_registrations': week_registrations,
+        }
+
+    async def rebuild_statistics(self, apply: bool = True) -> Dict[str, int]:
+        async with self.writer() as db:
+            before = await snapshot_stats(db)
+            await rebuild_stats(db)
+            after = await snapshot_stats(db)
+            if apply:
+                await db.commit()
+            else:
+                await db.rollback()
+        drift = {
+            table: sum(1 for key in before[table].keys() | after[table].keys()
+                       if before[table].get(key) != after[table].get(key))
+            for table in after
+        }
+        return {**drift, 'mirrors': len(after['stats_mirror']), 'days': len(after['stats_daily'])}
+
     async def is_chat_admin(self, chat_id: int, user_id: int) -> bool:
         try:
             admin_chats = [config.ADMIN_CHAT_ID, config.OPERATOR_CHAT_ID]
@@ -627,16 +880,14 @@ class Database:
             await self.set_setting(f"chat_{chat_id}_title", chat_title)
 
     async def get_review(self, review_id: int) -> Optional[Dict]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.reader() as db:
             async with db.execute('SELECT * FROM reviews WHERE id = ?', (review_id,)) as cursor:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
 
     async def get_orders_by_mirror(self, mirror_id: str = None, status: str = None) -> List[Dict]:
         target_mirror = mirror_id or self.mirror_id
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.reader() as db:
             if status:
                 query = 'SELECT * FROM orders WHERE mirror_id = ? AND status = ? ORDER BY created_at DESC'
                 params = (target_mirror, status)
@@ -650,8 +901,7 @@ class Database:
 
     async def get_reviews_by_mirror(self, mirror_id: str = None, status: str = None) -> List[Dict]:
         target_mirror = mirror_id or self.mirror_id
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.reader() as db:
             if status:
                 query = 'SELECT * FROM reviews WHERE mirror_id = ? AND status = ? ORDER BY created_at DESC'
                 params = (target_mirror, status)
@@ -666,7 +916,7 @@ class Database:
 async def get_config_value(self, mirror_id: str, key: str, default=None):
                                                
     try:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.reader() as db:
             async with db.execute(
                 'SELECT config_value FROM bot_configs WHERE mirror_id = ? AND config_key = ?', 
                 (mirror_id, key)
@@ -680,7 +930,7 @@ async def get_config_value(self, mirror_id: str, key: str, default=None):
 async def save_config_value(self, mirror_id: str, key: str, value: str):
                                                
     try:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.writer() as db:
             await db.execute('''
                 INSERT OR REPLACE INTO bot_configs (mirror_id, config_key, config_value, updated_at)
                 VALUES (?, ?, ?, datetime('now'))
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+PRAGMA_CHOICES = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+}
+PRAGMA_INTEGERS = ('mmap_size', 'cache_size', 'busy_timeout')
+
+
+def build_pragmas(profile: Optional[Dict[str, Any]]) -> List[str]:
+    statements = []
+    for name, value in (profile or {}).items():
+        if value is None or value == '':
+            continue
+        if name in PRAGMA_CHOICES:
+            value = str(value).upper()
+            if value not in PRAGMA_CHOICES[name]:
+                logger.warning(f"Недопустимое значение PRAGMA {name}={value}, пропущено")
+                continue
+        elif name in PRAGMA_INTEGERS:
+            value = int(value)
+        else:
+            logger.warning(f"Неизвестная PRAGMA {name}, пропущено")
+            continue
+        statements.append(f"PRAGMA {name} = {value}")
+    return statements
+
+
+class ConnectionPool:
+    def __init__(self, db_path: str, readers: int = 4, profile: Optional[Dict[str, Any]] = None):
+        self.db_path = db_path
+        self.size = max(1, int(readers))
+        self.profile = dict(profile or {})
+        self._pragmas = build_pragmas(self.profile)
+        self.is_open = False
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._stats = {
+            'read_checkouts': 0,
+            'write_checkouts': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'in_use': 0,
+        }
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        for statement in self._pragmas:
+            await conn.execute(statement)
+        return conn
+
+    async def open(self):
+        if self.is_open:
+            return
+        async with self._open_lock:
+            if self.is_open:
+                return
+            self._writer = await self._connect()
+            for _ in range(self.size):
+                conn = await self._connect()
+                self._readers.append(conn)
+                self._idle.put_nowait(conn)
+            self.is_open = True
+            logger.info(f"Пул соединений открыт: {self.db_path} (1 writer + {self.size} readers)")
+
+    async def close(self):
+        async with self._open_lock:
+            if not self.is_open:
+                return
+            self.is_open = False
+            async with self._writer_lock:
+                connections = [self._writer] + self._readers
+                self._writer = None
+                self._readers = []
+                self._idle = asyncio.Queue()
+                for conn in connections:
+                    try:
+                        await conn.close()
+                    except Exception as e:
+                        logger.error(f"Ошибка закрытия соединения {self.db_path}: {e}")
+            logger.info(f"Пул соединений закрыт: {self.db_path}")
+
+    def _record_wait(self, started: float, kind: str):
+        waited = time.perf_counter() - started
+        self._stats[f'{kind}_checkouts'] += 1
+        self._stats['wait_total'] += waited
+        if waited > self._stats['wait_max']:
+            self._stats['wait_max'] = waited
+
+    @asynccontextmanager
+    async def reader(self):
+        if not self.is_open:
+            await self.open()
+        started = time.perf_counter()
+        conn = await self._idle.get()
+        self._record_wait(started, 'read')
+        self._stats['in_use'] += 1
+        try:
+            yield conn
+        finally:
+            self._stats['in_use'] -= 1
+            if conn in self._readers:
+                self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        if not self.is_open:
+            await self.open()
+        started = time.perf_counter()
+        async with self._writer_lock:
+            self._record_wait(started, 'write')
+            conn = self._writer
+            self._stats['in_use'] += 1
+            try:
+                yield conn
+            finally:
+                self._stats['in_use'] -= 1
+                if conn is not None and conn.in_transaction:
+                    try:
+                        await conn.rollback()
+                    except Exception as e:
+                        logger.error(f"Ошибка отката транзакции {self.db_path}: {e}")
+
+    async def storage_info(self) -> Dict[str, Any]:
+        info = {}
+        async with self.reader() as conn:
+            for name in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout', 'temp_store'):
+                async with conn.execute(f"PRAGMA {name}") as cursor:
+                    row = await cursor.fetchone()
+                    info[name] = row[0] if row else None
+        return info
+
+    def stats(self) -> Dict[str, Any]:
+        checkouts = self._stats['read_checkouts'] + self._stats['write_checkouts']
+        return {
+            'db_path': self.db_path,
+            'is_open': self.is_open,
+            'readers': self.size,
+            'readers_idle': self._idle.qsize(),
+            'writer_busy': self._writer_lock.locked(),
+            'in_use': self._stats['in_use'],
+            'read_checkouts': self._stats['read_checkouts'],
+            'write_checkouts': self._stats['write_checkouts'],
+            'avg_wait_ms': (self._stats['wait_total'] / checkouts * 1000) if checkouts else 0.0,
+            'max_wait_ms': self._stats['wait_max'] * 1000,
+        }
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+
+class Segment(NamedTuple):
+    key: str
+    title: str
+    predicate: str
+    params: Callable[[], List[Any]] = list
+
+
+def _week_ago() -> List[Any]:
+    return [(datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')]
+
+
+SEGMENTS: Dict[str, Segment] = {
+    segment.key: segment for segment in (
+        Segment("all", "всем пользователям", "is_blocked = FALSE"),
+        Segment("active", "активным пользователям", "total_operations > 0"),
+        Segment("new", "новым пользователям (за неделю)", "registration_date > ?", _week_ago),
+        Segment("traders", "пользователям с операциями", "total_operations >= 1"),
+    )
+}
+
+
+def get_segment(key: str) -> Optional[Segment]:
+    return SEGMENTS.get(key)
+
@@ -0,0 +1,88 @@
+import copy
+import time
+from typing import Any, Dict, Optional, Tuple
+
+MISSING = object()
+
+
+class SettingsCache:
+    def __init__(self, ttl: float = 60.0, sync_interval: float = 1.0):
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self.generation = 0
+        self.version: Optional[int] = None
+        self._sync_at = 0.0
+        self._values: Dict[str, Tuple[Any, float]] = {}
+        self._complete_until = 0.0
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'writes': 0, 'warmups': 0, 'remote_changes': 0}
+
+    def lookup(self, key: str) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        entry = self._values.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._stats['hits'] += 1
+                return True, self.copy_value(value)
+            del self._values[key]
+            self._stats['expired'] += 1
+        elif self._complete_until > now:
+            self._stats['hits'] += 1
+            return True, MISSING
+        self._stats['misses'] += 1
+        return False, None
+
+    def store(self, key: str, value: Any):
+        self._values[key] = (value, time.monotonic() + self.ttl)
+
+    def write(self, key: str, value: Any):
+        self.store(key, value)
+        self.generation += 1
+        self._stats['writes'] += 1
+
+    def warm(self, items: Dict[str, Any]):
+        expires_at = time.monotonic() + self.ttl
+        self._values = {key: (value, expires_at) for key, value in items.items()}
+        self._complete_until = expires_at
+        self.generation += 1
+        self._stats['warmups'] += 1
+
+    def invalidate(self, key: str = None):
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+        self._complete_until = 0.0
+        self.generation += 1
+
+    def needs_sync(self) -> bool:
+        return time.monotonic() >= self._sync_at
+
+    def sync(self, version: int):
+        if self.version is not None and version != self.version:
+            self.invalidate()
+            self._stats['remote_changes'] += 1
+        self.version = version
+        self._sync_at = time.monotonic() + self.sync_interval
+
+    def sync_write(self, before: int, after: int):
+        if self.version == before:
+            self.version = after
+        else:
+            self.sync(after)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats['hits'] + self._stats['misses']
+        return {
+            **self._stats,
+            'size': len(self._values),
+            'generation': self.generation,
+            'version': self.version,
+            'hit_rate': (self._stats['hits'] / lookups * 100) if lookups else 0.0,
+        }
+
+    @staticmethod
+    def copy_value(value: Any) -> Any:
+        if isinstance(value, (list, dict, set)):
+            return copy.deepcopy(value)
+        return value
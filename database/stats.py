@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Tuple
+
+import aiosqlite
+
+USER_MIRROR = "COALESCE({r}.mirror_id, 'main')"
+USER_DAY = "COALESCE(DATE({r}.registration_date), '')"
+ORDER_MIRROR = "COALESCE({r}.mirror_id, 'main')"
+ORDER_DAY = "COALESCE(DATE({r}.created_at), '')"
+
+USER_MIRROR_COLUMNS = {
+    'users': "1",
+    'blocked_users': "COALESCE({r}.is_blocked = 1, 0)",
+    'active_users': "COALESCE({r}.total_operations > 0, 0)",
+}
+USER_DAILY_COLUMNS = {
+    'registrations': "1",
+}
+ORDER_COLUMNS = {
+    'orders': "1",
+    'completed_orders': "COALESCE({r}.status = 'completed', 0)",
+    'completed_volume': "CASE WHEN {r}.status = 'completed' THEN COALESCE({r}.total_amount, 0) ELSE 0 END",
+}
+
+USER_FIELDS = ('mirror_id', 'is_blocked', 'total_operations', 'registration_date')
+ORDER_FIELDS = ('mirror_id', 'status', 'total_amount', 'created_at')
+
+
+async def create_stats_tables(db: aiosqlite.Connection):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS stats_mirror (
+            mirror_id TEXT PRIMARY KEY,
+            users INTEGER NOT NULL DEFAULT 0,
+            blocked_users INTEGER NOT NULL DEFAULT 0,
+            active_users INTEGER NOT NULL DEFAULT 0,
+            orders INTEGER NOT NULL DEFAULT 0,
+            completed_orders INTEGER NOT NULL DEFAULT 0,
+            completed_volume REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            mirror_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            registrations INTEGER NOT NULL DEFAULT 0,
+            orders INTEGER NOT NULL DEFAULT 0,
+            completed_orders INTEGER NOT NULL DEFAULT 0,
+            completed_volume REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (mirror_id, day)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_stats_daily_day ON stats_daily (day)')
+
+
+def _upsert(table: str, keys: Dict[str, str], columns: Dict[str, str], row: str, sign: str) -> str:
+    names = [*keys, *columns]
+    values = [expr.format(r=row) for expr in keys.values()]
+    values += [f"{sign}({expr.format(r=row)})" for expr in columns.values()]
+    updates = ', '.join(f"{name} = {name} + excluded.{name}" for name in columns)
+    return (
+        f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join(values)}) "
+        f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET {updates};"
+    )
+
+
+def _contributions(source: str, row: str, sign: str) -> List[str]:
+    if source == 'users':
+        return [
+            _upsert('stats_mirror', {'mirror_id': USER_MIRROR}, USER_MIRROR_COLUMNS, row, sign),
+            _upsert('stats_daily', {'mirror_id': USER_MIRROR, 'day': USER_DAY}, USER_DAILY_COLUMNS, row, sign),
+        ]
+    return [
+        _upsert('stats_mirror', {'mirror_id': ORDER_MIRROR}, ORDER_COLUMNS, row, sign),
+        _upsert('stats_daily', {'mirror_id': ORDER_MIRROR, 'day': ORDER_DAY}, ORDER_COLUMNS, row, sign),
+    ]
+
+
+def trigger_statements(source: str) -> List[Tuple[str, str]]:
+    fields = USER_FIELDS if source == 'users' else ORDER_FIELDS
+    changed = ' OR '.join(f"OLD.{field} IS NOT NEW.{field}" for field in fields)
+    insert = '\n'.join(_contributions(source, 'NEW', ''))
+    delete = '\n'.join(_contributions(source, 'OLD', '-'))
+    return [
+        (f"stats_{source}_insert", f"AFTER INSERT ON {source} BEGIN\n{insert}\nEND"),
+        (f"stats_{source}_delete", f"AFTER DELETE ON {source} BEGIN\n{delete}\nEND"),
+        (
+            f"stats_{source}_update",
+            f"AFTER UPDATE OF {', '.join(fields)} ON {source} WHEN {changed} BEGIN\n{delete}\n{insert}\nEND"
+        ),
+    ]
+
+
+async def install_stats_triggers(db: aiosqlite.Connection):
+    for source in ('users', 'orders'):
+        for name, body in trigger_statements(source):
+            await db.execute(f"DROP TRIGGER IF EXISTS {name}")
+            await db.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def _rebuild_select(table: str, keys: Dict[str, str], columns: Dict[str, str], source: str) -> str:
+    names = [*keys, *columns]
+    key_exprs = [expr.format(r=source) for expr in keys.values()]
+    sums = [f"SUM({expr.format(r=source)})" for expr in columns.values()]
+    updates = ', '.join(f"{name} = {name} + excluded.{name}" for name in columns)
+    return (
+        f"INSERT INTO {table} ({', '.join(names)}) "
+        f"SELECT {', '.join(key_exprs + sums)} FROM {source} WHERE true GROUP BY {', '.join(key_exprs)} "
+        f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET {updates}"
+    )
+
+
+async def rebuild_stats(db: aiosqlite.Connection):
+    await db.execute('DELETE FROM stats_mirror')
+    await db.execute('DELETE FROM stats_daily')
+    await db.execute(_rebuild_select('stats_mirror', {'mirror_id': USER_MIRROR}, USER_MIRROR_COLUMNS, 'users'))
+    await db.execute(_rebuild_select('stats_mirror', {'mirror_id': ORDER_MIRROR}, ORDER_COLUMNS, 'orders'))
+    await db.execute(_rebuild_select('stats_daily', {'mirror_id': USER_MIRROR, 'day': USER_DAY}, USER_DAILY_COLUMNS, 'users'))
+    await db.execute(_rebuild_select('stats_daily', {'mirror_id': ORDER_MIRROR, 'day': ORDER_DAY}, ORDER_COLUMNS, 'orders'))
+
+
+async def snapshot_stats(db: aiosqlite.Connection) -> Dict[str, Dict[Any, Tuple]]:
+    snapshot = {}
+    for table, key_count in (('stats_mirror', 1), ('stats_daily', 2)):
+        async with db.execute(f'SELECT * FROM {table}') as cursor:
+            snapshot[table] = {tuple(row[:key_count]): tuple(row[key_count:]) for row in await cursor.fetchall()}
+    return snapshot
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from database.pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+HOUR_FORMAT = '%Y-%m-%d %H:00:00'
+DAY_FORMAT = '%Y-%m-%d'
+
+ROLLUP_BUCKETS = (
+    ('turnover_hourly', "COALESCE(strftime('%Y-%m-%d %H:00:00', {r}.created_at), '')"),
+    ('turnover_daily', "COALESCE(DATE({r}.created_at), '')"),
+    ('turnover_totals', "''"),
+)
+
+ROLLUP_TRIGGER_UPSERT = '''
+    INSERT INTO {table} (mirror_id, status, bucket, amount, orders)
+    VALUES (COALESCE(NEW.mirror_id, 'main'), NEW.status, {bucket}, COALESCE(NEW.amount, 0), 1)
+    ON CONFLICT(mirror_id, status, bucket) DO UPDATE SET amount = amount + excluded.amount, orders = orders + 1;
+'''
+
+BACKFILL_SELECT = '''
+    INSERT INTO {table} (mirror_id, status, bucket, amount, orders)
+    SELECT COALESCE(mirror_id, 'main'), status, {bucket}, COALESCE(SUM(amount), 0), COUNT(*) FROM mirror_turnover
+    WHERE id > ? AND id <= ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT(mirror_id, status, bucket) DO UPDATE SET amount = amount + excluded.amount, orders = orders + excluded.orders
+'''
+
+
+async def create_rollup_tables(db: aiosqlite.Connection):
+    for table in ('turnover_hourly', 'turnover_daily', 'turnover_totals'):
+        await db.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                mirror_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                amount REAL NOT NULL DEFAULT 0,
+                orders INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (mirror_id, status, bucket)
+            ) WITHOUT ROWID
+        ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_turnover_hourly_status ON turnover_hourly (status, bucket)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_turnover_daily_status ON turnover_daily (status, bucket)')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS turnover_rollup_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            backfill_cursor INTEGER NOT NULL DEFAULT 0,
+            backfill_until INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    await db.execute('''
+        INSERT OR IGNORE INTO turnover_rollup_state (id, backfill_cursor, backfill_until)
+        SELECT 1, 0, COALESCE(MAX(id), 0) FROM mirror_turnover
+    ''')
+
+
+async def install_rollup_triggers(db: aiosqlite.Connection):
+    body = '\n'.join(
+        ROLLUP_TRIGGER_UPSERT.format(table=table, bucket=bucket.format(r='NEW')) for table, bucket in ROLLUP_BUCKETS
+    )
+    await db.execute("DROP TRIGGER IF EXISTS turnover_rollup_insert")
+    await db.execute(f"CREATE TRIGGER turnover_rollup_insert AFTER INSERT ON mirror_turnover BEGIN\n{body}\nEND")
+
+
+async def aggregate_rollups(db: aiosqlite.Connection, after: int, until: int):
+    for table, bucket in ROLLUP_BUCKETS:
+        await db.execute(BACKFILL_SELECT.format(table=table, bucket=bucket.format(r='mirror_turnover')), (after, until))
+
+
+async def rebuild_rollups(db: aiosqlite.Connection):
+    for table, _ in ROLLUP_BUCKETS:
+        await db.execute(f'DELETE FROM {table}')
+    async with db.execute('SELECT COALESCE(MAX(id), 0) FROM mirror_turnover') as cursor:
+        until = (await cursor.fetchone())[0]
+    await aggregate_rollups(db, 0, until)
+    await db.execute('UPDATE turnover_rollup_state SET backfill_cursor = ?, backfill_until = ? WHERE id = 1', (until, until))
+
+
+async def snapshot_rollups(db: aiosqlite.Connection) -> Dict[str, Dict[Tuple, Tuple]]:
+    snapshot = {}
+    for table, _ in ROLLUP_BUCKETS:
+        async with db.execute(f'SELECT mirror_id, status, bucket, amount, orders FROM {table}') as cursor:
+            snapshot[table] = {tuple(row[:3]): (round(row[3], 2), row[4]) for row in await cursor.fetchall()}
+    return snapshot
+
+
+def window_bounds(days: float, now: datetime = None) -> Tuple[str, str, str]:
+    start = (now or datetime.utcnow()) - timedelta(days=days)
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    if hour < start:
+        hour += timedelta(hours=1)
+    day = hour.replace(hour=0)
+    if day < hour:
+        day += timedelta(days=1)
+    return start.strftime(TIMESTAMP_FORMAT), hour.strftime(HOUR_FORMAT), day.strftime(DAY_FORMAT)
+
+
+class TurnoverRollups:
+    def __init__(self, pool: ConnectionPool, batch_size: int = 5000):
+        self.pool = pool
+        self.batch_size = batch_size
+        self._ready = False
+
+    async def progress(self) -> Tuple[int, int]:
+        async with self.pool.reader() as conn:
+            async with conn.execute('SELECT backfill_cursor, backfill_until FROM turnover_rollup_state WHERE id = 1') as cursor:
+                row = await cursor.fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    async def is_ready(self) -> bool:
+        if not self._ready:
+            cursor, until = await self.progress()
+            self._ready = cursor >= until
+        return self._ready
+
+    async def backfill_batch(self) -> int:
+        async with self.pool.writer() as conn:
+            async with conn.execute('SELECT backfill_cursor, backfill_until FROM turnover_rollup_state WHERE id = 1') as cursor:
+                start, until = await cursor.fetchone()
+            if start >= until:
+                return 0
+            end = min(start + self.batch_size, until)
+            await aggregate_rollups(conn, start, end)
+            await conn.execute('UPDATE turnover_rollup_state SET backfill_cursor = ? WHERE id = 1', (end,))
+            await conn.commit()
+        return until - end
+
+    async def backfill(self) -> int:
+        batches = 0
+        while True:
+            remaining = await self.backfill_batch()
+            batches += 1
+            if not remaining:
+                break
+            await asyncio.sleep(0)
+        self._ready = True
+        return batches
+
+    async def backfill_job(self, payload: Dict[str, Any], job: Dict[str, Any]):
+        cursor, until = await self.progress()
+        logger.info(f"Заполнение агрегатов оборота: записи {cursor}..{until}")
+        batches = await self.backfill()
+        logger.info(f"Агрегаты оборота заполнены ({batches} пакетов)")
+
+    async def rebuild(self, apply: bool = True) -> Dict[str, int]:
+        async with self.pool.writer() as conn:
+            before = await snapshot_rollups(conn)
+            await rebuild_rollups(conn)
+            after = await snapshot_rollups(conn)
+            if apply:
+                await conn.commit()
+            else:
+                await conn.rollback()
+        if apply:
+            self._ready = True
+        return {
+            table: sum(1 for key in before[table].keys() | after[table].keys()
+                       if before[table].get(key) != after[table].get(key))
+            for table in after
+        }
+
+    async def totals(self, status: str, mirror_id: Optional[str] = None) -> Dict[str, Any]:
+        query = 'SELECT SUM(amount), SUM(orders) FROM turnover_totals WHERE status = ?'
+        params: List[Any] = [status]
+        if mirror_id:
+            query += ' AND mirror_id = ?'
+            params.append(mirror_id)
+        async with self.pool.reader() as conn:
+            async with conn.execute(query, params) as cursor:
+                amount, orders = await cursor.fetchone()
+        return {'total_amount': amount or 0, 'total_orders': orders or 0}
+
+    async def by_mirror(self, status: str) -> List[Dict[str, Any]]:
+        async with self.pool.reader() as conn:
+            async with conn.execute('''
+                SELECT mirror_id, amount AS total, orders FROM turnover_totals
+                WHERE status = ? ORDER BY total DESC
+            ''', (status,)) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def period(self, days: float, status: str, mirror_id: Optional[str] = None) -> Dict[str, Any]:
+        start, hour, day = window_bounds(days)
+        mirror_filter = ' AND mirror_id = ?' if mirror_id else ''
+        mirror_params = [mirror_id] if mirror_id else []
+        parts = (
+            (f'SELECT SUM(amount), COUNT(*) FROM mirror_turnover WHERE status = ?{mirror_filter} '
+             f'AND created_at >= ? AND created_at < ?', [status, *mirror_params, start, hour]),
+            (f'SELECT SUM(amount), SUM(orders) FROM turnover_hourly WHERE status = ?{mirror_filter} '
+             f'AND bucket >= ? AND bucket < ?', [status, *mirror_params, hour, day]),
+            (f'SELECT SUM(amount), SUM(orders) FROM turnover_daily WHERE status = ?{mirror_filter} '
+             f'AND bucket >= ?', [status, *mirror_params, day]),
+        )
+        total_amount, total_orders = 0, 0
+        async with self.pool.reader() as conn:
+            for query, params in parts:
+                async with conn.execute(query, params) as cursor:
+                    amount, orders = await cursor.fetchone()
+                total_amount += amount or 0
+                total_orders += orders or 0
+        return {'total_amount': total_amount, 'total_orders': total_orders}
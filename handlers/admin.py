@@ -1,6 +1,5 @@
 import logging
 from datetime import datetime, timedelta
-import aiosqlite
 import os
 import psutil
 from aiogram import Router, F
@@ -11,6 +10,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.enums import ChatType
 from database.models import Database
+from database.segments import get_segment
 from keyboards.reply import ReplyKeyboards
 from config import config
 from api.pspware_api import PSPWareAPI
@@ -21,6 +21,7 @@ import json
 
 
 import platform
+import time
 
 def format_size(bytes_size):
                                                         
@@ -511,19 +512,13 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
 
         elif action == "users_menu":
             try:
-                async with aiosqlite.connect(db.db_path) as database:
-                    async with database.execute('SELECT COUNT(*) FROM users') as cursor:
-                        total_users = (await cursor.fetchone())[0]
-                    async with database.execute('SELECT COUNT(*) FROM users WHERE is_blocked = 1') as cursor:
-                        blocked_users = (await cursor.fetchone())[0]
-                    async with database.execute('SELECT COUNT(*) FROM users WHERE total_operations > 0') as cursor:
-                        active_users = (await cursor.fetchone())[0]
+                user_stats = await db.get_user_statistics()
                 
                 text = (
                     f"👥 <b>Управление пользователями</b>\n\n"
-                    f"📊 Всего: {total_users}\n"
-                    f"⚡ Активных: {active_users}\n"
-                    f"🚫 Заблокированных: {blocked_users}"
+                    f"📊 Всего: {user_stats['total_users']}\n"
+                    f"⚡ Активных: {user_stats['active_users']}\n"
+                    f"🚫 Заблокированных: {user_stats['blocked_users']}"
                 )
             except:
                 text = "👥 <b>Управление пользователями</b>\n\n❌ Ошибка загрузки статистики"
@@ -585,6 +580,108 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
                 if hasattr(db, "db_path") and db.db_path and os.path.exists(db.db_path):
                     db_size = os.path.getsize(db.db_path)
 
+                pools_text = ""
+                for pool in Database.pool_stats():
+                    pools_text += (
+                        f"🗄 {os.path.basename(pool['db_path'])}: "
+                        f"{pool['readers_idle']}/{pool['readers']} свободно, "
+                        f"выдач {pool['read_checkouts'] + pool['write_checkouts']}, "
+                        f"ожидание ср. {pool['avg_wait_ms']:.2f} мс / макс. {pool['max_wait_ms']:.2f} мс\n"
+                    )
+                for mirror_id, cache in Database.settings_cache_stats().items():
+                    pools_text += (
+                        f"⚡ Кэш настроек {mirror_id}: попаданий {cache['hits']}, "
+                        f"промахов {cache['misses']} ({cache['hit_rate']:.1f}%)\n"
+                    )
+                from middlewares.chat_type import role_resolver
+                roles = role_resolver.stats()
+                pools_text += (
+                    f"🛡 Middleware: событий {roles['events']}, "
+                    f"ср. {roles['avg_us']:.1f} мкс / макс. {roles['max_us']:.1f} мкс, персонал {roles['staff']}\n"
+                )
+                expiry = db.expiry.stats()
+                pools_text += (
+                    f"⌛ Истечение заявок: отслеживается {expiry['tracked']}, "
+                    f"истекло {expiry['expired']} за {expiry['batches']} пакетов\n"
+                )
+                from handlers.user import status_poller
+                poller = status_poller.stats()
+                pools_text += (
+                    f"🔄 Опрос статусов: заявок {poller['tracked']}, запросов {poller['polls']}, "
+                    f"объединено {poller['coalesced']}, из кэша {poller['cache_hits']}\n"
+                )
+                job_stats = await db.jobs.stats()
+                for job_type, counts in job_stats.items():
+                    pools_text += (
+                        f"🧾 Задачи {job_type}: в очереди {counts.get('queued', 0)}, "
+                        f"выполняются {counts.get('running', 0)}, готово {counts.get('done', 0)}, "
+                        f"ошибок {counts.get('failed', 0)}\n"
+                    )
+                from api.http import http_transport
+                transport = http_transport.stats()
+                pools_text += (
+                    f"🌐 HTTP: запросов {transport['requests']}, активных соединений {transport['acquired']}, "
+                    f"хостов в keep-alive {transport['idle_hosts']} (лимит {transport['limit']}/{transport['limit_per_host']})\n"
+                )
+                from utils.bitcoin import rate_service, rate_aggregator
+                rates = rate_service.stats()
+                rate_age = f"{rates['age']:.0f} сек" if rates['age'] is not None else "нет данных"
+                pools_text += (
+                    f"₿ Курс: возраст {rate_age}, из кэша {rates['fresh']}, устаревших {rates['stale']}, "
+                    f"ожиданий {rates['waits']}, запросов {rates['fetches']}, ошибок {rates['errors']}\n"
+                )
+                aggregated = rate_aggregator.snapshot()
+                if aggregated['last']:
+                    pools_text += (
+                        f"📐 Источники курса: {', '.join(aggregated['last']['sources'])}, "
+                        f"разброс {aggregated['last']['spread'] * 100:.2f}%, "
+                        f"MAD {aggregated['last']['dispersion'] * 100:.2f}%"
+                        f"{', отброшено ' + ', '.join(aggregated['last']['rejected']) if aggregated['last']['rejected'] else ''}\n"
+                    )
+                if aggregated['failures']:
+                    pools_text += f"⚠️ Недоступны: {html.escape(', '.join(aggregated['failures']))}\n"
+                captcha_sessions = db.captcha_sessions.stats()
+                pools_text += (
+                    f"🔐 Сессии капчи: активных {captcha_sessions['size']}, попаданий {captcha_sessions['hits']}, "
+                    f"истекло {captcha_sessions['expired']}, вытеснено {captcha_sessions['evicted']}"
+                    f"{', ожидают записи ' + str(captcha_sessions['pending']) if captcha_sessions['persist'] else ''}\n"
+                )
+                from utils.broadcast import broadcast_engine
+                for job in broadcast_engine.stats()['jobs']:
+                    pools_text += (
+                        f"📢 Рассылка #{job['id']}: {job['done']} из {job['total']}, "
+                        f"{job['speed']:.1f} сообщ./сек, повторов {job['retries']}\n"
+                    )
+                from utils.captcha import captcha_pool
+                captchas = captcha_pool.stats()
+                pools_text += (
+                    f"🧩 Капча: в пуле {captchas['depth']}/{captchas['size']}, выдано {captchas['served']}, "
+                    f"промахов {captchas['misses']}, рендер ср. {captchas['avg_render_ms']:.1f} мс"
+                    f"{', пополняется' if captchas['refilling'] else ''}\n"
+                )
+                from web.payment_webhooks import payment_webhooks
+                hooks = payment_webhooks.stats()
+                pools_text += (
+                    f"📨 Вебхуки: получено {hooks['received']}, принято {hooks['accepted']}, "
+                    f"дублей {hooks['duplicates']}, отклонено {hooks['rejected']}, "
+                    f"ответ ср. {hooks['avg_ack_ms']:.1f} мс / макс. {hooks['max_ack_ms']:.1f} мс\n"
+                )
+                for worker in await db.get_worker_heartbeats():
+                    alive = worker['status'] == 'running' and time.time() - worker['last_seen'] < config.WORKER_HEARTBEAT_INTERVAL * 3
+                    pools_text += (
+                        f"{'🟢' if alive else '🔴'} Воркер {worker['worker_id']} (pid {worker['pid']}): "
+                        f"ботов {len(worker['bots'].split(',')) if worker['bots'] else 0}, "
+                        f"CPU {worker['cpu_percent']:.1f}%, RSS {format_size(worker['rss'])}, "
+                        f"лаг {worker['loop_lag_ms']:.0f} мс, событий {worker['events']}, "
+                        f"перезапусков {worker['restarts']}\n"
+                    )
+                from web.telegram_webhooks import telegram_webhooks
+                for mirror_id, endpoint in telegram_webhooks.stats().items():
+                    pools_text += (
+                        f"🤖 Webhook {mirror_id}: обновлений {endpoint['updates']}, в работе {endpoint['inflight']}, "
+                        f"ошибок {endpoint['errors']}, ср. {endpoint['avg_ms']:.1f} мс\n"
+                    )
+
                 text = (
                     f"📊 <b>Системная информация</b>\n\n"
                     f"🌐 ОС: {platform.system()} {platform.release()} ({platform.machine()})\n"
@@ -594,6 +691,7 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
                     f"💾 Память процесса: {format_size(mem_info.rss)}\n"
                     f"💾 Используется ОЗУ: {ram.percent}% из {format_size(ram.total)}\n"
                     f"📂 Размер БД: {format_size(db_size)}\n\n"
+                    f"{pools_text}\n"
                     f"🕐 Время сервера: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n"
                 )
 
@@ -831,11 +929,12 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
 
         elif action == "cleanup_db":
             try:
-                async with aiosqlite.connect(db.db_path) as database:
+                async with db.writer() as database:
                     await database.execute('DELETE FROM orders WHERE status = "cancelled" AND created_at < datetime("now", "-30 days")')
                     await database.execute('DELETE FROM captcha_sessions WHERE created_at < datetime("now", "-1 day")')
-                    await database.execute('VACUUM')
                     await database.commit()
+                    await database.execute('VACUUM')
+                db.captcha_sessions.purge()
                 
                 await callback.answer("✅ База данных очищена", show_alert=True)
                 await admin_callback_handler(callback.model_copy(update={"data": "admin_system_menu"}), state)
@@ -844,7 +943,7 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
 
         elif action == "recent_orders":
             try:
-                async with aiosqlite.connect(db.db_path) as database:
+                async with db.reader() as database:
                     async with database.execute('''
                         SELECT id, user_id, total_amount, status, created_at, personal_id
                         FROM orders ORDER BY created_at DESC LIMIT 10
@@ -856,6 +955,7 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
                     "paid_by_client": "💰",
                     "completed": "✅",
                     "cancelled": "❌",
+                    "expired": "⌛",
                     "problem": "⚠️"
                 }
 
@@ -877,7 +977,7 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
 
         elif action == "pending_orders":
             try:
-                async with aiosqlite.connect(db.db_path) as database:
+                async with db.reader() as database:
                     async with database.execute('''
                         SELECT id, user_id, total_amount, created_at, personal_id
                         FROM orders WHERE status IN ("waiting", "paid_by_client") ORDER BY created_at DESC
@@ -904,7 +1004,7 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
 
         elif action == "completed_orders":
             try:
-                async with aiosqlite.connect(db.db_path) as database:
+                async with db.reader() as database:
                     async with database.execute('''
                         SELECT id, user_id, total_amount, created_at, personal_id
                         FROM orders WHERE status = "completed" ORDER BY created_at DESC LIMIT 10
@@ -928,7 +1028,7 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
 
         elif action == "cancelled_orders":
             try:
-                async with aiosqlite.connect(db.db_path) as database:
+                async with db.reader() as database:
                     async with database.execute('''
                         SELECT id, user_id, total_amount, created_at, personal_id
                         FROM orders WHERE status = "cancelled" ORDER BY created_at DESC LIMIT 10
@@ -952,7 +1052,7 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
 
         elif action == "problem_orders":
             try:
-                async with aiosqlite.connect(db.db_path) as database:
+                async with db.reader() as database:
                     async with database.execute('''
                         SELECT id, user_id, total_amount, created_at, personal_id
                         FROM orders WHERE status = "problem" ORDER BY created_at DESC
@@ -983,55 +1083,9 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
             await state.update_data(action="find_order")
             await state.set_state(AdminStates.waiting_for_order_id)
 
-        elif action == "broadcast_active":
+        elif action in ("broadcast_active", "broadcast_new", "broadcast_traders"):
             try:
-                async with aiosqlite.connect(db.db_path) as database:
-                    async with database.execute('SELECT user_id FROM users WHERE total_operations > 0') as cursor:
-                        users = [row[0] for row in await cursor.fetchall()]
-                
-                await callback.message.edit_text(
-                    f"📤 <b>Рассылка активным пользователям</b>\n\n"
-                    f"Найдено активных пользователей: {len(users)}\n\n"
-                    "Отправьте сообщение для рассылки:",
-                    parse_mode="HTML"
-                )
-                await state.update_data(action="broadcast_active", target_users=users)
-                await state.set_state(AdminStates.waiting_for_broadcast_message)
-            except Exception as e:
-                await callback.answer(f"❌ Ошибка: {e}", show_alert=True)
-
-        elif action == "broadcast_new":
-            try:
-                week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
-                async with aiosqlite.connect(db.db_path) as database:
-                    async with database.execute('SELECT user_id FROM users WHERE registration_date > ?', (week_ago,)) as cursor:
-                        users = [row[0] for row in await cursor.fetchall()]
-                
-                await callback.message.edit_text(
-                    f"📤 <b>Рассылка новым пользователям</b>\n\n"
-                    f"Найдено новых пользователей (за неделю): {len(users)}\n\n"
-                    "Отправьте сообщение для рассылки:",
-                    parse_mode="HTML"
-                )
-                await state.update_data(action="broadcast_new", target_users=users)
-                await state.set_state(AdminStates.waiting_for_broadcast_message)
-            except Exception as e:
-                await callback.answer(f"❌ Ошибка: {e}", show_alert=True)
-
-        elif action == "broadcast_traders":
-            try:
-                async with aiosqlite.connect(db.db_path) as database:
-                    async with database.execute('SELECT user_id FROM users WHERE total_operations >= 1') as cursor:
-                        users = [row[0] for row in await cursor.fetchall()]
-                
-                await callback.message.edit_text(
-                    f"📤 <b>Рассылка пользователям с операциями</b>\n\n"
-                    f"Найдено пользователей с операциями: {len(users)}\n\n"
-                    "Отправьте сообщение для рассылки:",
-                    parse_mode="HTML"
-                )
-                await state.update_data(action="broadcast_traders", target_users=users)
-                await state.set_state(AdminStates.waiting_for_broadcast_message)
+                await prompt_broadcast(callback, state, action.split("_", 1)[1])
             except Exception as e:
                 await callback.answer(f"❌ Ошибка: {e}", show_alert=True)
 
@@ -1143,22 +1197,7 @@ async def handle_settings_and_management(callback: CallbackQuery, state: FSMCont
         await show_staff_list(callback)
     
     elif action == "broadcast_all":
-        users = await db.get_all_users()
-        
-        builder = InlineKeyboardBuilder()
-        builder.row(
-            InlineKeyboardButton(text="❌ Отменить", callback_data="admin_broadcast_menu")
-        )
-        
-        await callback.message.edit_text(
-            f"📤 <b>Рассылка всем пользователям</b>\n\n"
-            f"Найдено пользователей: {len(users)}\n\n"
-            f"Отправьте сообщение для рассылки:",
-            reply_markup=builder.as_markup(),
-            parse_mode="HTML"
-        )
-        await state.update_data(action="broadcast_all", target_users=users)
-        await state.set_state(AdminStates.waiting_for_broadcast_message)
+        await prompt_broadcast(callback, state, "all")
     
     elif action == "user_stats":
         await show_detailed_user_stats(callback)
@@ -1212,27 +1251,17 @@ async def show_staff_list(callback: CallbackQuery):
 
 async def show_detailed_user_stats(callback: CallbackQuery):
     try:
-        async with aiosqlite.connect(db.db_path) as database:
-            async with database.execute('SELECT COUNT(*) FROM users') as cursor:
-                total_users = (await cursor.fetchone())[0]
-            async with database.execute('SELECT COUNT(*) FROM users WHERE is_blocked = 1') as cursor:
-                blocked_users = (await cursor.fetchone())[0]
-            async with database.execute('SELECT COUNT(*) FROM users WHERE DATE(registration_date) = DATE("now")') as cursor:
-                today_registrations = (await cursor.fetchone())[0]
-            async with database.execute('SELECT COUNT(*) FROM users WHERE total_operations > 0') as cursor:
-                active_users = (await cursor.fetchone())[0]
-            async with database.execute('SELECT COUNT(*) FROM users WHERE DATE(registration_date) >= DATE("now", "-7 days")') as cursor:
-                week_registrations = (await cursor.fetchone())[0]
-                
-        activity_rate = (active_users/total_users*100) if total_users > 0 else 0
+        stats = await db.get_user_statistics()
+        total_users = stats['total_users']
+        activity_rate = (stats['active_users']/total_users*100) if total_users > 0 else 0
         
         text = (
             f"📊 <b>Детальная статистика пользователей</b>\n\n"
             f"👥 Всего пользователей: {total_users}\n"
-            f"🚫 Заблокированных: {blocked_users}\n"
-            f"⚡ Активных: {active_users}\n"
-            f"📅 Регистраций сегодня: {today_registrations}\n"
-            f"📅 Регистраций за неделю: {week_registrations}\n"
+            f"🚫 Заблокированных: {stats['blocked_users']}\n"
+            f"⚡ Активных: {stats['active_users']}\n"
+            f"📅 Регистраций сегодня: {stats['today_registrations']}\n"
+            f"📅 Регистраций за неделю: {stats['week_registrations']}\n"
             f"📈 Процент активности: {activity_rate:.1f}%"
         )
         
@@ -1247,7 +1276,7 @@ async def show_detailed_user_stats(callback: CallbackQuery):
 
 async def show_recent_users(callback: CallbackQuery):
     try:
-        async with aiosqlite.connect(db.db_path) as database:
+        async with db.reader() as database:
             async with database.execute('''
                 SELECT user_id, username, first_name, registration_date, total_operations
                 FROM users ORDER BY registration_date DESC LIMIT 10
@@ -1326,7 +1355,7 @@ async def process_order_search(message: Message, state: FSMContext):
     try:
         order_id = message.text.strip()
         
-        async with aiosqlite.connect(db.db_path) as database:
+        async with db.reader() as database:
             async with database.execute('''
                 SELECT id, user_id, amount_rub, amount_btc, btc_address, total_amount, status, 
                        created_at, personal_id, payment_type, rate
@@ -1449,6 +1478,7 @@ async def show_user_info(message: Message, user_id: int):
         'paid_by_client': '💰',
         'completed': '✅',
         'cancelled': '❌',
+        'expired': '⌛',
         'problem': '⚠️'
     }
 
@@ -1598,37 +1628,36 @@ async def process_block_reason(message: Message, state: FSMContext):
     except Exception as e:
         await message.answer(f"❌ Ошибка: {e}")
 
+async def prompt_broadcast(callback: CallbackQuery, state: FSMContext, segment_key: str):
+    segment = get_segment(segment_key)
+    params = segment.params()
+    count = await db.count_segment(segment, params)
+    
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="❌ Отменить", callback_data="admin_broadcast_menu")
+    )
+    
+    await callback.message.edit_text(
+        f"📤 <b>Рассылка {segment.title}</b>\n\n"
+        f"Найдено получателей: {count}\n\n"
+        f"Отправьте сообщение для рассылки:",
+        reply_markup=builder.as_markup(),
+        parse_mode="HTML"
+    )
+    await state.update_data(action=f"broadcast_{segment.key}", segment=segment.key, segment_params=params)
+    await state.set_state(AdminStates.waiting_for_broadcast_message)
+
 @router.message(AdminStates.waiting_for_broadcast_message)
-async def process_broadcast_message(message: Message, state: FSMContext):
+async def process_broadcast_message(message: Message, state: FSMContext, mirror_id: str = "main"):
     data = await state.get_data()
-    action = data.get("action")
-    target_users = data.get("target_users", [])
-    
-    if not target_users and action == "broadcast_all":
-        target_users = await db.get_all_users()
+    segment = get_segment(data.get("segment", "all"))
     
     try:
-        sent_count = failed_count = 0
-        
-        await message.answer(f"📤 Начинаю рассылку для {len(target_users)} пользователей...")
-        
-        for user_id in target_users:
-            try:
-                await message.bot.copy_message(
-                    chat_id=user_id,
-                    from_chat_id=message.chat.id,
-                    message_id=message.message_id
-                )
-                sent_count += 1
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Failed to send broadcast to {user_id}: {e}")
-        
-        await message.answer(
-            f"✅ <b>Рассылка завершена!</b>\n\n"
-            f"📤 Отправлено: {sent_count}\n"
-            f"❌ Ошибок: {failed_count}",
-            parse_mode="HTML"
+        from utils.broadcast import broadcast_engine
+        await broadcast_engine.start(
+            message.bot, mirror_id, message.chat.id,
+            message.chat.id, message.message_id, segment, data.get("segment_params")
         )
         
         builder = create_main_admin_panel()
@@ -1637,9 +1666,25 @@ async def process_broadcast_message(message: Message, state: FSMContext):
     except Exception as e:
         await message.answer(f"❌ Ошибка рассылки: {e}")
 
+@router.callback_query(F.data.startswith("bcast_stop_"))
+async def stop_broadcast_callback(callback: CallbackQuery):
+    if not await is_admin_extended(callback.from_user.id):
+        return
+    from utils.broadcast import broadcast_engine
+    job_id = int(callback.data.rsplit("_", 1)[1])
+    if broadcast_engine.cancel(job_id):
+        await callback.answer("⏹ Рассылка останавливается...")
+        return
+    job = await db.get_broadcast_job(job_id)
+    if job and job['status'] == 'running':
+        await db.save_broadcast_results(job_id, [], 'cancelled')
+        await callback.answer("⏹ Рассылка остановлена")
+    else:
+        await callback.answer("Рассылка уже завершена", show_alert=True)
+
 async def find_user_by_username(username: str) -> int:
     try:
-        async with aiosqlite.connect(db.db_path) as database:
+        async with db.reader() as database:
             async with database.execute(
                 'SELECT user_id FROM users WHERE username = ? COLLATE NOCASE',
                 (username,)
@@ -1720,6 +1765,35 @@ async def get_log_command(message: Message):
             parse_mode="HTML"
         )
 
+RATE_HISTORY_WINDOWS = (("15 мин", 900), ("1 час", 3600), ("6 часов", 21600), ("24 часа", 86400))
+
+@router.message(Command("rate_history"))
+async def rate_history_command(message: Message):
+    if not await is_admin_extended(message.from_user.id):
+        return
+
+    from utils.bitcoin import rate_service
+    history = rate_service.history
+    if history is None or not len(history):
+        await message.answer("📈 История курса пока пуста.")
+        return
+
+    lines = [f"📈 <b>История курса BTC</b> ({len(history)} из {history.capacity} точек, {history.memory_bytes() / 1024:.0f} KB)\n"]
+    now = time.time()
+    for label, seconds in RATE_HISTORY_WINDOWS:
+        window = history.window(seconds, now)
+        if window is None:
+            lines.append(f"• {label}: нет данных")
+            continue
+        lines.append(
+            f"• <b>{label}</b> ({window['count']}): мин {window['min']:,.0f} ₽, макс {window['max']:,.0f} ₽, "
+            f"ср {window['avg']:,.0f} ₽, изм {window['change'] * 100:+.2f}%"
+        )
+    stats = rate_service.stats()
+    if stats['rate']:
+        lines.append(f"\n💱 Текущий курс: {stats['rate']:,.0f} ₽ (котировка действует {rate_service.quote_ttl:.0f} сек)")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
 @router.callback_query(F.data.startswith("review_"))
 async def review_moderation(callback: CallbackQuery):
     if not await is_admin_extended(callback.from_user.id):
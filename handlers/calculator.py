@@ -5,7 +5,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from keyboards.reply import ReplyKeyboards
 from keyboards.inline import InlineKeyboards
-from utils.bitcoin import BitcoinAPI
+from utils.bitcoin import BitcoinAPI, RATE_UNAVAILABLE_TEXT
 from database.models import Database
 from config import config
 
@@ -27,8 +27,6 @@ db = Database(config.DATABASE_URL)
 async def calculator_main_handler(message: Message, state: FSMContext):
     await state.clear()
     
-    btc_rate = await BitcoinAPI.get_btc_rate()
-    
     text = (
         f"<b>Выберите направление:</b>"
     )
@@ -43,8 +41,6 @@ async def calculator_main_handler(message: Message, state: FSMContext):
 async def calculator_back_to_main(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     
-    btc_rate = await BitcoinAPI.get_btc_rate()
-    
     text = (
         f"<b>Выберите направление:</b>"
     )
@@ -85,6 +81,9 @@ async def calculator_pair_selected(callback: CallbackQuery, state: FSMContext):
     )
     
     btc_rate = await BitcoinAPI.get_btc_rate()
+    if not btc_rate:
+        await callback.answer(RATE_UNAVAILABLE_TEXT, show_alert=True)
+        return
     
     if from_currency.upper() == 'RUB':
         rate_text = f"1 RUB = {1/btc_rate:.8f} BTC"
@@ -146,6 +145,9 @@ async def calculate_and_show_result(callback: CallbackQuery, state: FSMContext,
     from_currency, to_currency = pair.split("_")
     
     btc_rate = await BitcoinAPI.get_btc_rate()
+    if not btc_rate:
+        await callback.answer(RATE_UNAVAILABLE_TEXT, show_alert=True)
+        return
     
     if from_currency.upper() == 'RUB':
         rub_amount = amount
@@ -191,6 +193,9 @@ async def calculate_and_show_result_for_message(message: Message, state: FSMCont
     from_currency, to_currency = pair.split("_")
     
     btc_rate = await BitcoinAPI.get_btc_rate()
+    if not btc_rate:
+        await message.answer(RATE_UNAVAILABLE_TEXT)
+        return
     
     if from_currency.upper() == 'RUB':
         rub_amount = amount
@@ -236,6 +241,9 @@ async def calculator_reverse(callback: CallbackQuery, state: FSMContext):
     )
     
     btc_rate = await BitcoinAPI.get_btc_rate()
+    if not btc_rate:
+        await callback.answer(RATE_UNAVAILABLE_TEXT, show_alert=True)
+        return
     
     if to_currency.upper() == 'RUB':
         rate_text = f"1 RUB = {1/btc_rate:.8f} BTC"
@@ -283,6 +291,9 @@ async def calculator_recalculate(callback: CallbackQuery, state: FSMContext):
     )
     
     btc_rate = await BitcoinAPI.get_btc_rate()
+    if not btc_rate:
+        await callback.answer(RATE_UNAVAILABLE_TEXT, show_alert=True)
+        return
     
     if from_currency.upper() == 'RUB':
         rate_text = f"1 RUB = {1/btc_rate:.8f} BTC"
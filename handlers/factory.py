@@ -0,0 +1,29 @@
+from typing import Sequence
+
+from aiogram import Router
+
+from handlers import admin, user, operator, calculator
+
+HANDLER_ROUTERS = (admin.router, user.router, operator.router, calculator.router)
+
+
+def clone_router(source: Router, name: str = None) -> Router:
+    clone = Router(name=name or source.name)
+    for event_name, observer in source.observers.items():
+        target = clone.observers[event_name]
+        target.handlers = observer.handlers
+        target._handler.filters = observer._handler.filters
+        target.middleware._middlewares = observer.middleware._middlewares
+        target.outer_middleware._middlewares = observer.outer_middleware._middlewares
+    clone.startup.handlers = source.startup.handlers
+    clone.shutdown.handlers = source.shutdown.handlers
+    for sub_router in source.sub_routers:
+        clone.include_router(clone_router(sub_router, f"{name}:{sub_router.name}" if name else None))
+    return clone
+
+
+def build_mirror_router(mirror_id: str, sources: Sequence[Router] = HANDLER_ROUTERS) -> Router:
+    root = Router(name=f"mirror:{mirror_id}")
+    for source in sources:
+        root.include_router(clone_router(source, f"{mirror_id}:{source.name}"))
+    return root
@@ -3,18 +3,22 @@ import logging
 import asyncio
 import os
 from datetime import datetime
+from typing import Optional
 import traceback
+import html
 from aiogram import Router, F
 from aiogram.filters import CommandStart, Command
 from aiogram.types import Message, CallbackQuery, BufferedInputFile, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database.models import Database
+from database.segments import get_segment
 from keyboards.reply import ReplyKeyboards
 from keyboards.inline import InlineKeyboards
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from utils.bitcoin import BitcoinAPI
-from utils.captcha import CaptchaGenerator
+from utils.bitcoin import BitcoinAPI, RATE_UNAVAILABLE_TEXT, rate_service
+from utils.rates import RateQuote
+from utils.captcha import captcha_pool
 from config import config
 from handlers.operator import (
     notify_operators_new_order,
@@ -28,6 +32,10 @@ from api.pspware_api import PSPWareAPI
 from api.greengo_api import GreengoAPI
 from api.nicepay_api import NicePayAPI
 from api.api_manager import PaymentAPIManager
+from api.circuit_breaker import STATE_LABELS
+from api.status_poller import PaymentStatusPoller
+from database.jobs import RetryJob
+from utils.bots import bot_registry
 
 from helpers import get_mirror_config, get_referral_link, with_mirror_config
 
@@ -45,6 +53,10 @@ greengo_api = GreengoAPI()
 nicepay_api = NicePayAPI()
 
 
+REQUISITES_MAX_ATTEMPTS = config.REQUISITES_MAX_ATTEMPTS
+REQUISITES_RETRY_DELAY = config.REQUISITES_RETRY_DELAY
+QUOTE_EXPIRED_TEXT = "⏳ <b>Курс обновился.</b> Зафиксированная котировка истекла, проверьте новый расчет.\n\n"
+
 payment_api_manager = PaymentAPIManager([
     {"api": onlypays_api, "name": "OnlyPays"},
     {"api": pspware_api, "name": "PSPWare", "pay_type_mapping": {"card": "c2c", "sbp": "sbp"}},
@@ -120,10 +132,10 @@ async def start_handler(message: Message, state: FSMContext):
     if not user:
         captcha_enabled = await db.get_setting("captcha_enabled", config.CAPTCHA_ENABLED)
         if captcha_enabled:
-            image_buffer, answer = CaptchaGenerator.generate_image_captcha()
+            image_bytes, answer = await captcha_pool.get()
             await db.create_captcha_session(message.from_user.id, answer.upper())
             captcha_photo = BufferedInputFile(
-                image_buffer.read(),
+                image_bytes,
                 filename="captcha.png"
             )
             await message.answer_photo(
@@ -180,24 +192,17 @@ async def captcha_handler(message: Message, state: FSMContext):
         await show_main_menu(message)
         await state.clear()
     else:
-        attempts = session['attempts'] + 1
+        attempts = await db.record_captcha_attempt(message.from_user.id)
         if attempts >= 3:
             await db.delete_captcha_session(message.from_user.id)
             await message.answer("❌ Превышено количество попыток. Попробуйте /start снова.")
             await state.clear()
         else:
-            await db.execute_query(
-                'UPDATE captcha_sessions SET attempts = ? WHERE user_id = ?',
-                (attempts, message.from_user.id)
-            )
             try:
-                image_buffer, answer = CaptchaGenerator.generate_simple_image_captcha()
-                await db.execute_query(
-                    'UPDATE captcha_sessions SET answer = ? WHERE user_id = ?',
-                    (answer.upper(), message.from_user.id)
-                )
+                image_bytes, answer = await captcha_pool.get()
+                await db.set_captcha_answer(message.from_user.id, answer.upper())
                 captcha_photo = BufferedInputFile(
-                    image_buffer.read(),
+                    image_bytes,
                     filename="captcha.png"
                 )
                 await message.answer_photo(
@@ -230,6 +235,9 @@ async def buy_crypto_selected(callback: CallbackQuery, state: FSMContext):
             direction="rub_to_crypto"
         )
         btc_rate = await BitcoinAPI.get_btc_rate()
+        if not btc_rate:
+            await callback.answer(RATE_UNAVAILABLE_TEXT, show_alert=True)
+            return
         text = (
             f"💰 <b>Покупка Bitcoin\n\n"
             f"📊 Текущий курс: {btc_rate:,.0f} ₽\n"
@@ -311,71 +319,95 @@ async def manual_amount_input(message: Message, state: FSMContext):
         logger.error(f"Error parsing amount: {message.text}, error: {e}")
         await message.answer("❌ Введите корректное число (например, 5000 или 5000.50)")
 
-async def process_amount_and_show_calculation(callback: CallbackQuery, state: FSMContext,
-                                            crypto: str, direction: str, amount: float):
-    btc_rate = await BitcoinAPI.get_btc_rate()
-    if direction == "rub_to_crypto":
-        rub_amount = amount
-        crypto_amount = BitcoinAPI.calculate_btc_amount(rub_amount, btc_rate)
-    else:
+async def quote_order_amounts(amount: float, quote: RateQuote, amount_in_crypto: bool) -> dict:
+    if amount_in_crypto:
         crypto_amount = amount
-        rub_amount = crypto_amount * btc_rate
+        rub_amount = crypto_amount * quote.rate
+    else:
+        rub_amount = amount
+        crypto_amount = BitcoinAPI.calculate_btc_amount(rub_amount, quote.rate)
     COMMISSION_PERCENT = await db.get_commission_percentage()
-    total_amount = rub_amount / (1 - COMMISSION_PERCENT / 100)
+    return {
+        'rub_amount': rub_amount,
+        'crypto_amount': crypto_amount,
+        'rate': quote.rate,
+        'total_amount': rub_amount / (1 - COMMISSION_PERCENT / 100),
+        'quote': quote.to_dict(),
+        'quote_amount': amount,
+        'quote_in_crypto': amount_in_crypto,
+    }
+
+async def locked_quote(data: dict) -> Optional[RateQuote]:
+    quote = RateQuote.from_dict(data.get('quote'))
+    if quote is not None and not quote.is_expired():
+        return quote
+    return await rate_service.quote()
+
+def calculation_text(direction: str, amounts: dict, prompt: str = "Введите ваш Bitcoin адрес:") -> str:
+    operation_text = "Покупка" if direction == "rub_to_crypto" else "Продажа"
+    return (
+        f"📊 <b>{operation_text} Bitcoin</b>\n\n"
+        f"💱 Курс: {amounts['rate']:,.0f} ₽\n"
+        f"💰 Сумма: {amounts['rub_amount']:,.0f} ₽\n"
+        f"₿ Получите: {amounts['crypto_amount']:.8f} BTC\n\n"
+        f"💸 <b>Итого: {amounts['total_amount']:,.0f} ₽</b>\n\n"
+        f"{prompt}"
+    )
+
+async def requote_expired(message: Message, state: FSMContext, data: dict, prompt: str, reply_markup=None,
+                          required: bool = False) -> bool:
+    quote = RateQuote.from_dict(data.get('quote'))
+    if (quote is None and not required) or (quote is not None and not quote.is_expired()):
+        return False
+    amount = data.get('quote_amount', data.get('rub_amount'))
+    if amount is None:
+        await message.answer("❌ Ошибка внутренних данных. Попробуйте начать заново через главное меню.")
+        return True
+    fresh = await rate_service.quote()
+    if fresh is None:
+        await message.answer(RATE_UNAVAILABLE_TEXT)
+        return True
+    amounts = await quote_order_amounts(amount, fresh, data.get('quote_in_crypto', False))
+    amounts.update(btc_amount=amounts['crypto_amount'], btc_rate=amounts['rate'])
+    await state.update_data(**amounts)
+    logger.info(f"Котировка пользователя {message.from_user.id} истекла, предложен новый курс {fresh.rate:,.0f} ({fresh.quote_id})")
+    await message.answer(
+        QUOTE_EXPIRED_TEXT + calculation_text(data.get('direction', 'rub_to_crypto'), amounts, prompt),
+        reply_markup=reply_markup,
+        parse_mode="HTML"
+    )
+    return True
+
+async def process_amount_and_show_calculation(callback: CallbackQuery, state: FSMContext,
+                                            crypto: str, direction: str, amount: float):
+    quote = await rate_service.quote()
+    if quote is None:
+        await callback.answer(RATE_UNAVAILABLE_TEXT, show_alert=True)
+        return
+    amounts = await quote_order_amounts(amount, quote, direction != "rub_to_crypto")
     await state.update_data(
         crypto=crypto,
         direction=direction,
-        rub_amount=rub_amount,
-        crypto_amount=crypto_amount,
-        rate=btc_rate,
-        total_amount=total_amount,
-        payment_type='card'
-    )
-    operation_text = "Покупка" if direction == "rub_to_crypto" else "Продажа"
-    text = (
-        f"📊 <b>{operation_text} Bitcoin</b>\n\n"
-        f"💱 Курс: {btc_rate:,.0f} ₽\n"
-        f"💰 Сумма: {rub_amount:,.0f} ₽\n"
-        f"₿ Получите: {crypto_amount:.8f} BTC\n\n"
-        f"💸 <b>Итого: {total_amount:,.0f} ₽</b>\n\n"
-        f"Введите ваш Bitcoin адрес:"
+        payment_type='card',
+        **amounts
     )
-    await callback.message.edit_text(text, parse_mode="HTML")
+    await callback.message.edit_text(calculation_text(direction, amounts), parse_mode="HTML")
     await state.set_state(ExchangeStates.waiting_for_address)
 
 async def process_amount_and_show_calculation_for_message(message: Message, state: FSMContext,
                                                         crypto: str, direction: str, amount: float, is_crypto: bool = False):
-    btc_rate = await BitcoinAPI.get_btc_rate()
-    if direction == "rub_to_crypto":
-        if is_crypto:
-            rub_amount = await BitcoinAPI.get_btc_to_rub(amount)
-        else:
-            rub_amount = amount
-        crypto_amount = BitcoinAPI.calculate_btc_amount(rub_amount, btc_rate)
-    else:
-        crypto_amount = amount
-        rub_amount = crypto_amount * btc_rate
-    COMMISSION_PERCENT = await db.get_commission_percentage()
-    total_amount = rub_amount / (1 - COMMISSION_PERCENT / 100)
+    quote = await rate_service.quote()
+    if quote is None:
+        await message.answer(RATE_UNAVAILABLE_TEXT)
+        return
+    amounts = await quote_order_amounts(amount, quote, is_crypto or direction != "rub_to_crypto")
     await state.update_data(
         crypto=crypto,
         direction=direction,
-        rub_amount=rub_amount,
-        crypto_amount=crypto_amount,
-        rate=btc_rate,
-        total_amount=total_amount,
-        payment_type='card'
-    )
-    operation_text = "Покупка" if direction == "rub_to_crypto" else "Продажа"
-    text = (
-        f"📊 <b>{operation_text} Bitcoin</b>\n\n"
-        f"💱 Курс: {btc_rate:,.0f} ₽\n"
-        f"💰 Сумма: {rub_amount:,.0f} ₽\n"
-        f"₿ Получите: {crypto_amount:.8f} BTC\n\n"
-        f"💸 <b>Итого: {total_amount:,.0f} ₽</b>\n\n"
-        f"Введите ваш Bitcoin адрес:"
+        payment_type='card',
+        **amounts
     )
-    await message.answer(text, parse_mode="HTML")
+    await message.answer(calculation_text(direction, amounts), parse_mode="HTML")
     await state.set_state(ExchangeStates.waiting_for_address)
 
 @router.callback_query(F.data.startswith("payment_"))
@@ -423,10 +455,11 @@ async def btc_address_handler(message: Message, state: FSMContext):
         await message.answer("❌ Некорректный Bitcoin адрес. Попробуйте еще раз.")
         return
     data = await state.get_data()
-    btc_rate = await BitcoinAPI.get_btc_rate()
-    if not btc_rate:
-        await message.answer("❌ Ошибка получения курса. Попробуйте позже.")
+    quote = await locked_quote(data)
+    if quote is None:
+        await message.answer(RATE_UNAVAILABLE_TEXT)
         return
+    btc_rate = quote.rate
     rub_amount = data['rub_amount']
     btc_amount = BitcoinAPI.calculate_btc_amount(rub_amount, btc_rate)
     COMMISSION_PERCENT = await db.get_commission_percentage()
@@ -445,7 +478,8 @@ async def btc_address_handler(message: Message, state: FSMContext):
         rub_amount=rub_amount,
         btc_amount=btc_amount,
         btc_rate=btc_rate,
-        total_amount=total_amount
+        total_amount=total_amount,
+        quote=quote.to_dict()
     )
     await message.answer(text, reply_markup=ReplyKeyboards.payment_methods(), parse_mode="HTML")
 
@@ -464,12 +498,21 @@ async def address_input_handler(message: Message, state: FSMContext):
             await message.answer("❌ Некорректные реквизиты. Попробуйте еще раз.")
             return
     await state.update_data(address=address)
+    if await requote_expired(message, state, await state.get_data(), "Для подтверждения отправьте адрес/реквизиты еще раз:",
+                             required=True):
+        return
     order_id = await create_exchange_order(message.from_user.id, state)
+    if order_id is None:
+        await message.answer(RATE_UNAVAILABLE_TEXT)
+        return
     await show_order_confirmation(message, state, order_id)
 
-async def create_exchange_order(user_id: int, state: FSMContext) -> int:
+async def create_exchange_order(user_id: int, state: FSMContext) -> Optional[int]:
     
     data = await state.get_data()
+    quote = RateQuote.from_dict(data.get('quote'))
+    if quote is None or quote.is_expired():
+        return None
     
     order_id = await db.create_order(
         user_id=user_id,
@@ -512,115 +555,117 @@ async def show_order_confirmation(message: Message, state: FSMContext, order_id:
         parse_mode="HTML"
     )
                          
-async def request_requisites_with_retries(order_id: int, user_id: int, payment_type: str, bot, max_attempts=3, delay_sec=60):
+async def request_requisites_attempt(order_id: int, user_id: int, payment_type: str, bot, attempt: int = 1, final: bool = True) -> Optional[bool]:
     order = await db.get_order(order_id)
     if not order:
         logger.error(f"Order not found: {order_id}")
         return False
+    if order.get('requisites'):
+        logger.info(f"Requisites for order {order_id} already issued, skipping")
+        return True
     
     is_sell_order = not order.get('btc_address')
     total_amount = int(await db.get_order_total_amount(order_id))
     
-    for attempt in range(1, max_attempts + 1):
-        try:
+    try:
                                                     
-            for api_config in payment_api_manager.apis:
-                api_name = api_config['name']
-                if api_name == 'Greengo':
-                    min_amount = api_config.get('min_amount', 500)
-                    if total_amount < min_amount:
-                        logger.warning(f"Order {order_id} amount {total_amount} is below Greengo minimum {min_amount}")
-                        await bot.send_message(
-                            user_id,
-                            f"❌ Минимальная сумма для оплаты {min_amount} ₽. Ваша сумма: {total_amount} ₽. Пожалуйста, увеличьте сумму.",
-                            reply_markup=ReplyKeyboards.main_menu()
-                        )
-                        await db.update_order(order_id, status='error_requisites')
-                        return False
+        for api_config in payment_api_manager.apis:
+            api_name = api_config['name']
+            if api_name == 'Greengo':
+                min_amount = api_config.get('min_amount', 500)
+                if total_amount < min_amount:
+                    logger.warning(f"Order {order_id} amount {total_amount} is below Greengo minimum {min_amount}")
+                    await bot.send_message(
+                        user_id,
+                        f"❌ Минимальная сумма для оплаты {min_amount} ₽. Ваша сумма: {total_amount} ₽. Пожалуйста, увеличьте сумму.",
+                        reply_markup=ReplyKeyboards.main_menu()
+                    )
+                    await db.update_order(order_id, status='error_requisites')
+                    return False
             
-            wallet = order.get('btc_address') if not is_sell_order else None
+        wallet = order.get('btc_address') if not is_sell_order else None
             
-            api_response = await payment_api_manager.create_order(
-                amount=total_amount,
-                payment_type=payment_type, 
-                personal_id=str(order_id),
-                is_sell_order=is_sell_order,
-                wallet=wallet                                             
-            )
+        api_response = await payment_api_manager.create_order(
+            amount=total_amount,
+            payment_type=payment_type, 
+            personal_id=str(order_id),
+            is_sell_order=is_sell_order,
+            wallet=wallet                                             
+        )
             
-            if api_response.get('success'):
-                payment_data = api_response['data']
-                api_name = api_response.get('api_name')
+        if api_response.get('success'):
+            payment_data = api_response['data']
+            api_name = api_response.get('api_name')
                 
                 
-                if api_name == 'NicePay':
-                    logger.debug(f"Payment data for NicePay: {payment_data}")
-                    requisites_text = (
-                        f"🔗 <b>Ссылка для оплаты:</b> {payment_data['payment_url']}\n"
-                        f"💳 Тип платежа: {'Карта' if payment_type == 'card' else 'СБП'}\n"
-                        f"📋 ID транзакции: {payment_data['id']}"
-                    )
+            if api_name == 'NicePay':
+                logger.debug(f"Payment data for NicePay: {payment_data}")
+                requisites_text = (
+                    f"🔗 <b>Ссылка для оплаты:</b> {payment_data['payment_url']}\n"
+                    f"💳 Тип платежа: {'Карта' if payment_type == 'card' else 'СБП'}\n"
+                    f"📋 ID транзакции: {payment_data['id']}"
+                )
                     
-                else:
-                    requisites_text = (
-                        f"{'💳 Карта' if payment_type == 'card' else '📱 Телефон'}: {payment_data['requisite']}\n"
-                        f"👤 Получатель: {payment_data['owner']}\n"
-                        f"🏛 Банк: {payment_data['bank']}"
-                    )
+            else:
+                requisites_text = (
+                    f"{'💳 Карта' if payment_type == 'card' else '📱 Телефон'}: {payment_data['requisite']}\n"
+                    f"👤 Получатель: {payment_data['owner']}\n"
+                    f"🏛 Банк: {payment_data['bank']}"
+                )
                 
-                update_data = {
-                    'requisites': requisites_text,
-                    'status': 'waiting',
-                    'personal_id': payment_data['id']
-                }
-                if api_name == 'OnlyPays':
-                    update_data['onlypays_id'] = payment_data['id']
-                elif api_name == 'PSPWare':
-                    update_data['pspware_id'] = payment_data['id']
-                elif api_name == 'Greengo':
-                    update_data['greengo_id'] = payment_data['id']
-                elif api_name == 'NicePay':
-                    update_data['nicepay_id'] = payment_data['id']
+            update_data = {
+                'requisites': requisites_text,
+                'status': 'waiting',
+                'personal_id': payment_data['id']
+            }
+            if api_name == 'OnlyPays':
+                update_data['onlypays_id'] = payment_data['id']
+            elif api_name == 'PSPWare':
+                update_data['pspware_id'] = payment_data['id']
+            elif api_name == 'Greengo':
+                update_data['greengo_id'] = payment_data['id']
+            elif api_name == 'NicePay':
+                update_data['nicepay_id'] = payment_data['id']
                 
-                await db.update_order(order_id, **update_data)
+            await db.update_order(order_id, **update_data)
+            await bot.send_message(
+                user_id,
+                f"💳 <b>Ваша заявка #{payment_data['id']} подтверждена!</b>\n\n"
+                f"💰 К оплате: <b>{total_amount:,.0f} ₽</b>\n\n"
+                f"📋 <b>Реквизиты для оплаты:</b>\n{requisites_text}\n\n"
+                f"⚠️ <b>Важно:</b>\n"
+                f"• Переведите точную сумму\n"
+                f"• После оплаты ожидайте подтверждения\n"
+                f"• Bitcoin будет отправлен автоматически\n\n"
+                f"⏰ Заявка действительна 30 минут",
+                parse_mode="HTML",
+                reply_markup=ReplyKeyboards.order_menu(is_nicepay=(api_name == 'NicePay'))
+            )
+            return True
+        else:
+            logger.warning(f"{api_response.get('api_name')} order creation failed on attempt {attempt} for order {order_id}: {api_response.get('error')}")
+            if api_response.get('api_name') == 'Greengo' and "Нет свободных счетов" in str(api_response.get('error', '')):
                 await bot.send_message(
                     user_id,
-                    f"💳 <b>Ваша заявка #{payment_data['id']} подтверждена!</b>\n\n"
-                    f"💰 К оплате: <b>{total_amount:,.0f} ₽</b>\n\n"
-                    f"📋 <b>Реквизиты для оплаты:</b>\n{requisites_text}\n\n"
-                    f"⚠️ <b>Важно:</b>\n"
-                    f"• Переведите точную сумму\n"
-                    f"• После оплаты ожидайте подтверждения\n"
-                    f"• Bitcoin будет отправлен автоматически\n\n"
-                    f"⏰ Заявка действительна 30 минут",
-                    parse_mode="HTML",
-                    reply_markup=ReplyKeyboards.order_menu(is_nicepay=(api_name == 'NicePay'))
+                    "❌ Временно нет доступных счетов для оплаты через Greengo. Пожалуйста, попробуйте позже или выберите другой способ оплаты.",
+                    reply_markup=ReplyKeyboards.main_menu()
                 )
-                return True
-            else:
-                logger.warning(f"{api_response.get('api_name')} order creation failed on attempt {attempt} for order {order_id}: {api_response.get('error')}")
-                if api_response.get('api_name') == 'Greengo' and "Нет свободных счетов" in str(api_response.get('error', '')):
-                    await bot.send_message(
-                        user_id,
-                        "❌ Временно нет доступных счетов для оплаты через Greengo. Пожалуйста, попробуйте позже или выберите другой способ оплаты.",
-                        reply_markup=ReplyKeyboards.main_menu()
-                    )
-                    await db.update_order(order_id, status='error_requisites')
-                    return False
-                elif api_response.get('api_name') == 'NicePay' and 'getaddrinfo failed' in str(api_response.get('error', '')):
-                    await bot.send_message(
-                        user_id,
-                        "❌ Временная ошибка сети при подключении к NicePay. Пожалуйста, попробуйте позже.",
-                        reply_markup=ReplyKeyboards.main_menu()
-                    )
-                    await db.update_order(order_id, status='error_requisites')
-                    return False
-        
-        except Exception as e:
-            logger.error(f"Attempt {attempt} failed for order {order_id}: {e}")
+                await db.update_order(order_id, status='error_requisites')
+                return False
+            elif api_response.get('api_name') == 'NicePay' and 'getaddrinfo failed' in str(api_response.get('error', '')):
+                await bot.send_message(
+                    user_id,
+                    "❌ Временная ошибка сети при подключении к NicePay. Пожалуйста, попробуйте позже.",
+                    reply_markup=ReplyKeyboards.main_menu()
+                )
+                await db.update_order(order_id, status='error_requisites')
+                return False
         
-        if attempt < max_attempts:
-            await asyncio.sleep(delay_sec)
+    except Exception as e:
+        logger.error(f"Attempt {attempt} failed for order {order_id}: {e}")
+    
+    if not final:
+        return None
 
     await db.update_order(order_id, status='error_requisites')
     error_msg = "❌ Извините, реквизиты для вашей заявки временно недоступны.\nПожалуйста, попробуйте создать заявку позже."
@@ -634,6 +679,58 @@ async def request_requisites_with_retries(order_id: int, user_id: int, payment_t
     )
     return False
 
+async def fetch_requisites_job(payload: dict, job: dict):
+    bot = bot_registry.get(payload.get('mirror_id'))
+    if bot is None:
+        raise RetryJob(REQUISITES_RETRY_DELAY, "bot is not registered yet")
+    result = await request_requisites_attempt(
+        payload['order_id'],
+        payload['user_id'],
+        payload['payment_type'],
+        bot,
+        attempt=job['attempts'],
+        final=job['attempts'] >= job['max_attempts']
+    )
+    if result is None:
+        raise RetryJob(REQUISITES_RETRY_DELAY, f"no requisites for order {payload['order_id']}")
+
+PROVIDER_ID_COLUMNS = (
+    ('onlypays_id', 'OnlyPays'),
+    ('pspware_id', 'PSPWare'),
+    ('greengo_id', 'Greengo'),
+    ('nicepay_id', 'NicePay'),
+)
+
+async def release_expired_order(order: dict, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        for column, api_name in PROVIDER_ID_COLUMNS:
+            provider_order_id = order.get(column)
+            if provider_order_id:
+                result = await payment_api_manager.cancel_order(str(provider_order_id), api_name, order.get('total_amount'))
+                if not result.get('success'):
+                    logger.warning(f"Не удалось отменить истекшую заявку {order['id']} у {api_name}: {result.get('error')}")
+                break
+        
+        bot = bot_registry.get(order.get('mirror_id'))
+        if bot is None:
+            return
+        display_id = order.get('personal_id') or order['id']
+        try:
+            await bot.send_message(
+                order['user_id'],
+                f"⌛ <b>Заявка #{display_id} истекла</b>\n\n"
+                f"Время на оплату (30 минут) вышло, заявка отменена.\n"
+                f"Если вы уже оплатили, свяжитесь с поддержкой.",
+                parse_mode="HTML",
+                reply_markup=ReplyKeyboards.main_menu()
+            )
+        except Exception as e:
+            logger.error(f"Ошибка уведомления об истечении заявки {order['id']}: {e}")
+
+async def handle_expired_orders(orders: list):
+    semaphore = asyncio.Semaphore(10)
+    await asyncio.gather(*(release_expired_order(order, semaphore) for order in orders))
+
 @router.callback_query(F.data.startswith(("confirm_order_", "cancel_order_")))
 async def order_confirmation_handler(callback: CallbackQuery, state: FSMContext):
     action = "confirm" if callback.data.startswith("confirm") else "cancel"
@@ -652,8 +749,16 @@ async def order_confirmation_handler(callback: CallbackQuery, state: FSMContext)
             await callback.message.edit_text(
                 "⏳ Ваш запрос принят. Реквизиты будут отправлены в следующем сообщении.\nВремя ожидания до 4-х минут..."
             )
-            asyncio.create_task(
-                request_requisites_with_retries(order_id, user_id, payment_type, callback.bot)
+            await db.jobs.enqueue(
+                'fetch_requisites',
+                {
+                    'order_id': order_id,
+                    'user_id': user_id,
+                    'payment_type': payment_type,
+                    'mirror_id': getattr(callback.bot, 'mirror_id', 'main')
+                },
+                dedup_key=f"fetch_requisites:{order_id}",
+                max_attempts=REQUISITES_MAX_ATTEMPTS
             )
             await state.clear()  
             return
@@ -698,8 +803,11 @@ async def payment_method_handler(message: Message, state: FSMContext):
         )
         await state.clear()
         return
+
+    if await requote_expired(message, state, data, "Выберите способ оплаты:", ReplyKeyboards.payment_methods()):
+        return
     
-    total_amount = rub_amount / (1 - (await db.get_commission_percentage()) / 100)
+    total_amount = data.get('total_amount') or rub_amount / (1 - (await db.get_commission_percentage()) / 100)
 
     logger.info(f"Создаём заказ: user_id={message.from_user.id}, rub_amount={rub_amount}, btc_amount={btc_amount}, "
                 f"btc_address={data.get('btc_address', data.get('address', ''))}, rate={btc_rate}, total_amount={total_amount}, payment_type={payment_type}")
@@ -848,31 +956,12 @@ async def check_status_handler(message: Message):
             )
             return
         
-        api_response = await payment_api_manager.get_order_status(
-            order_id=api_order_id,
-            api_name=api_name
-        )
+        api_response = await status_poller.get_status(api_name, api_order_id, order.get('total_amount'))
         
         if api_response and api_response.get('success'):
-            status_data = api_response['data']
-            logger.debug(f"Status data for order {display_id}: {status_data}")                    
-            if status_data.get('status') == 'finished':
-                                                      
-                webhook_data = {
-                    'id': api_order_id,
-                    'status': 'finished',
-                    'personal_id': str(order['id']),
-                    'received_sum': status_data.get('received_sum', order['total_amount'])
-                }
-                
-                
-                if order.get('onlypays_id'):
-                    await process_onlypays_webhook(webhook_data, message.bot)
-                elif order.get('pspware_id'):
-                    await process_pspware_webhook(webhook_data, message.bot)
-                elif order.get('greengo_id'):
-                    await process_greengo_webhook(webhook_data, message.bot)
-                
+            logger.debug(f"Status data for order {display_id}: {api_response}")
+            status = await apply_polled_status(order, api_name, api_response, message.bot)
+            if status == 'finished':
                 await message.answer(
                     f"✅ <b>Заявка #{display_id} оплачена!</b>\n\n"
                     f"Платеж получен и обрабатывается.\n"
@@ -880,8 +969,7 @@ async def check_status_handler(message: Message):
                     reply_markup=ReplyKeyboards.main_menu(),
                     parse_mode="HTML"
                 )
-            elif status_data.get('status') == 'cancelled':
-                await db.update_order(order['id'], status='cancelled')
+            elif status == 'cancelled':
                 await message.answer(
                     f"❌ Заявка #{display_id} отменена.\n\n"
                     f"Создайте новую заявку для обмена.",
@@ -909,6 +997,7 @@ async def check_status_handler(message: Message):
             'paid_by_client': '💰 Оплачена, обрабатывается',
             'completed': '✅ Завершена',
             'cancelled': '❌ Отменена',
+            'expired': '⌛ Истекла',
             'problem': '⚠️ Проблемная'
         }.get(order['status'], f"❓ {order['status']}")
                                                     
@@ -934,7 +1023,7 @@ async def about_handler(message: Message):
         f"⚙️ ОПЕРАТОР Тех.поддержка ➖ {config.SUPPORT_MANAGER}\n"
         f"📣 НОВОСТНОЙ КАНАЛ ➖ {config.NEWS_CHANNEL}\n\n"
         f"━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"💱 Текущий курс BTC: {btc_rate:,.0f} ₽\n"
+        f"💱 Текущий курс BTC: {f'{btc_rate:,.0f} ₽' if btc_rate else 'временно недоступен'}\n"
         f"🏛 Комиссия сервиса: {COMMISSION_PERCENT}%\n\n"
         f"💰 Лимиты: {config.MIN_AMOUNT:,} - {config.MAX_AMOUNT:,} ₽"
     )
@@ -1076,6 +1165,7 @@ async def my_orders_handler(message: Message):
             'paid_by_client': '💰',
             'completed': '✅',
             'cancelled': '❌',
+            'expired': '⌛',
             'problem': '⚠️'
         }
         
@@ -1428,32 +1518,20 @@ async def broadcast_handler(message: Message, state: FSMContext):
         await message.answer("❌ Ошибка при запуске рассылки")
 
 @router.message(ExchangeStates.waiting_for_contact)
-async def broadcast_message_handler(message: Message, state: FSMContext):
+async def broadcast_message_handler(message: Message, state: FSMContext, mirror_id: str = "main"):
     if message.text == "◶️ Главное меню":
         await state.clear()
         await show_main_menu(message)
         return
     try:
-        users = await db.get_all_users()
-        broadcast_text = message.text
-        success_count = 0
-        for user in users:
-            try:
-                await message.bot.send_message(
-                    user['user_id'],
-                    broadcast_text,
-                    parse_mode="HTML",
-                    disable_web_page_preview=True
-                )
-                success_count += 1
-                await asyncio.sleep(0.05)
-            except Exception as e:
-                logger.warning(f"Failed to send broadcast to {user['user_id']}: {e}")
+        from utils.broadcast import broadcast_engine
+        job_id = await broadcast_engine.start(
+            message.bot, mirror_id, message.chat.id,
+            message.chat.id, message.message_id, get_segment("all")
+        )
         await message.answer(
-            f"✅ <b>Рассылка завершена</b>\n\n"
-            f"Отправлено {success_count} из {len(users)} пользователям",
-            reply_markup=ReplyKeyboards.main_menu(),
-            parse_mode="HTML"
+            f"📤 Рассылка #{job_id} запущена",
+            reply_markup=ReplyKeyboards.main_menu()
         )
     except Exception as e:
         logger.error(f"Broadcast message handler error: {e}")
@@ -1474,10 +1552,10 @@ async def deep_link_start_handler(message: Message, state: FSMContext):
         if not user:
             captcha_enabled = await db.get_setting("captcha_enabled", config.CAPTCHA_ENABLED)
             if captcha_enabled:
-                image_buffer, answer = CaptchaGenerator.generate_image_captcha()
+                image_bytes, answer = await captcha_pool.get()
                 await db.create_captcha_session(message.from_user.id, answer.upper())
                 captcha_photo = BufferedInputFile(
-                    image_buffer.read(),
+                    image_bytes,
                     filename="captcha.png"
                 )
                 await message.answer_photo(
@@ -1529,7 +1607,7 @@ async def admin_stats_handler(message: Message):
             reply_markup=ReplyKeyboards.main_menu()
         )
 
-@router.message(Command("health"), F.from_user.id.in_(config.ADMIN_USER_ID))
+@router.message(Command("health"), F.from_user.id == config.ADMIN_USER_ID)
 async def health_check_handler(message: Message):
     try:
         response = await payment_api_manager.health_check()
@@ -1541,6 +1619,29 @@ async def health_check_handler(message: Message):
                 text += f"❌ {api_name}: {result.get('error', 'Неизвестная ошибка')}\n"
                 if "status_code" in result:
                     text += f"Код ошибки: {result['status_code']}\n"
+        breakers = payment_api_manager.breaker_states()
+        if breakers:
+            text += "\n<b>⚡️ Circuit breakers:</b>\n"
+            for row in breakers:
+                text += f"{STATE_LABELS[row['state']]} — {row['name']}"
+                if row['state'] == 'open':
+                    text += f", проверка через {row['retry_in']:.0f} сек"
+                if row['last_error']:
+                    text += f" ({html.escape(row['last_error'][:100])})"
+                text += "\n"
+        scores = payment_api_manager.routing_scores()
+        if scores:
+            text += "\n<b>📈 Маршрутизация (окно последних заявок):</b>\n"
+            for row in scores:
+                success_rate = f"{row['success_rate'] * 100:.0f}%" if row['success_rate'] is not None else "—"
+                p50 = f"{row['p50']:.2f}" if row['p50'] is not None else "—"
+                p95 = f"{row['p95']:.2f}" if row['p95'] is not None else "—"
+                errors = ", ".join(f"{name}: {count}" for name, count in row['errors'].items()) or "нет"
+                text += (
+                    f"{'⏸' if row['skipped'] else '▶️'} {row['api_name']} / {row['payment_type']}: "
+                    f"успех {success_rate} ({row['samples']}), p50 {p50} с, p95 {p95} с, "
+                    f"оценка {row['score']:.2f}, ошибки: {errors}\n"
+                )
         await message.answer(
             text,
             reply_markup=ReplyKeyboards.main_menu(),
@@ -1553,6 +1654,57 @@ async def health_check_handler(message: Message):
             reply_markup=ReplyKeyboards.main_menu()
         )
 
+def normalize_polled_status(api_name: str, api_response: dict) -> tuple:
+    if api_name == 'Greengo':
+        status = api_response.get('order_status')
+        status = {'completed': 'finished', 'canceled': 'cancelled'}.get(status, status)
+        return status, api_response.get('amount_payable')
+    status_data = api_response.get('data') or {}
+    return status_data.get('status'), status_data.get('received_sum')
+
+async def apply_polled_status(order: dict, api_name: str, api_response: dict, bot=None) -> Optional[str]:
+    status, received_sum = normalize_polled_status(api_name, api_response)
+    if status not in ('finished', 'cancelled'):
+        return status
+    current = await db.get_order(order['id'])
+    if not current or current['status'] != 'waiting':
+        return status
+    bot = bot or bot_registry.get(current.get('mirror_id'))
+    if bot is None:
+        return status
+    api_order_id = current.get('onlypays_id') or current.get('pspware_id') or current.get('greengo_id')
+    if received_sum is None:
+        received_sum = current['total_amount']
+    if api_name == 'Greengo':
+        await process_greengo_webhook({
+            'personal_id': str(current['id']),
+            'order_status': 'completed' if status == 'finished' else 'canceled',
+            'amount_payable': received_sum
+        }, bot)
+        return status
+    webhook_data = {
+        'id': api_order_id,
+        'status': status,
+        'personal_id': str(current['id']),
+        'received_sum': received_sum
+    }
+    if api_name == 'OnlyPays':
+        await process_onlypays_webhook(webhook_data, bot)
+    elif api_name == 'PSPWare':
+        await process_pspware_webhook(webhook_data, bot)
+    return status
+
+status_poller = PaymentStatusPoller(
+    payment_api_manager,
+    db.get_pollable_orders,
+    apply_polled_status,
+    schedule=((300, config.STATUS_POLL_FAST_INTERVAL), (900, config.STATUS_POLL_INTERVAL)),
+    slow_interval=config.STATUS_POLL_SLOW_INTERVAL,
+    concurrency=config.STATUS_POLL_CONCURRENCY,
+    tick=config.STATUS_POLL_TICK,
+    cache_ttl=config.STATUS_CACHE_TTL
+)
+
 async def process_pspware_webhook(webhook_data: dict, bot):
     try:
         order_id = webhook_data.get('personal_id')
@@ -1682,3 +1834,33 @@ async def process_onlypays_webhook(webhook_data: dict, bot):
     except Exception as e:
         logger.error(f"Ошибка обработки OnlyPays webhook: {e}")
 
+
+WEBHOOK_PROCESSORS = {
+    'onlypays': process_onlypays_webhook,
+    'pspware': process_pspware_webhook,
+    'greengo': process_greengo_webhook,
+    'nicepay': process_nicepay_webhook,
+}
+
+async def payment_webhook_job(payload: dict, job: dict):
+    processor = WEBHOOK_PROCESSORS.get(payload.get('provider'))
+    if processor is None:
+        logger.error(f"Неизвестный провайдер вебхука: {payload.get('provider')}")
+        return
+    try:
+        order = await db.get_order(int(payload['order_ref']))
+    except (TypeError, ValueError):
+        order = None
+    if not order:
+        logger.error(f"Вебхук {payload['provider']}: заявка {payload.get('order_ref')} не найдена")
+        await db.mark_payment_webhook_processed(payload['event_id'])
+        return
+    if order['status'] not in ('waiting', 'expired'):
+        logger.info(f"Вебхук {payload['provider']} ({payload['status']}) по заявке {order['id']} пропущен: статус {order['status']}")
+        await db.mark_payment_webhook_processed(payload['event_id'])
+        return
+    bot = bot_registry.get(order.get('mirror_id'))
+    if bot is None:
+        raise RetryJob(5, "bot is not registered yet")
+    await processor(payload['data'], bot)
+    await db.mark_payment_webhook_processed(payload['event_id'])
@@ -1,13 +1,27 @@
 import asyncio
 import logging
+import signal
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from config import config
+from api.http import http_transport
+from api.circuit_breaker import breaker_registry
 from database.models import Database
-from handlers import user, admin, operator, calculator
-from middlewares.chat_type import PrivateChatMiddleware
+from database.jobs import JobWorkerPool
+from utils.bots import bot_registry
+from utils.bitcoin import rate_service
+from utils.captcha import captcha_pool
+from utils.broadcast import broadcast_engine
+from utils.supervisor import ShardSupervisor, WorkerMonitor, resolve_worker_count, shard_of
+from web.server import web_server
+from web.payment_webhooks import payment_webhooks
+from web.telegram_webhooks import telegram_webhooks
+from handlers import user
+from handlers.factory import build_mirror_router
+from middlewares.chat_type import PrivateChatMiddleware, role_resolver
+from middlewares.mirror_context import MirrorContextMiddleware
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,72 +40,121 @@ async def init_database():
         db = Database(config.DATABASE_URL)
         await db.init_db()
         await db.init_turnover_db()
+        settings_count = await db.warm_settings_cache()
         logger.info(f"База данных инициализирована")
+        logger.info(f"Кэш настроек прогрет: {settings_count} ключей ({db.mirror_id})")
         logger.info(f"Oborot DB: {config.CENTRAL_DB_PATH}")
+        for db_path in (config.DATABASE_URL, config.CENTRAL_DB_PATH):
+            storage = await Database.get_pool(db_path).storage_info()
+            logger.info(f"Профиль хранилища {db_path}: {storage}")
     except Exception as e:
         logger.error(f"Ошибка инициализации базы данных: {e}")
         raise
 
+def create_bot_client(token, mirror_id):
+    session = bot_registry.session(limit=max(100, len(config.get_all_bot_tokens()) * 2))
+    bot = Bot(token=token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.mirror_id = mirror_id
+    bot.mirror_config = config.get_mirror_config(mirror_id)
+    bot_registry.register(mirror_id, bot)
+    return bot
+
 async def create_bot_instance(token, mirror_id):
                                                          
-    bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot = create_bot_client(token, mirror_id)
     dp = Dispatcher()
+    dp.include_router(build_mirror_router(mirror_id))
     
-    
-
-    import importlib
-    
-    
-    admin_module = importlib.reload(admin)
-    user_module = importlib.reload(user)
-    operator_module = importlib.reload(operator)
-    calculator_module = importlib.reload(calculator)
-    
-    
-    dp.include_router(admin_module.router)
-    dp.include_router(user_module.router)
-    dp.include_router(operator_module.router)
-    dp.include_router(calculator_module.router)
-    
-    
+    dp.update.outer_middleware(MirrorContextMiddleware(mirror_id, bot.mirror_config))
     dp.message.middleware(PrivateChatMiddleware())
     dp.callback_query.middleware(PrivateChatMiddleware())
     
-    
-    bot.mirror_id = mirror_id
-    bot.mirror_config = config.get_mirror_config(mirror_id)
-    
     return bot, dp
 
+job_workers = JobWorkerPool(Database.get_job_queue(config.DATABASE_URL), poll_interval=config.JOB_POLL_INTERVAL)
+worker_monitor = WorkerMonitor(
+    Database(config.DATABASE_URL),
+    interval=config.WORKER_HEARTBEAT_INTERVAL,
+    events=lambda: role_resolver.stats()['events']
+)
+
+def start_job_workers():
+    job_workers.register(
+        'fetch_requisites',
+        user.fetch_requisites_job,
+        concurrency=config.JOB_REQUISITES_CONCURRENCY,
+        lease_seconds=180,
+        backoff=config.REQUISITES_RETRY_DELAY
+    )
+    job_workers.register(
+        'payment_webhook',
+        user.payment_webhook_job,
+        concurrency=config.PAYMENT_WEBHOOK_CONCURRENCY,
+        lease_seconds=60,
+        backoff=5,
+        max_backoff=120
+    )
+    job_workers.register(
+        'turnover_backfill',
+        Database.get_turnover_rollups(config.CENTRAL_DB_PATH).backfill_job,
+        concurrency=1,
+        lease_seconds=600,
+        backoff=30
+    )
+    job_workers.start()
+
+async def start_web_server():
+    if config.PAYMENT_WEBHOOKS_ENABLED:
+        providers = payment_webhooks.register(web_server)
+        logger.info(f"Вебхуки платежных систем: {providers} провайдеров на {config.PAYMENT_WEBHOOK_PATH}")
+    bots = telegram_webhooks.register(web_server)
+    if bots:
+        logger.info(f"Webhook-режим Telegram: {bots} ботов на {config.TELEGRAM_WEBHOOK_PATH}")
+    await web_server.start()
+
+async def start_order_expiry():
+    scheduler = Database.get_expiry_scheduler(config.DATABASE_URL)
+    scheduler.on_expired(user.handle_expired_orders)
+    await scheduler.start()
+
 async def run_bot_polling(bot, dp, mirror_id):
                                                  
     try:
         logger.info(f"Запуск бота: {mirror_id}")
         await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot, skip_updates=True)
+        await dp.start_polling(bot, skip_updates=True, close_bot_session=False)
     except Exception as e:
         logger.error(f"Ошибка в боте {mirror_id}: {e}")
         raise
-    finally:
-        try:
-            await bot.session.close()
-        except Exception as e:
-            logger.error(f"Ошибка закрытия сессии бота {mirror_id}: {e}")
 
-async def run_polling():
+def launch_bot(tasks, bot, dp, mirror_id, task_name):
+    if config.BOT_MODE == 'webhook':
+        telegram_webhooks.add_bot(bot, dp, mirror_id)
+        return
+    tasks.append(asyncio.create_task(run_bot_polling(bot, dp, mirror_id), name=task_name))
+
+async def run_polling(shard=0, shard_count=1, restarts=0):
                                             
     await init_database()
+    await Database.get_captcha_store(config.DATABASE_URL).start()
+    await http_transport.start()
+    rate_service.start()
     
     tasks = []
-    
+    owned = []
+    primary = shard == 0
     
     try:
-        main_bot, main_dp = await create_bot_instance(config.BOT_TOKEN, "main")
-        tasks.append(asyncio.create_task(
-            run_bot_polling(main_bot, main_dp, "main"),
-            name="main_bot"
-        ))
-        logger.info(f"Основной бот запущен с MIRROR_ID: {config.MIRROR_ID}")
+        if shard_of(0, shard_count) == shard:
+            main_bot, main_dp = await create_bot_instance(config.BOT_TOKEN, "main")
+            launch_bot(tasks, main_bot, main_dp, "main", "main_bot")
+            owned.append("main")
+            logger.info(f"Основной бот запущен с MIRROR_ID: {config.MIRROR_ID}")
+        else:
+            main_bot = create_bot_client(config.BOT_TOKEN, "main")
+        breaker_registry.start(
+            (lambda text: main_bot.send_message(config.ADMIN_CHAT_ID, text)) if config.ADMIN_CHAT_ID and primary else None
+        )
     except Exception as e:
         logger.error(f"Ошибка создания основного бота: {e}")
         raise
@@ -102,16 +165,37 @@ async def run_polling():
             if mirror_token:
                 try:
                     mirror_id = f"mirror_{i+1}"
+                    if shard_of(i + 1, shard_count) != shard:
+                        create_bot_client(mirror_token, mirror_id)
+                        continue
                     mirror_bot, mirror_dp = await create_bot_instance(mirror_token, mirror_id)
-                    tasks.append(asyncio.create_task(
-                        run_bot_polling(mirror_bot, mirror_dp, mirror_id),
-                        name=f"mirror_bot_{i+1}"
-                    ))
+                    launch_bot(tasks, mirror_bot, mirror_dp, mirror_id, f"mirror_bot_{i+1}")
+                    owned.append(mirror_id)
                     logger.info(f"Зеркальный бот {mirror_id} добавлен в очередь запуска")
                 except Exception as e:
                     logger.error(f"Ошибка создания зеркального бота {i+1}: {e}")
                     continue
     
+    roles = ["jobs"]
+    start_job_workers()
+    if owned and config.CAPTCHA_ENABLED:
+        captcha_pool.start()
+        roles.append("captcha")
+    if primary:
+        await start_order_expiry()
+        if not await Database.get_turnover_rollups(config.CENTRAL_DB_PATH).is_ready():
+            await job_workers.queue.enqueue('turnover_backfill', {}, dedup_key='turnover_backfill')
+        user.status_poller.start()
+        await start_web_server()
+        roles.extend(["expiry", "status_poller", "web"])
+        if config.BOT_MODE == 'webhook':
+            await telegram_webhooks.start()
+            tasks.append(asyncio.create_task(telegram_webhooks.wait_closed(), name="telegram_webhooks"))
+    if owned:
+        await broadcast_engine.resume(owned)
+        roles.append("broadcast")
+    await worker_monitor.start(shard, owned, roles, restarts)
+    
     try:
         await asyncio.gather(*tasks, return_exceptions=True)
     except KeyboardInterrupt:
@@ -123,6 +207,15 @@ async def run_polling():
 async def on_shutdown():
                                    
     try:
+        await worker_monitor.stop()
+        await web_server.stop()
+        await broadcast_engine.stop()
+        await job_workers.stop()
+        await user.status_poller.stop()
+        await rate_service.stop()
+        await captcha_pool.stop()
+        await Database.get_expiry_scheduler(config.DATABASE_URL).stop()
+        await Database.get_captcha_store(config.DATABASE_URL).stop()
         tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
         
         for task in tasks:
@@ -130,26 +223,69 @@ async def on_shutdown():
         
         if tasks:
             await asyncio.gather(*tasks, return_exceptions=True)
-            
+
+        await breaker_registry.stop()
+        await Database.close_pools()
+        await http_transport.close()
+        await bot_registry.close()
         logger.info("Все задачи завершены")
     except Exception as e:
         logger.error(f"Ошибка при завершении работы: {e}")
 
-async def main():
+async def main(shard=0, shard_count=1, restarts=0):
                                  
     try:
-        await run_polling()
+        await run_polling(shard, shard_count, restarts)
     except KeyboardInterrupt:
         logger.info("Основной процесс остановлен пользователем")
+    except asyncio.CancelledError:
+        logger.info(f"Воркер shard-{shard} получил сигнал остановки")
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}")
         raise
     finally:
         await on_shutdown()
 
-if __name__ == "__main__":
+async def run_shard(shard, shard_count, restarts):
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, task.cancel)
+    await main(shard, shard_count, restarts)
+
+def shard_entry(shard, shard_count, restarts):
     try:
+        asyncio.run(run_shard(shard, shard_count, restarts))
+    except Exception as e:
+        logger.error(f"Фатальная ошибка воркера shard-{shard}: {e}")
+        raise SystemExit(1)
+
+async def prepare_supervisor():
+    await init_database()
+    await Database(config.DATABASE_URL).clear_worker_heartbeats()
+    await Database.close_pools()
+
+def run_supervisor():
+    workers = resolve_worker_count(config.BOT_WORKERS)
+    bots = len(config.get_all_bot_tokens())
+    workers = min(workers, max(1, bots))
+    if workers <= 1 or config.BOT_MODE == 'webhook':
+        if config.BOT_MODE == 'webhook' and workers > 1:
+            logger.warning("Webhook-режим обслуживает все боты одним процессом, BOT_WORKERS игнорируется")
         asyncio.run(main())
+        return
+    asyncio.run(prepare_supervisor())
+    ShardSupervisor(
+        shard_entry,
+        workers,
+        restart_backoff=config.WORKER_RESTART_BACKOFF,
+        max_backoff=config.WORKER_MAX_RESTART_BACKOFF,
+        stop_timeout=config.WEB_SHUTDOWN_TIMEOUT + 5
+    ).run()
+
+if __name__ == "__main__":
+    try:
+        run_supervisor()
     except KeyboardInterrupt:
         logger.info("Программа завершена")
     except Exception as e:
@@ -1,11 +1,25 @@
-from typing import Callable, Dict, Any, Awaitable
+import logging
+import time
+from typing import Callable, Dict, Any, Awaitable, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
 from aiogram.enums import ChatType
 from config import config
+from database.models import Database
+from middlewares.roles import StaffRoleResolver
+
+logger = logging.getLogger(__name__)
+
+GROUP_CHAT_TYPES = frozenset({ChatType.GROUP, ChatType.SUPERGROUP, ChatType.CHANNEL})
+
+role_resolver = StaffRoleResolver(Database(config.DATABASE_URL))
+
 
 class PrivateChatMiddleware(BaseMiddleware):
     
+    def __init__(self, resolver: StaffRoleResolver = None):
+        self.resolver = resolver or role_resolver
+    
     async def __call__(
         self,
         handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
@@ -13,6 +27,8 @@ class PrivateChatMiddleware(BaseMiddleware):
         data: Dict[str, Any]
     ) -> Any:
         
+        started = time.perf_counter()
+        
         if isinstance(event, Message):
             chat = event.chat
             user_id = event.from_user.id
@@ -24,102 +40,66 @@ class PrivateChatMiddleware(BaseMiddleware):
         else:
             return await handler(event, data)
         
-        super_admins = [config.ADMIN_USER_ID]
-        if user_id in super_admins:
+        if self.resolver.is_super_admin(user_id):
+            self.resolver.record_latency(time.perf_counter() - started)
             return await handler(event, data)
         
-        from database.models import Database
-        db = Database(config.DATABASE_URL)
+        verdict = await self._resolve(event, chat, user_id, message_text)
+        self.resolver.record_latency(time.perf_counter() - started)
         
+        if verdict is None:
+            return await handler(event, data)
+        if not verdict:
+            return
+        if isinstance(event, CallbackQuery):
+            await event.answer(verdict, show_alert=True)
+        else:
+            await event.answer(verdict)
+    
+    async def _is_staff(self, user_id: int) -> bool:
         try:
-            admin_users = await db.get_setting("admin_users", [])
-            operator_users = await db.get_setting("operator_users", [])
-            is_staff = user_id in admin_users or user_id in operator_users
-        except:
-            is_staff = False
-        
-        admin_commands = [
-            "/admin", "/grant_admin", "/grant_operator", "/revoke_admin", 
-            "/revoke_operator", "/my_id", "/list_staff", "/get_my_id",
-            "/setup_admin_chat", "/set_percentage", "/toggle_captcha",
-            "/user_info", "/block_user", "/unblock_user", "/search_user",
-            "/recent_users", "/user_stats", "/send_message", "/check_captcha",
-            "/recent_orders", "/pending_orders", "/order_info", 
-            "/complete_order", "/cancel_order", "/set_limits", "/set_welcome"
-        ]
-        
-        admin_buttons = [
-            "📊 Статистика", "⚙️ Настройки", "📋 Заявки", 
-            "💰 Баланс", "👥 Персонал", "🔧 Управление",
-            "❌ Скрыть панель", "📢 Рассылка", "👥 Пользователи",
-            "◀️ Выйти из админки"
-        ]
-        
-        admin_callbacks = [
-            "admin_", "user_", "staff_", "settings_",
-            "op_"
-        ]
-        
-        user_callbacks = [
-            "confirm_order_", "cancel_order_"
-        ]
+            return await self.resolver.is_staff(user_id)
+        except Exception as e:
+            logger.error(f"Ошибка определения роли пользователя {user_id}: {e}")
+            return False
+    
+    async def _resolve(self, event: Message | CallbackQuery, chat, user_id: int, message_text: str) -> Optional[str]:
+        resolver = self.resolver
         
-        if chat.type in [ChatType.GROUP, ChatType.SUPERGROUP, ChatType.CHANNEL]:
+        if chat.type in GROUP_CHAT_TYPES:
             if isinstance(event, CallbackQuery):
-                if any(event.data.startswith(prefix) for prefix in admin_callbacks):
-                    await event.answer("❌ У вас нет прав", show_alert=True)
-                    return
-                else:
-                    await event.answer("❌ Кнопки недоступны в групповых чатах", show_alert=True)
-                    return
-            
-            if isinstance(event, Message):
-                if message_text.startswith("/"):
-                    if any(message_text.startswith(cmd) for cmd in admin_commands):
-                        await event.answer("❌ У вас нет прав для выполнения этой команды")
-                        return
-                    else:
-                        await event.answer("❌ В групповых чатах доступны только административные команды")
-                        return
-                elif message_text in admin_buttons:
-                    await event.answer("❌ У вас нет прав администратора")
-                    return
-                else:
-                    return
+                if resolver.is_admin_callback(message_text):
+                    return "❌ У вас нет прав"
+                return "❌ Кнопки недоступны в групповых чатах"
             
-            return
+            if message_text.startswith("/"):
+                if resolver.is_admin_command(message_text):
+                    return "❌ У вас нет прав для выполнения этой команды"
+                return "❌ В групповых чатах доступны только административные команды"
+            if resolver.is_admin_button(message_text):
+                return "❌ У вас нет прав администратора"
+            return ""
         
         if isinstance(event, Message):
             if message_text.startswith("/"):
-                if any(message_text.startswith(cmd) for cmd in admin_commands):
-                    if not is_staff:
-                        await event.answer("❌ У вас нет прав для выполнения этой команды")
-                        return
+                if resolver.is_admin_command(message_text):
+                    if not await self._is_staff(user_id):
+                        return "❌ У вас нет прав для выполнения этой команды"
                 
-                allowed_user_commands = ["/start", "/help"]
-                if any(message_text.startswith(cmd) for cmd in allowed_user_commands):
-                    return await handler(event, data)
+                if resolver.is_user_command(message_text):
+                    return None
                 
-                await event.answer("❌ Команда недоступна")
-                return
+                return "❌ Команда недоступна"
             
             if chat.type == ChatType.PRIVATE:
-                if message_text in admin_buttons:
-                    if not is_staff:
-                        await event.answer("❌ У вас нет доступа к админ-панели")
-                        return
-                
-                return await handler(event, data)
-        
-        elif isinstance(event, CallbackQuery):
-            if any(event.data.startswith(prefix) for prefix in admin_callbacks):
-                if not is_staff:
-                    await event.answer("❌ У вас нет прав", show_alert=True)
-                    return
-            elif any(event.data.startswith(prefix) for prefix in user_callbacks):
-                return await handler(event, data)
+                if resolver.is_admin_button(message_text):
+                    if not await self._is_staff(user_id):
+                        return "❌ У вас нет доступа к админ-панели"
             
-            if chat.type == ChatType.PRIVATE:
-                return await handler(event, data)
+            return None
+        
+        if resolver.is_admin_callback(message_text):
+            if not await self._is_staff(user_id):
+                return "❌ У вас нет прав"
         
-        return await handler(event, data)
\ No newline at end of file
+        return None
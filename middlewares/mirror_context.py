@@ -0,0 +1,23 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import config
+
+
+class MirrorContextMiddleware(BaseMiddleware):
+
+    def __init__(self, mirror_id: str, mirror_config: Dict[str, Any] = None):
+        self.mirror_id = mirror_id
+        self.mirror_config = mirror_config if mirror_config is not None else config.get_mirror_config(mirror_id)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        data['mirror_id'] = self.mirror_id
+        data['mirror_config'] = self.mirror_config
+        return await handler(event, data)
@@ -0,0 +1,100 @@
+import re
+import time
+from typing import Any, Dict, FrozenSet, Iterable
+
+from config import config
+
+ADMIN_COMMANDS = frozenset({
+    "/admin", "/grant_admin", "/grant_operator", "/revoke_admin",
+    "/revoke_operator", "/my_id", "/list_staff", "/get_my_id",
+    "/setup_admin_chat", "/set_percentage", "/toggle_captcha",
+    "/user_info", "/block_user", "/unblock_user", "/search_user",
+    "/recent_users", "/user_stats", "/send_message", "/check_captcha",
+    "/recent_orders", "/pending_orders", "/order_info",
+    "/complete_order", "/cancel_order", "/set_limits", "/set_welcome",
+    "/rate_history"
+})
+
+USER_COMMANDS = frozenset({"/start", "/help"})
+
+ADMIN_BUTTONS = frozenset({
+    "📊 Статистика", "⚙️ Настройки", "📋 Заявки",
+    "💰 Баланс", "👥 Персонал", "🔧 Управление",
+    "❌ Скрыть панель", "📢 Рассылка", "👥 Пользователи",
+    "◀️ Выйти из админки"
+})
+
+ADMIN_CALLBACK_PREFIXES = ("admin_", "user_", "staff_", "settings_", "op_", "bcast_")
+
+
+def compile_prefixes(prefixes: Iterable[str]) -> re.Pattern:
+    return re.compile("|".join(re.escape(prefix) for prefix in sorted(prefixes, key=len, reverse=True)))
+
+
+def command_token(text: str) -> str:
+    if not text.startswith("/"):
+        return ""
+    token = text.split(maxsplit=1)[0]
+    return token.split("@", 1)[0].lower()
+
+
+class StaffRoleResolver:
+    def __init__(self, db, refresh_interval: float = None):
+        self.db = db
+        self.refresh_interval = config.SETTINGS_CACHE_TTL if refresh_interval is None else refresh_interval
+        self.super_admins: FrozenSet[int] = frozenset({config.ADMIN_USER_ID})
+        self.admin_ids: FrozenSet[int] = frozenset()
+        self.operator_ids: FrozenSet[int] = frozenset()
+        self.staff_ids: FrozenSet[int] = frozenset()
+        self._generation = None
+        self._refresh_at = 0.0
+        self._admin_callbacks = compile_prefixes(ADMIN_CALLBACK_PREFIXES)
+        self._latency = {'events': 0, 'total': 0.0, 'max': 0.0}
+
+    async def refresh(self):
+        admin_users = await self.db.get_setting("admin_users", [])
+        operator_users = await self.db.get_setting("operator_users", [])
+        self.admin_ids = frozenset(admin_users or [])
+        self.operator_ids = frozenset(operator_users or [])
+        self.staff_ids = self.admin_ids | self.operator_ids
+        self._generation = self.db.settings_cache.generation
+        self._refresh_at = time.monotonic() + self.refresh_interval
+
+    async def is_staff(self, user_id: int) -> bool:
+        await self.db.sync_settings_cache(force=True)
+        if self._generation != self.db.settings_cache.generation or time.monotonic() >= self._refresh_at:
+            await self.refresh()
+        return user_id in self.staff_ids
+
+    def is_super_admin(self, user_id: int) -> bool:
+        return user_id in self.super_admins
+
+    @staticmethod
+    def is_admin_command(text: str) -> bool:
+        return command_token(text) in ADMIN_COMMANDS
+
+    @staticmethod
+    def is_user_command(text: str) -> bool:
+        return command_token(text) in USER_COMMANDS
+
+    @staticmethod
+    def is_admin_button(text: str) -> bool:
+        return text in ADMIN_BUTTONS
+
+    def is_admin_callback(self, data: str) -> bool:
+        return self._admin_callbacks.match(data) is not None
+
+    def record_latency(self, seconds: float):
+        self._latency['events'] += 1
+        self._latency['total'] += seconds
+        if seconds > self._latency['max']:
+            self._latency['max'] = seconds
+
+    def stats(self) -> Dict[str, Any]:
+        events = self._latency['events']
+        return {
+            'staff': len(self.staff_ids),
+            'events': events,
+            'avg_us': (self._latency['total'] / events * 1_000_000) if events else 0.0,
+            'max_us': self._latency['max'] * 1_000_000,
+        }
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from utils.rate_sources import RateAggregator, aggregate, parse_static_sources
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run the BTC/RUB rate aggregator against offline stub sources")
+    parser.add_argument("--sources", default=config.RATE_STATIC_SOURCES,
+                        help="Stub sources as name=value,... (defaults to RATE_STATIC_SOURCES)")
+    parser.add_argument("--min-sources", type=int, default=config.RATE_MIN_SOURCES, help="Sources that must agree")
+    parser.add_argument("--mad", type=float, default=config.RATE_OUTLIER_MAD, help="Robust z-score threshold")
+    parser.add_argument("--max-deviation", type=float, default=config.RATE_MAX_DEVIATION,
+                        help="Maximum relative deviation from the median")
+    args = parser.parse_args()
+
+    sources = parse_static_sources(args.sources)
+    if not sources:
+        parser.error("no stub sources given, pass --sources or set RATE_STATIC_SOURCES")
+
+    aggregator = RateAggregator(sources, min_sources=args.min_sources, mad_threshold=args.mad,
+                                max_deviation=args.max_deviation)
+    value = await aggregator.fetch()
+    samples = {source.name: source.value for source in sources}
+    result = aggregate(samples, args.mad, args.max_deviation)
+
+    for name, sample in samples.items():
+        verdict = "accepted" if name in result['sources'] else "rejected"
+        print(f"{name:>16}: {sample:>16,.0f}  {verdict}")
+    print(f"dispersion: {result['dispersion']:.2%}, accepted {len(result['sources'])} of {args.min_sources} required")
+    if value is None:
+        print("rate: unavailable")
+        sys.exit(1)
+    print(f"rate: {value:,.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from database.models import Database
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Recompute dashboard statistics counters from the users and orders tables")
+    parser.add_argument("--db", default=config.DATABASE_URL, help="Database file")
+    parser.add_argument("--check", action="store_true", help="Report drift without writing the rebuilt counters")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    await db.init_db()
+    try:
+        started = time.perf_counter()
+        result = await db.rebuild_statistics(apply=not args.check)
+        elapsed = time.perf_counter() - started
+    finally:
+        await Database.close_pools()
+
+    print(
+        f"{'checked' if args.check else 'rebuilt'} in {elapsed * 1000:.1f}ms: "
+        f"{result['mirrors']} mirrors, {result['days']} daily rows"
+    )
+    print(f"drift: stats_mirror={result['stats_mirror']} stats_daily={result['stats_daily']}")
+    if args.check and (result['stats_mirror'] or result['stats_daily']):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
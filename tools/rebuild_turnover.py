@@ -0,0 +1,36 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from database.models import Database
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Recompute turnover rollup tables from the mirror_turnover table")
+    parser.add_argument("--db", default=config.CENTRAL_DB_PATH, help="Central turnover database file")
+    parser.add_argument("--check", action="store_true", help="Report drift without writing the rebuilt rollups")
+    args = parser.parse_args()
+
+    config.CENTRAL_DB_PATH = args.db
+    db = Database(config.DATABASE_URL)
+    await db.init_turnover_db()
+    try:
+        started = time.perf_counter()
+        drift = await Database.get_turnover_rollups(args.db).rebuild(apply=not args.check)
+        elapsed = time.perf_counter() - started
+    finally:
+        await Database.close_pools()
+
+    print(f"{'checked' if args.check else 'rebuilt'} in {elapsed * 1000:.1f}ms")
+    print("drift: " + " ".join(f"{table}={count}" for table, count in drift.items()))
+    if args.check and any(drift.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from database.models import Database
+from web.payment_webhooks import PROVIDERS, sign_payload
+
+
+def load_file(path: str) -> list:
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                event = json.loads(line)
+                events.append({'provider': event['provider'], 'payload': event['payload']})
+    return events
+
+
+async def load_recorded(provider: str, limit: int) -> list:
+    db = Database(config.DATABASE_URL)
+    await db.init_db()
+    try:
+        return await db.get_recorded_webhooks(provider, limit)
+    finally:
+        await Database.close_pools()
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def replay(events: list, base_url: str, concurrency: int, rate: float, unique: bool) -> dict:
+    secrets = config.get_payment_webhook_secrets()
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = Counter()
+    latencies = []
+    interval = 1.0 / rate if rate > 0 else 0.0
+
+    async def send(session: aiohttp.ClientSession, index: int, event: dict):
+        payload = dict(event['payload'])
+        if unique:
+            _, _, status_field = PROVIDERS[event['provider']]
+            payload[status_field] = f"{payload.get(status_field)}-replay-{index}"
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        headers = {'Content-Type': 'application/json'}
+        secret = secrets.get(event['provider'])
+        if secret:
+            headers['X-Signature'] = sign_payload(secret, body)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with session.post(f"{base_url}/{event['provider']}", data=body, headers=headers) as response:
+                    result = (await response.json(content_type=None) or {}).get('status', response.status)
+                    statuses[f"{response.status} {result}"] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        tasks = []
+        for index, event in enumerate(events):
+            tasks.append(asyncio.create_task(send(session, index, event)))
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        'sent': len(events),
+        'elapsed': elapsed,
+        'rps': len(events) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+        'statuses': dict(statuses),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay recorded payment webhooks against the local web server")
+    parser.add_argument("--file", help="JSONL file with {\"provider\": ..., \"payload\": {...}} per line")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), help="Replay only this provider when reading from the database")
+    parser.add_argument("--limit", type=int, default=1000, help="Recorded webhooks to load from the database")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{config.WEB_SERVER_PORT}{config.PAYMENT_WEBHOOK_PATH}")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=0, help="Requests per second, 0 for unlimited")
+    parser.add_argument("--unique", action="store_true", help="Suffix statuses so every request passes deduplication")
+    args = parser.parse_args()
+
+    events = load_file(args.file) if args.file else await load_recorded(args.provider, args.limit)
+    if not events:
+        print("No webhooks to replay")
+        return
+    result = await replay(events * args.repeat, args.url.rstrip('/'), args.concurrency, args.rate, args.unique)
+    print(
+        f"sent={result['sent']} elapsed={result['elapsed']:.2f}s rps={result['rps']:.1f} "
+        f"p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms max={result['max_ms']:.1f}ms"
+    )
+    for status, count in sorted(result['statuses'].items()):
+        print(f"  {status}: {count}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
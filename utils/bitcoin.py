@@ -1,32 +1,22 @@
-import aiohttp
+from config import config
+from utils.rates import RateHistory, RateService
+from utils.rate_sources import RateAggregator, default_sources, parse_static_sources
 import logging
 from typing import Optional
-import ssl
 
 logger = logging.getLogger(__name__)
 
+RATE_UNAVAILABLE_TEXT = "❌ Ошибка получения курса. Попробуйте позже."
+
 class BitcoinAPI:
     
     @staticmethod
     async def get_btc_rate() -> Optional[float]:
-        try:
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.get(
-                    'https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=rub'
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data['bitcoin']['rub']
-        except Exception as e:
-            logger.error(f"Error fetching BTC rate: {e}")
-        
-        return 2800000.0
+        return await rate_service.get_rate()
+
+    @staticmethod
+    async def fetch_btc_rate() -> Optional[float]:
+        return await rate_aggregator.fetch()
 
     @staticmethod
     def validate_btc_address(address: str) -> bool:
@@ -51,3 +41,20 @@ class BitcoinAPI:
         total_amount = total_with_processing + admin_fee
         
         return processing_fee, admin_fee, total_amount
+
+
+rate_aggregator = RateAggregator(
+    parse_static_sources(config.RATE_STATIC_SOURCES) or default_sources(config.RATE_SOURCE_TIMEOUT),
+    min_sources=config.RATE_MIN_SOURCES,
+    mad_threshold=config.RATE_OUTLIER_MAD,
+    max_deviation=config.RATE_MAX_DEVIATION
+)
+
+rate_service = RateService(
+    BitcoinAPI.fetch_btc_rate,
+    ttl=config.RATE_CACHE_TTL,
+    max_stale=config.RATE_MAX_STALE,
+    refresh_interval=config.RATE_REFRESH_INTERVAL,
+    history=RateHistory(config.RATE_HISTORY_SIZE),
+    quote_ttl=config.RATE_QUOTE_TTL
+)
@@ -0,0 +1,39 @@
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+
+
+class BotRegistry:
+    def __init__(self, default_mirror: str = "main"):
+        self.default_mirror = default_mirror
+        self._bots: Dict[str, Bot] = {}
+        self._session: Optional[AiohttpSession] = None
+
+    def session(self, limit: int = 100) -> AiohttpSession:
+        if self._session is None:
+            self._session = AiohttpSession()
+            self._session._connector_init['limit'] = limit
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def register(self, mirror_id: str, bot: Bot):
+        self._bots[mirror_id] = bot
+
+    def unregister(self, mirror_id: str):
+        self._bots.pop(mirror_id, None)
+
+    def get(self, mirror_id: Optional[str] = None) -> Optional[Bot]:
+        if mirror_id and mirror_id in self._bots:
+            return self._bots[mirror_id]
+        return self._bots.get(self.default_mirror)
+
+    def all(self) -> Dict[str, Bot]:
+        return dict(self._bots)
+
+
+bot_registry = BotRegistry()
@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import config
+from database.models import Database
+from database.segments import Segment
+from utils.bots import bot_registry
+
+logger = logging.getLogger(__name__)
+
+PENDING, SENT, FAILED, BLOCKED = 0, 1, 2, 3
+CANCEL_CALLBACK_PREFIX = "bcast_stop_"
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastRun:
+    def __init__(self, job: Dict[str, Any], bot: Bot):
+        self.job = job
+        self.bot = bot
+        self.job_id = job['id']
+        self.results: List[Tuple[int, int]] = []
+        self.counts = {SENT: job['sent'], FAILED: job['failed'], BLOCKED: job['blocked']}
+        self.retries = 0
+        self.started = time.monotonic()
+        self.started_done = sum(self.counts.values())
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    def speed(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return (self.done - self.started_done) / elapsed if elapsed > 0 else 0.0
+
+
+class BroadcastEngine:
+    def __init__(self, db: Database, rate: float = 25.0, concurrency: int = 10, progress_interval: float = 3.0,
+                 flush_size: int = 200, page_size: int = 500, max_attempts: int = 3):
+        self.db = db
+        self.rate = rate
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.flush_size = flush_size
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._runs: Dict[int, BroadcastRun] = {}
+
+    def bucket(self, bot: Bot) -> TokenBucket:
+        bucket = self._buckets.get(bot.id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate)
+            self._buckets[bot.id] = bucket
+        return bucket
+
+    def is_running(self, job_id: int) -> bool:
+        return job_id in self._runs
+
+    async def start(self, bot: Bot, mirror_id: str, admin_chat_id: int, from_chat_id: int,
+                    message_id: int, segment: Segment, params: List[Any] = None) -> int:
+        job_id = await self.db.create_broadcast_job(admin_chat_id, from_chat_id, message_id, segment, params, mirror_id)
+        job = await self.db.get_broadcast_job(job_id)
+        progress = await bot.send_message(admin_chat_id, self.progress_text(BroadcastRun(job, bot)),
+                                          reply_markup=self.cancel_markup(job_id), parse_mode="HTML")
+        await self.db.set_broadcast_progress_message(job_id, progress.message_id)
+        job['progress_message_id'] = progress.message_id
+        self.launch(job, bot)
+        return job_id
+
+    def launch(self, job: Dict[str, Any], bot: Bot) -> BroadcastRun:
+        run = BroadcastRun(job, bot)
+        self._runs[run.job_id] = run
+        run.task = asyncio.create_task(self._run(run), name=f"broadcast_{run.job_id}")
+        logger.info(f"Рассылка #{run.job_id} запущена: {job['total'] - run.done} получателей")
+        return run
+
+    async def resume(self, mirror_ids: Iterable[str]) -> int:
+        mirror_ids = set(mirror_ids)
+        resumed = 0
+        for job in await self.db.get_broadcast_jobs('running'):
+            if job['id'] in self._runs or job['mirror_id'] not in mirror_ids:
+                continue
+            bot = bot_registry.get(job['mirror_id'])
+            if bot is None:
+                continue
+            self.launch(job, bot)
+            resumed += 1
+        if resumed:
+            logger.info(f"Возобновлено рассылок: {resumed}")
+        return resumed
+
+    def cancel(self, job_id: int) -> bool:
+        run = self._runs.get(job_id)
+        if run is None:
+            return False
+        run.cancelled = True
+        return True
+
+    async def stop(self):
+        runs = list(self._runs.values())
+        for run in runs:
+            run.task.cancel()
+        await asyncio.gather(*(run.task for run in runs), return_exceptions=True)
+
+    async def _deliver(self, run: BroadcastRun, user_id: int) -> int:
+        bucket = self.bucket(run.bot)
+        for attempt in range(1, self.max_attempts + 1):
+            await bucket.acquire()
+            try:
+                await run.bot.copy_message(
+                    chat_id=user_id,
+                    from_chat_id=run.job['from_chat_id'],
+                    message_id=run.job['message_id']
+                )
+                return SENT
+            except TelegramRetryAfter as e:
+                run.retries += 1
+                bucket.pause(e.retry_after)
+                logger.warning(f"Рассылка #{run.job_id}: flood control, пауза {e.retry_after} сек")
+            except TelegramForbiddenError:
+                return BLOCKED
+            except TelegramBadRequest as e:
+                logger.debug(f"Рассылка #{run.job_id}: не доставлено {user_id}: {e}")
+                return FAILED
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error(f"Рассылка #{run.job_id}: ошибка отправки {user_id}: {e}")
+                    return FAILED
+                run.retries += 1
+                await asyncio.sleep(attempt)
+        return FAILED
+
+    async def _produce(self, run: BroadcastRun, queue: asyncio.Queue):
+        after = 0
+        while not run.cancelled:
+            user_ids = await self.db.get_pending_broadcast_recipients(run.job, after, self.page_size)
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                if run.cancelled:
+                    break
+                await queue.put(user_id)
+            after = user_ids[-1]
+        for _ in range(self.concurrency):
+            await queue.put(None)
+
+    async def _work(self, run: BroadcastRun, queue: asyncio.Queue):
+        while True:
+            user_id = await queue.get()
+            if user_id is None:
+                return
+            if run.cancelled:
+                continue
+            result = await self._deliver(run, user_id)
+            run.counts[result] += 1
+            run.results.append((result, user_id))
+            if len(run.results) >= self.flush_size:
+                await self._flush(run)
+
+    async def _flush(self, run: BroadcastRun, status: str = None):
+        results, run.results = run.results, []
+        try:
+            await self.db.save_broadcast_results(run.job_id, results, status)
+        except Exception as e:
+            run.results[:0] = results
+            logger.error(f"Рассылка #{run.job_id}: ошибка сохранения прогресса: {e}")
+
+    async def _report(self, run: BroadcastRun, final: bool = False):
+        if not run.job.get('progress_message_id'):
+            return
+        await self.bucket(run.bot).acquire()
+        try:
+            await run.bot.edit_message_text(
+                self.progress_text(run, final),
+                chat_id=run.job['admin_chat_id'],
+                message_id=run.job['progress_message_id'],
+                reply_markup=None if final else self.cancel_markup(run.job_id),
+                parse_mode="HTML"
+            )
+        except TelegramRetryAfter as e:
+            self.bucket(run.bot).pause(e.retry_after)
+        except Exception as e:
+            logger.debug(f"Рассылка #{run.job_id}: прогресс не обновлен: {e}")
+
+    async def _progress(self, run: BroadcastRun):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._flush(run)
+            await self._report(run)
+
+    async def _run(self, run: BroadcastRun):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        progress = asyncio.create_task(self._progress(run))
+        status = None
+        try:
+            await asyncio.gather(
+                self._produce(run, queue),
+                *(self._work(run, queue) for _ in range(self.concurrency))
+            )
+            status = 'cancelled' if run.cancelled else 'done'
+        except asyncio.CancelledError:
+            logger.info(f"Рассылка #{run.job_id} приостановлена, будет продолжена после перезапуска")
+        except Exception as e:
+            status = 'failed'
+            logger.error(f"Рассылка #{run.job_id} завершилась с ошибкой: {e}")
+        finally:
+            progress.cancel()
+            await asyncio.gather(progress, return_exceptions=True)
+            await self._flush(run, status)
+            self._runs.pop(run.job_id, None)
+        if status:
+            await self._report(run, final=True)
+            logger.info(
+                f"Рассылка #{run.job_id} {status}: отправлено {run.counts[SENT]}, "
+                f"ошибок {run.counts[FAILED]}, заблокировали {run.counts[BLOCKED]}"
+            )
+
+    @staticmethod
+    def cancel_markup(job_id: int) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="⏹ Остановить", callback_data=f"{CANCEL_CALLBACK_PREFIX}{job_id}")
+        ]])
+
+    @staticmethod
+    def progress_text(run: BroadcastRun, final: bool = False) -> str:
+        total = run.job['total']
+        done = run.done
+        percent = done / total * 100 if total else 100.0
+        speed = run.speed()
+        if final:
+            title = "⏹ <b>Рассылка остановлена</b>" if run.cancelled else "✅ <b>Рассылка завершена!</b>"
+        else:
+            title = "📤 <b>Рассылка выполняется</b>"
+        text = (
+            f"{title} #{run.job_id}\n\n"
+            f"📊 Прогресс: {done} из {total} ({percent:.1f}%)\n"
+            f"📤 Отправлено: {run.counts[SENT]}\n"
+            f"❌ Ошибок: {run.counts[FAILED]}\n"
+            f"🚫 Заблокировали бота: {run.counts[BLOCKED]}\n"
+        )
+        if not final and speed > 0:
+            text += f"⚡ Скорость: {speed:.1f} сообщ./сек, осталось ~{(total - done) / speed / 60:.0f} мин\n"
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'active': len(self._runs),
+            'jobs': [
+                {'id': run.job_id, 'done': run.done, 'total': run.job['total'], 'speed': run.speed(), 'retries': run.retries}
+                for run in self._runs.values()
+            ],
+        }
+
+
+broadcast_engine = BroadcastEngine(
+    Database(config.DATABASE_URL),
+    rate=config.BROADCAST_RATE,
+    concurrency=config.BROADCAST_CONCURRENCY,
+    progress_interval=config.BROADCAST_PROGRESS_INTERVAL
+)
@@ -1,23 +1,150 @@
+import asyncio
+import logging
+import multiprocessing
 import random
 import string
 import io
-from typing import Tuple
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
 from captcha.image import ImageCaptcha
+from config import config
 
 import os
 
+logger = logging.getLogger(__name__)
+
+FONT_PATH = os.path.join(os.path.dirname(__file__), 'arialblackcyrit_italic.ttf')
+CAPTCHA_ALPHABET = string.ascii_uppercase + string.digits
+
+_renderer: Optional[ImageCaptcha] = None
+
+
+def get_renderer() -> ImageCaptcha:
+    global _renderer
+    if _renderer is None:
+        _renderer = ImageCaptcha(width=200, height=80, fonts=[FONT_PATH])
+        _renderer.truefonts
+    return _renderer
+
+
+def render_captcha(length: int = 5) -> Tuple[bytes, str, float]:
+    started = time.perf_counter()
+    text = ''.join(random.choices(CAPTCHA_ALPHABET, k=length))
+    data = get_renderer().generate(text).getvalue()
+    return data, text, time.perf_counter() - started
+
+
+def warm_renderer():
+    random.seed()
+    get_renderer()
+
+
 class CaptchaGenerator:
     @staticmethod
     def generate_image_captcha() -> Tuple[io.BytesIO, str]:
-        text = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-        font_path = os.path.join(os.path.dirname(__file__), 'arialblackcyrit_italic.ttf')
-        image = ImageCaptcha(width=200, height=80, fonts=[font_path])
-     
-        
-        data = image.generate(text)
-        
-        image_buffer = io.BytesIO()
-        image_buffer.write(data.read())
-        image_buffer.seek(0)
-        
-        return image_buffer, text
+        data, text, _ = render_captcha()
+        return io.BytesIO(data), text
+
+
+class CaptchaPool:
+    def __init__(self, size: int = 200, low_water: int = 50, workers: int = 2, length: int = 5):
+        self.size = size
+        self.low_water = min(low_water, size)
+        self.workers = max(1, workers)
+        self.length = length
+        self._ready: deque = deque()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._refill_task: Optional[asyncio.Task] = None
+        self._stats = {'rendered': 0, 'served': 0, 'misses': 0, 'errors': 0, 'render_seconds': 0.0, 'last_render': 0.0}
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def start(self):
+        if self._executor is not None or self.size <= 0:
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_renderer
+        )
+        self._schedule_refill()
+        logger.info(f"Пул капчи запущен: {self.size} изображений, {self.workers} процессов")
+
+    async def stop(self):
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._ready.clear()
+
+    def _record(self, render_seconds: float):
+        self._stats['rendered'] += 1
+        self._stats['render_seconds'] += render_seconds
+        self._stats['last_render'] = render_seconds
+
+    async def _render(self) -> Tuple[bytes, str]:
+        loop = asyncio.get_running_loop()
+        data, text, render_seconds = await loop.run_in_executor(self._executor, render_captcha, self.length)
+        self._record(render_seconds)
+        return data, text
+
+    async def _refill(self):
+        while self._executor is not None and len(self._ready) < self.size:
+            batch = min(self.workers, self.size - len(self._ready))
+            results = await asyncio.gather(*(self._render() for _ in range(batch)), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    self._stats['errors'] += 1
+                    logger.error(f"Ошибка генерации капчи: {result}")
+                else:
+                    self._ready.append(result)
+            if all(isinstance(result, Exception) for result in results):
+                await asyncio.sleep(5)
+
+    def _schedule_refill(self):
+        if self._executor is None or (self._refill_task is not None and not self._refill_task.done()):
+            return
+        self._refill_task = asyncio.create_task(self._refill(), name="captcha_pool_refill")
+
+    async def get(self) -> Tuple[bytes, str]:
+        if self._ready:
+            item = self._ready.popleft()
+            self._stats['served'] += 1
+        else:
+            self._stats['misses'] += 1
+            item = await self._render()
+        if len(self._ready) < self.low_water:
+            self._schedule_refill()
+        return item
+
+    def stats(self) -> Dict[str, Any]:
+        rendered = self._stats['rendered']
+        return {
+            **self._stats,
+            'depth': len(self._ready),
+            'size': self.size,
+            'low_water': self.low_water,
+            'avg_render_ms': self._stats['render_seconds'] / rendered * 1000 if rendered else 0.0,
+            'last_render_ms': self._stats['last_render'] * 1000,
+            'refilling': self._refill_task is not None and not self._refill_task.done(),
+        }
+
+
+captcha_pool = CaptchaPool(
+    size=config.CAPTCHA_POOL_SIZE,
+    low_water=config.CAPTCHA_POOL_LOW_WATER,
+    workers=config.CAPTCHA_POOL_WORKERS
+)
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from api.http import http_transport
+
+logger = logging.getLogger(__name__)
+
+MAD_SCALE = 1.4826
+
+
+class RateSource:
+    def __init__(self, name: str, timeout: float = 5.0, weight: float = 1.0):
+        self.name = name
+        self.timeout = timeout
+        self.weight = weight
+
+    async def fetch(self) -> float:
+        raise NotImplementedError
+
+
+class JsonRateSource(RateSource):
+    def __init__(self, name: str, url: str, extract: Callable[[Any], Any], params: Dict[str, Any] = None,
+                 timeout: float = 5.0):
+        super().__init__(name, timeout)
+        self.url = url
+        self.extract = extract
+        self.params = params
+
+    async def fetch(self) -> float:
+        session = await http_transport.session()
+        async with session.get(self.url, params=self.params, ssl=http_transport.insecure_ssl) as response:
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            data = await response.json(content_type=None)
+        return float(self.extract(data))
+
+
+class CrossRateSource(RateSource):
+    def __init__(self, name: str, base: RateSource, quote: RateSource, timeout: float = 5.0):
+        super().__init__(name, timeout)
+        self.base = base
+        self.quote = quote
+
+    async def fetch(self) -> float:
+        base, quote = await asyncio.gather(self.base.fetch(), self.quote.fetch())
+        return base * quote
+
+
+class StaticRateSource(RateSource):
+    def __init__(self, name: str, value: Optional[float], delay: float = 0.0, timeout: float = 5.0):
+        super().__init__(name, timeout)
+        self.value = value
+        self.delay = delay
+
+    async def fetch(self) -> float:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.value is None:
+            raise RuntimeError("source unavailable")
+        return float(self.value)
+
+
+def aggregate(samples: Dict[str, float], mad_threshold: float = 3.5, max_deviation: float = 0.05) -> Dict[str, Any]:
+    values = list(samples.values())
+    median = statistics.median(values)
+    mad = statistics.median(abs(value - median) for value in values)
+    accepted, rejected = {}, {}
+    for name, value in samples.items():
+        deviation = abs(value - median)
+        robust_outlier = mad > 0 and deviation / (MAD_SCALE * mad) > mad_threshold
+        if robust_outlier or deviation / median > max_deviation:
+            rejected[name] = value
+        else:
+            accepted[name] = value
+    value = statistics.median(accepted.values()) if accepted else None
+    spread = (max(accepted.values()) - min(accepted.values())) / value if len(accepted) > 1 else 0.0
+    return {
+        'value': value,
+        'mad': mad,
+        'dispersion': MAD_SCALE * mad / median if median else 0.0,
+        'spread': spread,
+        'sources': accepted,
+        'rejected': rejected,
+    }
+
+
+class RateAggregator:
+    def __init__(self, sources: Sequence[RateSource], min_sources: int = 1,
+                 mad_threshold: float = 3.5, max_deviation: float = 0.05):
+        self.sources = list(sources)
+        self.min_sources = min_sources
+        self.mad_threshold = mad_threshold
+        self.max_deviation = max_deviation
+        self.last: Optional[Dict[str, Any]] = None
+        self.failures: Dict[str, str] = {}
+
+    async def _fetch_source(self, source: RateSource) -> Optional[float]:
+        try:
+            value = await asyncio.wait_for(source.fetch(), timeout=source.timeout)
+        except asyncio.TimeoutError:
+            self.failures[source.name] = "timeout"
+            return None
+        except Exception as e:
+            self.failures[source.name] = str(e) or type(e).__name__
+            return None
+        if not value or value <= 0:
+            self.failures[source.name] = f"invalid value {value}"
+            return None
+        self.failures.pop(source.name, None)
+        return value
+
+    async def collect(self) -> Dict[str, float]:
+        values = await asyncio.gather(*(self._fetch_source(source) for source in self.sources))
+        return {source.name: value for source, value in zip(self.sources, values) if value is not None}
+
+    async def fetch(self) -> Optional[float]:
+        samples = await self.collect()
+        if len(samples) < self.min_sources:
+            logger.error(
+                f"Недостаточно источников курса: {len(samples)} из {self.min_sources} "
+                f"({', '.join(f'{name}: {error}' for name, error in self.failures.items())})"
+            )
+            return None
+        result = aggregate(samples, self.mad_threshold, self.max_deviation)
+        if len(result['sources']) < self.min_sources:
+            logger.error(
+                f"Источники курса расходятся: согласованы {len(result['sources'])} из {self.min_sources} "
+                f"({', '.join(f'{name}={value:,.0f}' for name, value in samples.items())}, "
+                f"разброс {result['dispersion']:.1%})"
+            )
+            return None
+        if result['rejected']:
+            logger.warning(
+                f"Отброшены выбросы курса: {', '.join(f'{name}={value:,.0f}' for name, value in result['rejected'].items())} "
+                f"(медиана {result['value']:,.0f})"
+            )
+        self.last = {**result, 'fetched_at': time.time()}
+        return result['value']
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'last': self.last, 'failures': dict(self.failures), 'sources': [source.name for source in self.sources]}
+
+
+def default_sources(timeout: float = 5.0) -> List[RateSource]:
+    return [
+        JsonRateSource(
+            "coingecko",
+            "https://api.coingecko.com/api/v3/simple/price",
+            lambda data: data['bitcoin']['rub'],
+            params={'ids': 'bitcoin', 'vs_currencies': 'rub'},
+            timeout=timeout
+        ),
+        JsonRateSource(
+            "cryptocompare",
+            "https://min-api.cryptocompare.com/data/price",
+            lambda data: data['RUB'],
+            params={'fsym': 'BTC', 'tsyms': 'RUB'},
+            timeout=timeout
+        ),
+        JsonRateSource(
+            "blockchain",
+            "https://blockchain.info/ticker",
+            lambda data: data['RUB']['last'],
+            timeout=timeout
+        ),
+        CrossRateSource(
+            "binance_cbr",
+            JsonRateSource(
+                "binance",
+                "https://api.binance.com/api/v3/ticker/price",
+                lambda data: data['price'],
+                params={'symbol': 'BTCUSDT'},
+                timeout=timeout
+            ),
+            JsonRateSource(
+                "cbr",
+                "https://www.cbr-xml-daily.ru/daily_json.js",
+                lambda data: data['Valute']['USD']['Value'],
+                timeout=timeout
+            ),
+            timeout=timeout
+        ),
+    ]
+
+
+def parse_static_sources(spec: str) -> List[RateSource]:
+    sources = []
+    for index, item in enumerate(part.strip() for part in spec.split(',') if part.strip()):
+        name, _, value = item.rpartition('=')
+        sources.append(StaticRateSource(name or f"static_{index + 1}", float(value)))
+    return sources
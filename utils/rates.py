@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import secrets
+import time
+from array import array
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RateFetcher = Callable[[], Awaitable[Optional[float]]]
+
+
+class RateHistory:
+    def __init__(self, capacity: int = 8640):
+        self.capacity = capacity
+        self._timestamps = array('I', bytes(4 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float, timestamp: float = None):
+        self._timestamps[self._head] = int(time.time() if timestamp is None else timestamp)
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def window(self, seconds: float, now: float = None) -> Optional[Dict[str, Any]]:
+        cutoff = int((time.time() if now is None else now) - seconds)
+        timestamps, values, capacity = self._timestamps, self._values, self.capacity
+        index = self._head
+        count = 0
+        total = 0.0
+        low = high = first = last = None
+        for _ in range(self._size):
+            index = (index - 1) % capacity
+            if timestamps[index] < cutoff:
+                break
+            value = values[index]
+            if last is None:
+                last = low = high = value
+            elif value < low:
+                low = value
+            elif value > high:
+                high = value
+            first = value
+            total += value
+            count += 1
+        if not count:
+            return None
+        return {
+            'count': count,
+            'min': low,
+            'max': high,
+            'avg': total / count,
+            'first': first,
+            'last': last,
+            'change': (last - first) / first if first else 0.0,
+        }
+
+    def memory_bytes(self) -> int:
+        return self._timestamps.itemsize * len(self._timestamps) + self._values.itemsize * len(self._values)
+
+
+class RateQuote:
+    __slots__ = ('quote_id', 'rate', 'created_at', 'expires_at')
+
+    def __init__(self, rate: float, ttl: float, quote_id: str = None, created_at: float = None):
+        self.quote_id = quote_id or secrets.token_hex(6)
+        self.rate = rate
+        self.created_at = time.time() if created_at is None else created_at
+        self.expires_at = self.created_at + ttl
+
+    def is_expired(self, now: float = None) -> bool:
+        return (time.time() if now is None else now) >= self.expires_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'id': self.quote_id, 'rate': self.rate, 'created_at': self.created_at, 'expires_at': self.expires_at}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional['RateQuote']:
+        if not data or not data.get('rate'):
+            return None
+        quote = cls(data['rate'], 0, data.get('id'), data.get('created_at'))
+        quote.expires_at = data.get('expires_at', quote.created_at)
+        return quote
+
+
+class RateService:
+    def __init__(self, fetcher: RateFetcher, ttl: float = 30.0, max_stale: float = 600.0,
+                 refresh_interval: float = 20.0, fallback: Optional[float] = None,
+                 history: RateHistory = None, quote_ttl: float = 600.0):
+        self.fetcher = fetcher
+        self.history = history
+        self.quote_ttl = quote_ttl
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.refresh_interval = refresh_interval
+        self.fallback = fallback
+        self._value: Optional[float] = None
+        self._fetched_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {'fresh': 0, 'stale': 0, 'waits': 0, 'fetches': 0, 'coalesced': 0, 'errors': 0}
+
+    def age(self) -> Optional[float]:
+        if self._value is None:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    async def _fetch(self) -> Optional[float]:
+        self._stats['fetches'] += 1
+        try:
+            value = await self.fetcher()
+        except Exception as e:
+            value = None
+            logger.error(f"Ошибка получения курса BTC: {e}")
+        if not value:
+            self._stats['errors'] += 1
+            return None
+        self._value = float(value)
+        self._fetched_at = time.monotonic()
+        if self.history is not None:
+            self.history.append(self._value)
+        return self._value
+
+    def refresh(self) -> asyncio.Future:
+        if self._inflight is not None and not self._inflight.done():
+            self._stats['coalesced'] += 1
+            return self._inflight
+        self._inflight = asyncio.ensure_future(self._fetch())
+        return self._inflight
+
+    async def get_rate(self) -> Optional[float]:
+        age = self.age()
+        if age is not None and age < self.ttl:
+            self._stats['fresh'] += 1
+            return self._value
+        if age is not None and age < self.max_stale:
+            self._stats['stale'] += 1
+            self.refresh()
+            return self._value
+        self._stats['waits'] += 1
+        value = await asyncio.shield(self.refresh())
+        return value if value is not None else self.fallback
+
+    async def quote(self, ttl: float = None) -> Optional[RateQuote]:
+        rate = await self.get_rate()
+        if not rate:
+            return None
+        return RateQuote(rate, self.quote_ttl if ttl is None else ttl)
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.shield(self.refresh())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления курса: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="btc_rate_refresher")
+            logger.info("Фоновое обновление курса BTC запущено")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'rate': self._value, 'age': self.age()}
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_worker_count(requested: int) -> int:
+    if requested <= 0:
+        return os.cpu_count() or 1
+    return requested
+
+
+def shard_of(index: int, shard_count: int) -> int:
+    return index % max(1, shard_count)
+
+
+class WorkerMonitor:
+    def __init__(self, db, interval: float = 10.0, events: Callable[[], int] = None):
+        self.db = db
+        self.interval = interval
+        self.events = events or (lambda: 0)
+        self.process = psutil.Process(os.getpid())
+        self.worker_id = "shard-0"
+        self._info: Dict[str, Any] = {}
+        self._lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _heartbeat(self, status: str) -> Dict[str, Any]:
+        memory = self.process.memory_info()
+        return {
+            **self._info,
+            'pid': os.getpid(),
+            'status': status,
+            'cpu_percent': self.process.cpu_percent(None),
+            'rss': memory.rss,
+            'loop_lag_ms': self._lag * 1000,
+            'events': self.events(),
+            'last_seen': time.time(),
+        }
+
+    async def _loop(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self._lag = max(0.0, time.monotonic() - expected)
+            try:
+                await self.db.record_worker_heartbeat(self._heartbeat('running'))
+            except Exception as e:
+                logger.error(f"Ошибка записи heartbeat воркера {self.worker_id}: {e}")
+
+    async def start(self, shard: int, bots: Sequence[str], roles: Sequence[str], restarts: int = 0):
+        self.worker_id = f"shard-{shard}"
+        self._info = {
+            'worker_id': self.worker_id,
+            'shard': shard,
+            'bots': ','.join(bots),
+            'roles': ','.join(roles),
+            'restarts': restarts,
+            'started_at': time.time(),
+        }
+        self.process.cpu_percent(None)
+        await self.db.record_worker_heartbeat(self._heartbeat('running'))
+        self._task = asyncio.create_task(self._loop(), name="worker_heartbeat")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.db.record_worker_heartbeat(self._heartbeat('stopped'))
+        except Exception as e:
+            logger.error(f"Ошибка записи heartbeat воркера {self.worker_id}: {e}")
+
+
+class ShardSupervisor:
+    def __init__(self, target: Callable[[int, int, int], Any], workers: int, restart_backoff: float = 1.0,
+                 max_backoff: float = 60.0, stable_after: float = 300.0, stop_timeout: float = 15.0):
+        self.target = target
+        self.workers = max(1, workers)
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * self.workers
+        self._started_at = [0.0] * self.workers
+        self._restarts = [0] * self.workers
+        self._failures = [0] * self.workers
+        self._restart_at = [0.0] * self.workers
+        self._stopping = False
+
+    def _spawn(self, shard: int):
+        process = self._context.Process(
+            target=self.target,
+            args=(shard, self.workers, self._restarts[shard]),
+            name=f"shard-{shard}",
+            daemon=False
+        )
+        process.start()
+        self._processes[shard] = process
+        self._started_at[shard] = time.monotonic()
+        logger.info(f"Воркер shard-{shard} запущен (pid {process.pid})")
+
+    def _check(self, shard: int, now: float):
+        process = self._processes[shard]
+        if process is not None and process.is_alive():
+            if now - self._started_at[shard] > self.stable_after:
+                self._failures[shard] = 0
+            return
+        if process is not None:
+            logger.error(f"Воркер shard-{shard} завершился с кодом {process.exitcode}")
+            process.close()
+            self._processes[shard] = None
+            self._failures[shard] += 1
+            delay = min(self.restart_backoff * 2 ** (self._failures[shard] - 1), self.max_backoff)
+            self._restart_at[shard] = now + delay
+            logger.info(f"Перезапуск shard-{shard} через {delay:.0f} сек")
+            return
+        if now >= self._restart_at[shard]:
+            self._restarts[shard] += 1
+            self._spawn(shard)
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def stop(self):
+        alive = [process for process in self._processes if process is not None and process.is_alive()]
+        for process in alive:
+            process.terminate()
+        deadline = time.monotonic() + self.stop_timeout
+        for process in alive:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Воркер {process.name} не завершился вовремя, принудительная остановка")
+                process.kill()
+                process.join()
+        logger.info("Все воркеры остановлены")
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        logger.info(f"Супервизор запускает {self.workers} воркеров")
+        for shard in range(self.workers):
+            self._spawn(shard)
+        try:
+            while not self._stopping:
+                now = time.monotonic()
+                for shard in range(self.workers):
+                    self._check(shard, now)
+                time.sleep(0.5)
+        finally:
+            self.stop()
@@ -0,0 +1,135 @@
+import hashlib
+import hmac
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+from config import config
+from database.models import Database
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = {
+    'onlypays': ('OnlyPays', 'personal_id', 'status'),
+    'pspware': ('PSPWare', 'personal_id', 'status'),
+    'greengo': ('Greengo', 'personal_id', 'order_status'),
+    'nicepay': ('NicePay', 'merchantOrderId', 'status'),
+}
+
+SIGNATURE_HEADERS = ('X-Signature', 'X-Signature-SHA256', 'Signature', 'Sign')
+SECRET_HEADERS = ('X-Webhook-Secret', 'X-Secret-Key')
+
+
+def sign_payload(secret: str, body: bytes) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_request(secret: str, body: bytes, headers, query) -> bool:
+    if not secret:
+        return False
+    for header in SIGNATURE_HEADERS:
+        signature = headers.get(header)
+        if signature:
+            signature = signature.strip().lower()
+            if signature.startswith('sha256='):
+                signature = signature[7:]
+            return hmac.compare_digest(signature, sign_payload(secret, body))
+    provided = next((headers.get(header) for header in SECRET_HEADERS if headers.get(header)), None)
+    provided = provided or query.get('secret')
+    return bool(provided) and hmac.compare_digest(provided.encode(), secret.encode())
+
+
+def parse_payload(body: bytes, content_type: str) -> Optional[Dict[str, Any]]:
+    try:
+        if 'x-www-form-urlencoded' in content_type:
+            return dict(parse_qsl(body.decode(), keep_blank_values=True))
+        data = json.loads(body or b'{}')
+    except (UnicodeDecodeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def extract_event(provider: str, data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    _, order_field, status_field = PROVIDERS[provider]
+    order_ref = data.get(order_field)
+    status = data.get(status_field)
+    if order_ref in (None, '') or status in (None, ''):
+        return None, None
+    return str(order_ref), str(status)
+
+
+class PaymentWebhookReceiver:
+    def __init__(self, db: Database, secrets: Dict[str, str], path: str = "/webhooks/payments"):
+        self.db = db
+        self.secrets = {provider: secret for provider, secret in secrets.items() if secret and provider in PROVIDERS}
+        self.path = path.rstrip('/')
+        self._stats = {'received': 0, 'accepted': 0, 'duplicates': 0, 'rejected': 0, 'errors': 0}
+        self._ack_total = 0.0
+        self._ack_max = 0.0
+
+    def register(self, server) -> int:
+        for provider in PROVIDERS:
+            if provider not in self.secrets:
+                logger.warning(f"Вебхуки {PROVIDERS[provider][0]} отключены: не задан секрет")
+        if self.secrets:
+            server.add_route('POST', f"{self.path}/{{provider}}", self.handle, name="payment_webhook")
+        return len(self.secrets)
+
+    def _reject(self, status: int, reason: str, provider: str) -> web.Response:
+        self._stats['rejected'] += 1
+        logger.warning(f"Вебхук {provider} отклонен: {reason}")
+        return web.json_response({'status': 'error', 'error': reason}, status=status)
+
+    def _acknowledge(self, started: float, result: str) -> web.Response:
+        elapsed = time.perf_counter() - started
+        self._ack_total += elapsed
+        self._ack_max = max(self._ack_max, elapsed)
+        return web.json_response({'status': result})
+
+    async def handle(self, request: web.Request) -> web.Response:
+        started = time.perf_counter()
+        provider = request.match_info.get('provider', '').lower()
+        self._stats['received'] += 1
+        secret = self.secrets.get(provider)
+        if secret is None:
+            return self._reject(404, "unknown provider", provider)
+        body = await request.read()
+        if not verify_request(secret, body, request.headers, request.query):
+            return self._reject(403, "invalid signature", provider)
+        data = parse_payload(body, request.content_type or '')
+        if data is None:
+            return self._reject(400, "invalid payload", provider)
+        order_ref, status = extract_event(provider, data)
+        if order_ref is None:
+            return self._reject(400, "missing order id or status", provider)
+        try:
+            event_id = await self.db.record_payment_webhook(provider, order_ref, status, data)
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"Ошибка сохранения вебхука {provider} по заявке {order_ref}: {e}")
+            return web.json_response({'status': 'error'}, status=500)
+        if event_id is None:
+            self._stats['duplicates'] += 1
+            return self._acknowledge(started, 'duplicate')
+        self._stats['accepted'] += 1
+        return self._acknowledge(started, 'ok')
+
+    def stats(self) -> Dict[str, Any]:
+        acknowledged = self._stats['accepted'] + self._stats['duplicates']
+        return {
+            **self._stats,
+            'providers': sorted(self.secrets),
+            'avg_ack_ms': self._ack_total / acknowledged * 1000 if acknowledged else 0.0,
+            'max_ack_ms': self._ack_max * 1000,
+        }
+
+
+payment_webhooks = PaymentWebhookReceiver(
+    Database(config.DATABASE_URL),
+    config.get_payment_webhook_secrets(),
+    config.PAYMENT_WEBHOOK_PATH
+)
@@ -0,0 +1,66 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+ShutdownHook = Callable[[], Awaitable[Any]]
+
+
+class WebServer:
+    def __init__(self, host: str, port: int, shutdown_timeout: float = 10.0, client_max_size: int = 1024 ** 2):
+        self.host = host
+        self.port = port
+        self.shutdown_timeout = shutdown_timeout
+        self.client_max_size = client_max_size
+        self.app: Optional[web.Application] = None
+        self._routes: List[web.RouteDef] = []
+        self._shutdown_hooks: List[ShutdownHook] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    def add_route(self, method: str, path: str, handler, name: str = None):
+        self._routes.append(web.route(method, path, handler, name=name))
+
+    def on_shutdown(self, hook: ShutdownHook):
+        self._shutdown_hooks.append(hook)
+
+    @property
+    def has_routes(self) -> bool:
+        return bool(self._routes)
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def start(self):
+        if self._runner is not None or not self._routes:
+            return
+        self.app = web.Application(client_max_size=self.client_max_size)
+        self.app.add_routes(self._routes)
+        self._runner = web.AppRunner(self.app, access_log=None, handle_signals=False, shutdown_timeout=self.shutdown_timeout)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info(f"Веб-сервер запущен на {self.host}:{self.port} ({len(self._routes)} маршрутов)")
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        for hook in self._shutdown_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Ошибка завершения обработчика веб-сервера: {e}")
+        await self._runner.cleanup()
+        self._runner = None
+        self.app = None
+        logger.info("Веб-сервер остановлен")
+
+    def stats(self) -> Dict[str, Any]:
+        return {'running': self.running, 'routes': len(self._routes), 'port': self.port}
+
+
+web_server = WebServer(config.WEB_SERVER_HOST, config.WEB_SERVER_PORT, config.WEB_SHUTDOWN_TIMEOUT)
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+def token_path(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def bot_secret(secret: str, token: str) -> str:
+    return hmac.new((secret or token).encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+class BotEndpoint:
+    def __init__(self, bot: Bot, dp: Dispatcher, mirror_id: str, path: str, secret: str, max_concurrency: int):
+        self.bot = bot
+        self.dp = dp
+        self.mirror_id = mirror_id
+        self.path = path
+        self.secret = secret
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.tasks = set()
+        self.stats = {'updates': 0, 'rejected': 0, 'errors': 0, 'busy_time': 0.0, 'max_time': 0.0}
+
+
+class TelegramWebhookGateway:
+    def __init__(self, base_url: str, path: str = "/telegram", secret: str = "", max_concurrency: int = 20,
+                 max_connections: int = 40, drain_timeout: float = 10.0):
+        self.base_url = (base_url or "").rstrip('/')
+        self.path = path.rstrip('/')
+        self.secret = secret
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_connections = max_connections
+        self.drain_timeout = drain_timeout
+        self._endpoints: Dict[str, BotEndpoint] = {}
+        self._draining = False
+        self._closed: Optional[asyncio.Event] = None
+
+    def add_bot(self, bot: Bot, dp: Dispatcher, mirror_id: str) -> BotEndpoint:
+        path = f"{self.path}/{token_path(bot.token)}"
+        endpoint = BotEndpoint(bot, dp, mirror_id, path, bot_secret(self.secret, bot.token), self.max_concurrency)
+        self._endpoints[path] = endpoint
+        return endpoint
+
+    def register(self, server) -> int:
+        if self._endpoints:
+            server.add_route('POST', f"{self.path}/{{token_hash}}", self.handle, name="telegram_webhook")
+            server.on_shutdown(self.drain)
+        return len(self._endpoints)
+
+    async def start(self, drop_pending_updates: bool = False):
+        if not self.base_url:
+            raise RuntimeError("TELEGRAM_WEBHOOK_URL не задан для режима webhook")
+        self._closed = asyncio.Event()
+        self._draining = False
+        for endpoint in self._endpoints.values():
+            await endpoint.bot.set_webhook(
+                f"{self.base_url}{endpoint.path}",
+                secret_token=endpoint.secret,
+                allowed_updates=endpoint.dp.resolve_used_update_types(),
+                max_connections=self.max_connections,
+                drop_pending_updates=drop_pending_updates
+            )
+            logger.info(f"Webhook бота {endpoint.mirror_id} установлен")
+
+    async def wait_closed(self):
+        if self._closed is not None:
+            await self._closed.wait()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        endpoint = self._endpoints.get(request.path.rstrip('/'))
+        if endpoint is None:
+            return web.Response(status=404)
+        provided = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(provided.encode(), endpoint.secret.encode()):
+            endpoint.stats['rejected'] += 1
+            return web.Response(status=401)
+        if self._draining:
+            return web.Response(status=503)
+        try:
+            data = await request.json()
+        except ValueError:
+            endpoint.stats['rejected'] += 1
+            return web.Response(status=400)
+        await endpoint.semaphore.acquire()
+        if self._draining:
+            endpoint.semaphore.release()
+            return web.Response(status=503)
+        task = asyncio.create_task(self._process(endpoint, data))
+        endpoint.tasks.add(task)
+        task.add_done_callback(endpoint.tasks.discard)
+        return web.Response()
+
+    async def _process(self, endpoint: BotEndpoint, data: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            await endpoint.dp.feed_raw_update(endpoint.bot, data)
+            endpoint.stats['updates'] += 1
+        except Exception as e:
+            endpoint.stats['errors'] += 1
+            logger.error(f"Ошибка обработки обновления бота {endpoint.mirror_id}: {e}")
+        finally:
+            endpoint.semaphore.release()
+            elapsed = time.perf_counter() - started
+            endpoint.stats['busy_time'] += elapsed
+            endpoint.stats['max_time'] = max(endpoint.stats['max_time'], elapsed)
+
+    async def drain(self):
+        self._draining = True
+        pending = [task for endpoint in self._endpoints.values() for task in endpoint.tasks]
+        if pending:
+            logger.info(f"Ожидание завершения {len(pending)} обновлений Telegram")
+            _, still_running = await asyncio.wait(pending, timeout=self.drain_timeout)
+            for task in still_running:
+                task.cancel()
+            if still_running:
+                logger.warning(f"Прервано {len(still_running)} обновлений Telegram по таймауту")
+        if self._closed is not None:
+            self._closed.set()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for endpoint in self._endpoints.values():
+            updates = endpoint.stats['updates'] + endpoint.stats['errors']
+            result[endpoint.mirror_id] = {
+                'updates': endpoint.stats['updates'],
+                'errors': endpoint.stats['errors'],
+                'rejected': endpoint.stats['rejected'],
+                'inflight': len(endpoint.tasks),
+                'avg_ms': endpoint.stats['busy_time'] / updates * 1000 if updates else 0.0,
+                'max_ms': endpoint.stats['max_time'] * 1000,
+            }
+        return result
+
+
+telegram_webhooks = TelegramWebhookGateway(
+    config.TELEGRAM_WEBHOOK_URL,
+    config.TELEGRAM_WEBHOOK_PATH,
+    config.TELEGRAM_WEBHOOK_SECRET,
+    max_concurrency=config.TELEGRAM_MAX_CONCURRENT_UPDATES,
+    max_connections=config.TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+    drain_timeout=config.WEB_SHUTDOWN_TIMEOUT
+)